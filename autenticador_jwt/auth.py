@@ -1,26 +1,39 @@
 from datetime import timedelta, datetime
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from starlette import status
-from sqlalchemy.orm import Session
-from database.database import SessionLocal
-from database.models import User, Aluno, Professor, Matricula, Admin
-from passlib.context import CryptContext
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_db
+from database.sequencias import alocador_matricula
+from database.models import User, Aluno, Professor, Matricula, Admin, RefreshToken
+from autenticador_jwt.senhas import gerar_hash, verificar_senha
+from autenticador_jwt.cache_tokens import cache_tokens
+from monitoramento.perfil import medir
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
+import hashlib
+import hmac
+import itertools
 import os
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
+import secrets
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
+ACCESS_TOKEN_MINUTOS = 20
+REFRESH_TOKEN_DIAS = int(os.getenv("REFRESH_TOKEN_DIAS", "30"))
+# Um refresh token revogado fica guardado por REFRESH_REVOGADO_HORAS para que
+# o reuso dele seja detectado; depois disso, ou depois de expirar, é apagado.
+# A limpeza roda a cada REFRESH_LIMPEZA tokens emitidos (por processo).
+REFRESH_REVOGADO_HORAS = float(os.getenv("REFRESH_REVOGADO_HORAS", "24"))
+REFRESH_LIMPEZA = int(os.getenv("REFRESH_LIMPEZA", "1000"))
+
+_emissoes = itertools.count(1)
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
@@ -33,86 +46,225 @@ class CreateUserRequest(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_user(db: db_dependency, create_user_request: CreateUserRequest):
     create_user_model = User(
         username=create_user_request.username,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=await gerar_hash(create_user_request.password),
         ocupacao=create_user_request.ocupacao,
     )
     db.add(create_user_model)
-    db.commit()
-    db.refresh(create_user_model)
+    await db.commit()
+    await db.refresh(create_user_model)
     if create_user_model.ocupacao == "aluno":
         aluno = Aluno(usuario_id=create_user_model.id)
         db.add(aluno)
-        db.commit()
+        await db.commit()
 
-        matricula = Matricula(aluno_id=aluno.id)
+        (numero,) = await alocador_matricula.reservar()
+        matricula = Matricula(aluno_id=aluno.id, numero=numero)
         db.add(matricula)
-        db.commit()
+        await db.commit()
 
     elif create_user_model.ocupacao == "professor":
         professor = Professor(usuario_id=create_user_model.id)
         db.add(professor)
-        db.commit()
+        await db.commit()
 
     elif create_user_model.ocupacao == "admin":
         admin = Admin(usuario_id=create_user_model.id)
         db.add(admin)
-        db.commit()
+        await db.commit()
 
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency
 ):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Autenticação de usuário falhou.",
         )
+    perfil_id = await buscar_perfil_id(user.id, user.ocupacao, db)
     token = create_access_token(
-        user.username, user.id, user.ocupacao, timedelta(minutes=20)
+        user.username,
+        user.id,
+        user.ocupacao,
+        timedelta(minutes=ACCESS_TOKEN_MINUTOS),
+        perfil_id,
     )
-    return {"access_token": token, "token_type": "bearer"}
+    refresh_token = await create_refresh_token(user.id, db)
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
 
 
-def authenticate_user(username: str, password: str, db):
-    user = db.query(User).filter(User.username == username).first()
+# Troca um refresh token válido por um novo par de tokens, sem bcrypt
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(dados: RefreshRequest, db: db_dependency):
+    refresh = await db.scalar(
+        select(RefreshToken).where(
+            RefreshToken.token_hash == hash_refresh_token(dados.refresh_token)
+        )
+    )
+    if not refresh or refresh.expira_em < datetime.utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido.",
+        )
+
+    # Rotação: o token só pode ser usado uma vez. Reuso de um token já
+    # revogado indica vazamento, então todos os tokens do usuário caem.
+    resultado = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == refresh.id, RefreshToken.revogado.is_(False))
+        .values(revogado=True, revogado_em=datetime.utcnow())
+    )
+    if resultado.rowcount != 1:
+        await revogar_refresh_tokens(refresh.usuario_id, db)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido.",
+        )
+
+    user = await db.get(User, refresh.usuario_id)
+    perfil_id = await buscar_perfil_id(user.id, user.ocupacao, db)
+    token = create_access_token(
+        user.username,
+        user.id,
+        user.ocupacao,
+        timedelta(minutes=ACCESS_TOKEN_MINUTOS),
+        perfil_id,
+    )
+    novo_refresh = await create_refresh_token(user.id, db)
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "refresh_token": novo_refresh,
+    }
+
+
+# Revoga o refresh token (logout)
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(dados: RefreshRequest, db: db_dependency):
+    await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == hash_refresh_token(dados.refresh_token),
+            RefreshToken.revogado.is_(False),
+        )
+        .values(revogado=True, revogado_em=datetime.utcnow())
+    )
+    await db.commit()
+
+
+async def authenticate_user(username: str, password: str, db):
+    user = await db.scalar(select(User).where(User.username == username))
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await verificar_senha(password, user.hashed_password):
         return False
     return user
 
 
+# Tabela específica de cada ocupação
+MODELOS_PERFIL = {"aluno": Aluno, "professor": Professor, "admin": Admin}
+
+
+# Id do aluno/professor/admin ligado ao usuário, embutido no token como claim
+async def buscar_perfil_id(user_id: int, ocupacao: str, db):
+    modelo = MODELOS_PERFIL.get(ocupacao)
+    if modelo is None:
+        return None
+    return await db.scalar(select(modelo.id).where(modelo.usuario_id == user_id))
+
+
 def create_access_token(
-    username: str, user_id: int, ocupacao: str, expires_delta: timedelta
+    username: str,
+    user_id: int,
+    ocupacao: str,
+    expires_delta: timedelta,
+    perfil_id: int | None = None,
 ):
-    encode = {"sub": username, "id": user_id, "ocupacao": ocupacao}
+    encode = {
+        "sub": username,
+        "id": user_id,
+        "ocupacao": ocupacao,
+        "perfil_id": perfil_id,
+    }
     expires = datetime.utcnow() + expires_delta
     encode.update({"exp": expires})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+def hash_refresh_token(token: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+async def create_refresh_token(user_id: int, db) -> str:
+    token = secrets.token_urlsafe(32)
+    agora = datetime.utcnow()
+    db.add(
+        RefreshToken(
+            usuario_id=user_id,
+            token_hash=hash_refresh_token(token),
+            criado_em=agora,
+            expira_em=agora + timedelta(days=REFRESH_TOKEN_DIAS),
+        )
+    )
+    if next(_emissoes) % REFRESH_LIMPEZA == 0:
+        await apagar_refresh_tokens_vencidos(db, agora)
+    await db.commit()
+    return token
+
+
+# Apaga os expirados e os revogados há mais de REFRESH_REVOGADO_HORAS
+async def apagar_refresh_tokens_vencidos(db, agora: datetime):
+    await db.execute(
+        delete(RefreshToken).where(
+            or_(
+                RefreshToken.expira_em < agora,
+                RefreshToken.revogado_em
+                < agora - timedelta(hours=REFRESH_REVOGADO_HORAS),
+            )
+        )
+    )
+
+
+async def revogar_refresh_tokens(user_id: int, db):
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.usuario_id == user_id, RefreshToken.revogado.is_(False))
+        .values(revogado=True, revogado_em=datetime.utcnow())
+    )
+    await db.commit()
+
+
+async def get_current_user(
+    request: Request, token: Annotated[str, Depends(oauth2_bearer)]
+):
+    # Tokens já validados voltam do cache sem passar pelo jwt.decode
+    principal = cache_tokens.get(token)
+    if principal is not None:
+        request.state.usuario = principal
+        return principal
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with medir("jwt"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         user_id: int = payload.get("id")
         ocupacao: str = payload.get("ocupacao")
@@ -121,7 +273,16 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="O usuário não pode ser validado.",
             )
-        return {"username": username, "id": user_id, "ocupacao": ocupacao}
+        principal = {
+            "username": username,
+            "id": user_id,
+            "ocupacao": ocupacao,
+            "perfil_id": payload.get("perfil_id"),
+        }
+        if payload.get("exp") is not None:
+            cache_tokens.set(token, principal, payload["exp"])
+        request.state.usuario = principal
+        return principal
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
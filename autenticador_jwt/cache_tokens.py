@@ -0,0 +1,59 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+import config
+
+TOKEN_CACHE_MAX = int(os.getenv("TOKEN_CACHE_MAX", "10000"))
+
+
+class CacheTokens:
+    """Cache LRU de tokens já validados, válido até o ``exp`` de cada token."""
+
+    def __init__(self, tamanho_max: int):
+        self.tamanho_max = tamanho_max
+        self._itens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _chave(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        chave = self._chave(token)
+        item = self._itens.get(chave)
+        if item is None:
+            self.misses += 1
+            return None
+        principal, exp = item
+        if exp <= time.time():
+            del self._itens[chave]
+            self.misses += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.hits += 1
+        return dict(principal)
+
+    def set(self, token: str, principal: dict, exp: float):
+        if self.tamanho_max <= 0:
+            return
+        chave = self._chave(token)
+        self._itens[chave] = (dict(principal), exp)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.tamanho_max:
+            self._itens.popitem(last=False)
+
+    def limpar(self):
+        self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        return {
+            "tamanho": len(self._itens),
+            "tamanho_max": self.tamanho_max,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+cache_tokens = CacheTokens(TOKEN_CACHE_MAX)
@@ -1,15 +1,37 @@
 from fastapi import Request, Depends, HTTPException
-from autenticador_jwt.auth import get_current_user
+from autenticador_jwt.auth import get_current_user, buscar_perfil_id
+from database.database import (
+    COOKIE_ESCRITA,
+    abrir_sessao,
+    abrir_sessao_leitura,
+    registrar_escrita_cliente,
+)
 from starlette import status
 
 
 def only_for(ocupacoes: list[str]):
-    def verificar_ocupacao(user=Depends(get_current_user)):
+    async def verificar_ocupacao(user=Depends(get_current_user)):
         if user["ocupacao"] not in ocupacoes:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Você não tem permissão para acessar este recurso.",
             )
+        # Tokens emitidos antes da claim perfil_id: resolve o id no banco, numa
+        # sessão aberta só nesse caso
+        if user.get("perfil_id") is None:
+            async with abrir_sessao() as db:
+                user["perfil_id"] = await buscar_perfil_id(
+                    user["id"], user["ocupacao"], db
+                )
         return user
 
     return verificar_ocupacao
+
+
+# Sessão para rotas somente leitura: vai para uma réplica, exceto logo depois
+# de o próprio usuário ter escrito (ele precisa ver o que acabou de gravar),
+# neste worker ou em outro (cookie de última escrita)
+async def get_db_leitura(request: Request, user=Depends(get_current_user)):
+    registrar_escrita_cliente(user["id"], request.cookies.get(COOKIE_ESCRITA))
+    async with abrir_sessao_leitura(user["id"]) as db:
+        yield db
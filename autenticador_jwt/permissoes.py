@@ -0,0 +1,92 @@
+import os
+import time
+from sqlalchemy import literal, select, union_all
+from database import models
+
+# Validade das permissões em cache, em segundos. A invalidação explícita só
+# alcança o processo que alterou as atribuições; com vários workers, o TTL
+# limita por quanto tempo os demais podem usar um conjunto desatualizado.
+PERMISSOES_TTL = float(os.getenv("PERMISSOES_TTL", "300"))
+
+
+class PermissoesProfessor:
+    """Ids das matérias e salas em que o professor leciona, e os nomes das
+    matérias (usados nas notificações de notas lançadas)."""
+
+    __slots__ = ("materias", "salas", "nomes_materias")
+
+    def __init__(self, materias: frozenset, salas: frozenset, nomes_materias: dict):
+        self.materias = materias
+        self.salas = salas
+        self.nomes_materias = nomes_materias
+
+
+class CachePermissoes:
+    """Cache por professor das permissões de lançamento de notas."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._itens = {}
+        # Invalidações por professor: uma carga iniciada antes de uma
+        # invalidação não grava o resultado, que já pode estar velho
+        self._geracoes = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def obter(self, db, professor_id: int) -> PermissoesProfessor:
+        item = self._itens.get(professor_id)
+        if item is not None and item[1] > time.monotonic():
+            self.hits += 1
+            return item[0]
+        self.misses += 1
+
+        geracao = self._geracoes.get(professor_id, 0)
+        permissoes = await carregar_permissoes(db, professor_id)
+        if self.ttl > 0 and self._geracoes.get(professor_id, 0) == geracao:
+            self._itens[professor_id] = (permissoes, time.monotonic() + self.ttl)
+        return permissoes
+
+    def invalidar(self, professor_id: int):
+        self._geracoes[professor_id] = self._geracoes.get(professor_id, 0) + 1
+        self._itens.pop(professor_id, None)
+
+    def limpar(self):
+        for professor_id in list(self._itens):
+            self.invalidar(professor_id)
+
+    def estatisticas(self) -> dict:
+        return {"tamanho": len(self._itens), "hits": self.hits, "misses": self.misses}
+
+
+# Matérias (com os nomes) e salas do professor numa única ida ao banco
+async def carregar_permissoes(db, professor_id: int) -> PermissoesProfessor:
+    consulta = union_all(
+        select(
+            literal("materia").label("tipo"),
+            models.Materia.id.label("id"),
+            models.Materia.nome.label("nome"),
+        )
+        .join(
+            models.professor_materia,
+            models.professor_materia.c.materia_id == models.Materia.id,
+        )
+        .where(models.professor_materia.c.professor_id == professor_id),
+        select(
+            literal("sala").label("tipo"),
+            models.professor_sala.c.sala_id.label("id"),
+            literal(None).label("nome"),
+        ).where(models.professor_sala.c.professor_id == professor_id),
+    )
+    nomes_materias = {}
+    salas = set()
+    for tipo, id_, nome in (await db.execute(consulta)).all():
+        if tipo == "materia":
+            nomes_materias[id_] = nome
+        else:
+            salas.add(id_)
+    return PermissoesProfessor(
+        frozenset(nomes_materias), frozenset(salas), nomes_materias
+    )
+
+
+cache_permissoes = CachePermissoes(PERMISSOES_TTL)
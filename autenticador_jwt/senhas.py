@@ -0,0 +1,110 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette import status
+from monitoramento.perfil import medir
+
+# O bcrypt custa ~250 ms de CPU por chamada, então hash e verificação rodam
+# num pool limitado fora do event loop. HASH_EXECUTOR escolhe "thread" (o bcrypt
+# libera o GIL) ou "process"; HASH_FILA_MAX > 0 recusa pedidos quando a fila
+# de espera passa desse tamanho.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_FILA_MAX = int(os.getenv("HASH_FILA_MAX", "0"))
+
+bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = None
+_semaforo = None
+_semaforo_loop = None
+_estado = {"em_execucao": 0, "na_fila": 0, "concluidos": 0, "recusados": 0}
+
+
+def _hash(password: str) -> str:
+    return bcrypt_context.hash(password)
+
+
+def _verificar(password: str, hashed_password: str) -> bool:
+    return bcrypt_context.verify(password, hashed_password)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=HASH_WORKERS, thread_name_prefix="bcrypt"
+            )
+    return _executor
+
+
+def _get_semaforo():
+    # O semáforo fica preso ao loop em que foi usado; recria se o loop mudou
+    global _semaforo, _semaforo_loop
+    loop = asyncio.get_running_loop()
+    if _semaforo is None or _semaforo_loop is not loop:
+        _semaforo = asyncio.Semaphore(HASH_WORKERS)
+        _semaforo_loop = loop
+    return _semaforo
+
+
+async def _executar(funcao, *args):
+    if HASH_FILA_MAX and _estado["na_fila"] >= HASH_FILA_MAX:
+        _estado["recusados"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, tente novamente.",
+            headers={"Retry-After": "1"},
+        )
+
+    semaforo = _get_semaforo()
+    _estado["na_fila"] += 1
+    try:
+        await semaforo.acquire()
+    finally:
+        _estado["na_fila"] -= 1
+
+    _estado["em_execucao"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with medir("bcrypt"):
+            return await loop.run_in_executor(_get_executor(), funcao, *args)
+    finally:
+        _estado["em_execucao"] -= 1
+        _estado["concluidos"] += 1
+        semaforo.release()
+
+
+async def gerar_hash(password: str) -> str:
+    return await _executar(_hash, password)
+
+
+async def gerar_hashes(passwords: list[str]) -> list[str]:
+    # Importações em massa usam no máximo metade do pool, deixando vaga
+    # para os logins interativos que chegam no meio do lote
+    limite = asyncio.Semaphore(max(1, HASH_WORKERS // 2))
+
+    async def _gerar(password):
+        async with limite:
+            return await gerar_hash(password)
+
+    return await asyncio.gather(*(_gerar(password) for password in passwords))
+
+
+async def verificar_senha(password: str, hashed_password: str) -> bool:
+    return await _executar(_verificar, password, hashed_password)
+
+
+def estatisticas() -> dict:
+    return {"executor": HASH_EXECUTOR, "workers": HASH_WORKERS, **_estado}
+
+
+def encerrar_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
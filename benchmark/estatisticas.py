@@ -0,0 +1,162 @@
+"""Compara o cálculo das estatísticas de notas: laço no ORM x NumPy.
+
+Mede a carga e o cálculo (médias por aluno, média, desvio, percentis e
+posição por sala×matéria) dos dois jeitos sobre o mesmo banco e confere se
+os resultados batem::
+
+    python -m benchmark.estatisticas --semear --alunos 20000 --notas 1000000
+    python -m benchmark.estatisticas
+
+O banco usado é o de --url (padrão ``sqlite:///./benchmark.db``).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+
+def calcular_orm(session):
+    from sqlalchemy import select
+    from database import models
+
+    inicio = time.perf_counter()
+    linhas = session.execute(
+        select(models.Nota, models.Aluno.sala_id)
+        .join(models.Aluno, models.Nota.aluno_id == models.Aluno.id)
+        .where(models.Aluno.sala_id.is_not(None))
+    ).all()
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    notas_por_aluno = defaultdict(list)
+    for nota, sala_id in linhas:
+        notas_por_aluno[(sala_id, nota.materia_id, nota.aluno_id)].append(nota.nota)
+    medias_por_grupo = defaultdict(dict)
+    for (sala_id, materia_id, aluno_id), valores in notas_por_aluno.items():
+        medias_por_grupo[(sala_id, materia_id)][aluno_id] = statistics.fmean(valores)
+
+    grupos = {}
+    for chave, medias in medias_por_grupo.items():
+        valores = sorted(medias.values())
+        if len(valores) > 1:
+            percentis = statistics.quantiles(valores, n=100, method="inclusive")
+        else:
+            percentis = valores * 99
+        ordenados = sorted(
+            ((aluno_id, round(media, 6)) for aluno_id, media in medias.items()),
+            key=lambda item: -item[1],
+        )
+        posicoes = {}
+        for indice, (aluno_id, media) in enumerate(ordenados):
+            if indice and media == ordenados[indice - 1][1]:
+                posicoes[aluno_id] = posicoes[ordenados[indice - 1][0]]
+            else:
+                posicoes[aluno_id] = indice + 1
+        grupos[chave] = {
+            "media": statistics.fmean(valores),
+            "desvio": statistics.pstdev(valores),
+            "p50": percentis[49],
+            "posicoes": posicoes,
+        }
+    calculo = time.perf_counter() - inicio
+    return grupos, len(linhas), carga, calculo
+
+
+async def calcular_numpy(session):
+    from database.database import SessaoSincrona
+    from database.estatisticas_notas import carregar_notas, classificar
+
+    inicio = time.perf_counter()
+    notas = await carregar_notas(SessaoSincrona(session))
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    classificacao = classificar(notas)
+    p50 = classificacao.percentil(50)
+    calculo = time.perf_counter() - inicio
+    return classificacao, p50, len(notas), carga, calculo
+
+
+def conferir(grupos_orm, classificacao, p50):
+    for i, (sala_id, materia_id) in enumerate(
+        zip(classificacao.grupo_sala, classificacao.grupo_materia)
+    ):
+        grupo = grupos_orm[(int(sala_id), int(materia_id))]
+        assert abs(grupo["media"] - classificacao.media_grupo[i]) < 1e-9
+        assert abs(grupo["desvio"] - classificacao.desvio_grupo[i]) < 1e-9
+        assert abs(grupo["p50"] - p50[i]) < 1e-9
+    for sala_id, materia_id, aluno_id, posicao in zip(
+        classificacao.sala,
+        classificacao.materia,
+        classificacao.aluno,
+        classificacao.posicao,
+    ):
+        grupo = grupos_orm[(int(sala_id), int(materia_id))]
+        assert grupo["posicoes"][int(aluno_id)] == posicao
+    assert len(grupos_orm) == len(classificacao.inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--semear", action="store_true")
+    parser.add_argument("--alunos", type=int, default=20_000)
+    parser.add_argument("--professores", type=int, default=200)
+    parser.add_argument("--salas", type=int, default=400)
+    parser.add_argument("--materias", type=int, default=12)
+    parser.add_argument("--notas", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    os.environ["URL_DATABASE"] = args.url
+    os.environ["DB_ASYNC"] = "false"
+
+    from database.database import SessionLocal, engine
+
+    if args.semear:
+        from autenticador_jwt.senhas import bcrypt_context
+        from benchmark.semear import SENHA_PADRAO, semear
+        from database.esquema import criar_esquema
+
+        criar_esquema(engine)
+        inicio = time.perf_counter()
+        semear(
+            engine,
+            bcrypt_context.hash(SENHA_PADRAO),
+            alunos=args.alunos,
+            professores=args.professores,
+            salas=args.salas,
+            materias=args.materias,
+            notas=args.notas,
+        )
+        print(f"semeadura: {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    with SessionLocal() as session:
+        grupos_orm, linhas, carga_orm, calculo_orm = calcular_orm(session)
+    with SessionLocal() as session:
+        classificacao, p50, _, carga_numpy, calculo_numpy = asyncio.run(
+            calcular_numpy(session)
+        )
+    conferir(grupos_orm, classificacao, p50)
+
+    resultado = {
+        "notas": linhas,
+        "grupos": len(grupos_orm),
+        "orm": {"carga_s": round(carga_orm, 3), "calculo_s": round(calculo_orm, 3)},
+        "numpy": {
+            "carga_s": round(carga_numpy, 3),
+            "calculo_s": round(calculo_numpy, 3),
+        },
+        "aceleracao": round(
+            (carga_orm + calculo_orm) / (carga_numpy + calculo_numpy), 1
+        ),
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Benchmark do portal contra um banco local (SQLite ou PostgreSQL).
+
+Semeia uma escola sintética e dispara cenários de carga contra o app FastAPI
+real, em processo, via transporte ASGI do httpx::
+
+    python -m benchmark.executar --semear --notas 1000000
+    python -m benchmark.executar --saida base.json
+    python -m benchmark.executar --comparar base.json
+
+Antes dos cenários mede também o tempo de inicialização: importar ``main`` e
+subir o lifespan do app num processo novo, como cada worker faz.
+
+O banco usado é o de --url (padrão ``sqlite:///./benchmark.db``), nunca o
+URL_DATABASE do ambiente.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+CENARIOS = ("login", "leitura_notas", "lancamento_notas", "busca_admin")
+
+# Executado num processo novo: tempo de import do app e do startup do lifespan
+CODIGO_INICIALIZACAO = """
+import asyncio, time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+
+async def subir():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+pronto = asyncio.run(subir())
+print(importado - inicio, pronto - inicio)
+"""
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+async def rodar_cenario(cliente, gerar_requisicao, total: int, concorrencia: int):
+    latencias = []
+    erros = 0
+    pendentes = iter(range(total))
+
+    async def trabalhador():
+        nonlocal erros
+        for indice in pendentes:
+            metodo, url, opcoes = gerar_requisicao(indice)
+            inicio = time.perf_counter()
+            resposta = await cliente.request(metodo, url, **opcoes)
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code >= 400:
+                erros += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "requisicoes": total,
+        "erros": erros,
+        "duracao_s": round(duracao, 3),
+        "rps": round(total / duracao, 1) if duracao else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+    }
+
+
+def medir_inicializacao(repeticoes: int) -> dict:
+    imports, prontos = [], []
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, "-c", CODIGO_INICIALIZACAO],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        imports.append(float(saida[-2]))
+        prontos.append(float(saida[-1]))
+    return {
+        "repeticoes": repeticoes,
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "pronto_ms": round(statistics.median(prontos) * 1000, 1),
+        "pronto_max_ms": round(max(prontos) * 1000, 1),
+    }
+
+
+def carregar_escola(engine):
+    from sqlalchemy import func, select
+    from database import models
+
+    with engine.connect() as conn:
+        alunos = conn.scalar(select(func.count()).select_from(models.Aluno))
+        materias_por_professor = {}
+        for professor_id, materia_id in conn.execute(
+            select(
+                models.professor_materia.c.professor_id,
+                models.professor_materia.c.materia_id,
+            )
+        ):
+            materias_por_professor.setdefault(professor_id, []).append(materia_id)
+        # O professor só lança notas para alunos das salas em que leciona
+        alunos_por_professor = {}
+        for professor_id, aluno_id in conn.execute(
+            select(models.professor_sala.c.professor_id, models.Aluno.id).join(
+                models.Aluno, models.Aluno.sala_id == models.professor_sala.c.sala_id
+            )
+        ):
+            alunos_por_professor.setdefault(professor_id, []).append(aluno_id)
+    if not alunos:
+        raise SystemExit("Banco vazio: rode com --semear primeiro.")
+    return alunos, materias_por_professor, alunos_por_professor
+
+
+async def executar(args, aplicacao):
+    import httpx
+    from autenticador_jwt import auth
+    from benchmark.semear import SENHA_PADRAO, cpf_sintetico
+    from database.database import engine, fechar_engines
+
+    alunos, materias_por_professor, alunos_por_professor = carregar_escola(engine)
+    professores = sorted(materias_por_professor.keys() & alunos_por_professor.keys())
+    aleatorio = random.Random(7)
+
+    # Tokens gerados direto, para os cenários de leitura/escrita não
+    # dependerem do custo do login
+    def token(username, user_id, ocupacao, perfil_id):
+        valor = auth.create_access_token(
+            username, user_id, ocupacao, timedelta(hours=1), perfil_id
+        )
+        return {"Authorization": f"Bearer {valor}"}
+
+    tokens_alunos = {}
+
+    def cabecalho_aluno(aluno_id):
+        if aluno_id not in tokens_alunos:
+            tokens_alunos[aluno_id] = token(
+                f"aluno{aluno_id}", aluno_id, "aluno", aluno_id
+            )
+        return tokens_alunos[aluno_id]
+
+    # No semeador o usuário do professor p tem id alunos + p
+    tokens_professores = {
+        p: token(f"prof{p}", alunos + p, "professor", p) for p in professores
+    }
+
+    token_admin = token("admin", 0, "admin", 0)
+
+    def login(_):
+        aluno_id = aleatorio.randint(1, alunos)
+        dados = {"username": f"aluno{aluno_id}", "password": SENHA_PADRAO}
+        return "POST", "/auth/token", {"data": dados}
+
+    def leitura_notas(_):
+        aluno_id = aleatorio.randint(1, alunos)
+        return "GET", "/aluno/notas", {"headers": cabecalho_aluno(aluno_id)}
+
+    def lancamento_notas(_):
+        professor_id = aleatorio.choice(professores)
+        nota = {
+            "aluno_id": aleatorio.choice(alunos_por_professor[professor_id]),
+            "materia_id": aleatorio.choice(materias_por_professor[professor_id]),
+            "nota": round(aleatorio.uniform(0, 10), 1),
+        }
+        return (
+            "POST",
+            "/professor/lançarnotas/",
+            {"headers": tokens_professores[professor_id], "json": nota},
+        )
+
+    # Mistura das buscas do painel: por sala, CPF, matrícula e prefixo
+    def busca_admin(i):
+        aluno_id = aleatorio.randint(1, alunos)
+        filtros = [
+            {"sala_id": aleatorio.randint(1, args.salas)},
+            {"cpf": cpf_sintetico(aluno_id)},
+            {"matricula": f"B-{aluno_id}"},
+            {"username": f"aluno{aluno_id}"},
+        ][i % 4]
+        return "GET", "/admin/alunos", {"headers": token_admin, "params": filtros}
+
+    geradores = {
+        "login": (login, args.requisicoes_login),
+        "leitura_notas": (leitura_notas, args.requisicoes),
+        "lancamento_notas": (lancamento_notas, args.requisicoes),
+        "busca_admin": (busca_admin, args.requisicoes),
+    }
+
+    resultados = {}
+    transporte = httpx.ASGITransport(app=aplicacao.app)
+    async with httpx.AsyncClient(
+        transport=transporte, base_url="http://benchmark", timeout=None
+    ) as cliente:
+        for nome in args.cenarios:
+            gerar, total = geradores[nome]
+            resultados[nome] = await rodar_cenario(
+                cliente, gerar, total, args.concorrencia
+            )
+            print(f"{nome}: {resultados[nome]}", file=sys.stderr)
+    await fechar_engines()
+    return resultados
+
+
+def comparar(atual: dict, base: dict):
+    print(f"{'cenário':<18} {'métrica':<8} {'base':>10} {'atual':>10} {'variação':>9}")
+    for nome, metricas in atual["cenarios"].items():
+        anteriores = base.get("cenarios", {}).get(nome)
+        if not anteriores:
+            continue
+        for chave in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            antes, depois = anteriores[chave], metricas[chave]
+            variacao = (depois - antes) / antes * 100 if antes else 0.0
+            print(f"{nome:<18} {chave:<8} {antes:>10} {depois:>10} {variacao:>+8.1f}%")
+    if "inicializacao" in atual and "inicializacao" in base:
+        for chave in ("import_ms", "pronto_ms"):
+            antes = base["inicializacao"][chave]
+            depois = atual["inicializacao"][chave]
+            variacao = (depois - antes) / antes * 100 if antes else 0.0
+            print(
+                f"{'inicialização':<18} {chave:<8} {antes:>10} {depois:>10} "
+                f"{variacao:>+8.1f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--async", dest="assincrono", action="store_true")
+    parser.add_argument("--semear", action="store_true")
+    parser.add_argument("--alunos", type=int, default=2000)
+    parser.add_argument("--professores", type=int, default=100)
+    parser.add_argument("--salas", type=int, default=60)
+    parser.add_argument("--materias", type=int, default=12)
+    parser.add_argument("--notas", type=int, default=200_000)
+    parser.add_argument("--requisicoes", type=int, default=500)
+    parser.add_argument("--requisicoes-login", type=int, default=50)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument(
+        "--cenarios", type=lambda v: v.split(","), default=list(CENARIOS)
+    )
+    parser.add_argument(
+        "--inicializacoes",
+        type=int,
+        default=5,
+        help="processos novos para medir a inicialização (0 desliga)",
+    )
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior")
+    args = parser.parse_args()
+
+    # O app lê a configuração do ambiente ao ser importado
+    os.environ["URL_DATABASE"] = args.url
+    os.environ["DB_ASYNC"] = "true" if args.assincrono else "false"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("PERFIL_ATIVO", "false")
+
+    aplicacao = importlib.import_module("main")
+
+    if args.semear:
+        from autenticador_jwt.senhas import bcrypt_context
+        from benchmark.semear import SENHA_PADRAO, semear
+        from database.database import engine
+        from database.esquema import criar_esquema
+
+        criar_esquema(engine)
+        inicio = time.perf_counter()
+        semear(
+            engine,
+            bcrypt_context.hash(SENHA_PADRAO),
+            alunos=args.alunos,
+            professores=args.professores,
+            salas=args.salas,
+            materias=args.materias,
+            notas=args.notas,
+        )
+        print(f"semeadura: {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    resultado = {
+        "config": {
+            "url": args.url.split("://", 1)[0],
+            "async": args.assincrono,
+            "concorrencia": args.concorrencia,
+        },
+    }
+    if args.inicializacoes:
+        resultado["inicializacao"] = medir_inicializacao(args.inicializacoes)
+    resultado["cenarios"] = asyncio.run(executar(args, aplicacao))
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            comparar(resultado, json.load(arquivo))
+
+
+if __name__ == "__main__":
+    main()
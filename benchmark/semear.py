@@ -0,0 +1,165 @@
+import random
+from datetime import date, timedelta
+from sqlalchemy import func, insert, select, text
+from database import models
+from database.resumos import reconstruir_resumos
+
+# Todos os usuários sintéticos usam a mesma senha (e o mesmo hash, para não
+# pagar um bcrypt por usuário na semeadura)
+SENHA_PADRAO = "senha12345"
+LOTE_INSERCAO = 50_000
+
+
+def _inserir(conn, modelo, linhas):
+    for inicio in range(0, len(linhas), LOTE_INSERCAO):
+        fim = inicio + LOTE_INSERCAO
+        conn.execute(insert(modelo), linhas[inicio:fim])
+
+
+# CPF válido derivado do número do aluno (para as buscas por CPF)
+def cpf_sintetico(numero: int) -> str:
+    digitos = f"{100_000_000 + numero:09d}"
+    for peso in (10, 11):
+        soma = sum(int(d) * (peso - i) for i, d in enumerate(digitos))
+        resto = soma % 11
+        digitos += "0" if resto < 2 else str(11 - resto)
+    return digitos
+
+
+def semear(
+    engine,
+    hashed_password: str,
+    alunos: int = 2000,
+    professores: int = 100,
+    salas: int = 60,
+    materias: int = 12,
+    notas: int = 200_000,
+    semente: int = 42,
+):
+    """Cria uma escola sintética com inserts em lote, numa transação só."""
+    aleatorio = random.Random(semente)
+    with engine.begin() as conn:
+        if conn.scalar(select(func.count()).select_from(models.User)):
+            raise RuntimeError("O banco já tem usuários; use um banco vazio.")
+
+        _inserir(
+            conn,
+            models.Salas,
+            [{"id": i, "sala": f"S{i}"} for i in range(1, salas + 1)],
+        )
+        _inserir(
+            conn,
+            models.Materia,
+            [{"id": i, "nome": f"Materia {i}"} for i in range(1, materias + 1)],
+        )
+
+        usuarios = [
+            {
+                "id": i,
+                "username": f"aluno{i}",
+                "ocupacao": "aluno",
+                "hashed_password": hashed_password,
+            }
+            for i in range(1, alunos + 1)
+        ] + [
+            {
+                "id": alunos + i,
+                "username": f"prof{i}",
+                "ocupacao": "professor",
+                "hashed_password": hashed_password,
+            }
+            for i in range(1, professores + 1)
+        ]
+        _inserir(conn, models.User, usuarios)
+        _inserir(
+            conn,
+            models.Aluno,
+            [
+                {"id": i, "usuario_id": i, "sala_id": aleatorio.randint(1, salas)}
+                for i in range(1, alunos + 1)
+            ],
+        )
+        _inserir(
+            conn,
+            models.Matricula,
+            [{"aluno_id": i, "numero": f"B-{i}"} for i in range(1, alunos + 1)],
+        )
+        _inserir(
+            conn,
+            models.InfoAluno,
+            [
+                {
+                    "aluno_id": i,
+                    "cpf": cpf_sintetico(i),
+                    "telefone": "11999990000",
+                    "endereco": f"Rua {i}",
+                    "data_nascimento": date(2010, 1, 1),
+                    "email": f"aluno{i}@escola.test",
+                    "serie": "1",
+                }
+                for i in range(1, alunos + 1)
+            ],
+        )
+        _inserir(
+            conn,
+            models.Professor,
+            [{"id": i, "usuario_id": alunos + i} for i in range(1, professores + 1)],
+        )
+
+        # Cada matéria tem ao menos um professor; cada professor dá aula em
+        # até 3 salas
+        professores_da_materia = {m: [] for m in range(1, materias + 1)}
+        for professor_id in range(1, professores + 1):
+            materia_id = (professor_id - 1) % materias + 1
+            professores_da_materia[materia_id].append(professor_id)
+        _inserir(
+            conn,
+            models.professor_materia,
+            [
+                {"professor_id": p, "materia_id": m}
+                for m, ps in professores_da_materia.items()
+                for p in ps
+            ],
+        )
+        _inserir(
+            conn,
+            models.professor_sala,
+            [
+                {"professor_id": p, "sala_id": s}
+                for p in range(1, professores + 1)
+                for s in aleatorio.sample(range(1, salas + 1), min(3, salas))
+            ],
+        )
+
+        materias_com_professor = [m for m, ps in professores_da_materia.items() if ps]
+        hoje = date.today()
+        linhas = []
+        for _ in range(notas):
+            materia_id = aleatorio.choice(materias_com_professor)
+            linhas.append(
+                {
+                    "aluno_id": aleatorio.randint(1, alunos),
+                    "professor_id": aleatorio.choice(
+                        professores_da_materia[materia_id]
+                    ),
+                    "materia_id": materia_id,
+                    "nota": round(aleatorio.uniform(0, 10), 1),
+                    "data_lancamento": hoje - timedelta(days=aleatorio.randint(0, 365)),
+                }
+            )
+            if len(linhas) == LOTE_INSERCAO:
+                _inserir(conn, models.Nota, linhas)
+                linhas = []
+        _inserir(conn, models.Nota, linhas)
+
+        reconstruir_resumos(conn)
+
+        if conn.dialect.name == "postgresql":
+            # Os ids foram inseridos à mão; acerta as sequências dos serials
+            for tabela in ("usuarios", "alunos", "professores", "salas", "materias"):
+                conn.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), "
+                        f"(SELECT max(id) FROM {tabela}))"
+                    )
+                )
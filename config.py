@@ -0,0 +1,10 @@
+import os
+from dotenv import load_dotenv
+
+# O .env é lido uma vez só, no primeiro import deste módulo. Os módulos que
+# leem variáveis de ambiente ao serem importados importam este antes.
+load_dotenv()
+
+
+def ativado(nome: str, padrao: str = "false") -> bool:
+    return os.getenv(nome, padrao).lower() in ("1", "true", "sim")
@@ -1,15 +1,366 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from database.pool import estatisticas, opcoes_engine
+from fastapi import Request
+from config import ativado
+import itertools
+import math
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import time
 
 URL_DATABASE = os.getenv("URL_DATABASE")
 
-engine = create_engine(URL_DATABASE)
+# DB_ASYNC=true usa AsyncSession (asyncpg/aiosqlite); caso contrário a Session
+# síncrona roda em threads. Os dois modos expõem a mesma interface às rotas.
+DB_ASYNC = ativado("DB_ASYNC")
+
+# Réplicas de leitura, separadas por vírgula. Depois de escrever, o usuário lê
+# do primário por REPLICA_JANELA segundos; uma réplica que falhar ao conectar
+# fica fora do rodízio por REPLICA_PAUSA segundos.
+URLS_REPLICAS = [
+    url.strip()
+    for url in os.getenv("URL_DATABASE_REPLICAS", "").split(",")
+    if url.strip()
+]
+REPLICA_JANELA = float(os.getenv("REPLICA_JANELA", "5"))
+REPLICA_PAUSA = float(os.getenv("REPLICA_PAUSA", "30"))
+
+engine = create_engine(URL_DATABASE, **opcoes_engine(URL_DATABASE))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 base = declarative_base()
+
+
+# Drivers assíncronos para cada dialeto suportado
+DRIVERS_ASYNC = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def url_async(url: str) -> str:
+    esquema, resto = url.split("://", 1)
+    dialeto = esquema.split("+", 1)[0]
+    if dialeto not in DRIVERS_ASYNC:
+        raise ValueError(f"Banco sem driver assíncrono suportado: {dialeto}")
+    return f"{DRIVERS_ASYNC[dialeto]}://{resto}"
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(
+        url_async(URL_DATABASE), **opcoes_engine(URL_DATABASE, assincrono=True)
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+# Fecha as conexões de todos os pools (ex.: ao encerrar o processo)
+async def fechar_engines():
+    if DB_ASYNC:
+        await async_engine.dispose()
+        for replica in replicas:
+            await replica.engine.dispose()
+    else:
+        for replica in replicas:
+            replica.engine.dispose()
+    engine.dispose()
+
+
+# Retrato do pool em uso (conexões ocupadas, overflow, tempo de espera)
+def estatisticas_pool() -> dict:
+    if DB_ASYNC:
+        return estatisticas(async_engine.sync_engine.pool)
+    return estatisticas(engine.pool)
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.fora_ate = 0.0
+        if DB_ASYNC:
+            self.engine = create_async_engine(
+                url_async(url), **opcoes_engine(url, assincrono=True)
+            )
+            self.fabrica = async_sessionmaker(
+                self.engine, autoflush=False, expire_on_commit=False
+            )
+        else:
+            self.engine = create_engine(url, **opcoes_engine(url))
+            self.fabrica = sessionmaker(
+                autocommit=False, autoflush=False, bind=self.engine
+            )
+
+
+replicas = [Replica(url) for url in URLS_REPLICAS]
+_rodizio = itertools.count()
+
+
+# Engines síncronas por baixo de todos os bancos configurados (para hooks)
+def todas_engines() -> list:
+    engines = [engine]
+    if DB_ASYNC:
+        engines.append(async_engine.sync_engine)
+    for replica in replicas:
+        engines.append(replica.engine.sync_engine if DB_ASYNC else replica.engine)
+    return engines
+
+
+# Num processo criado por fork (workers do servidor.py) as conexões herdadas
+# são do processo pai: o filho descarta os pools sem fechá-las e abre as suas
+def _descartar_pools():
+    for engine_sync in todas_engines():
+        engine_sync.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_descartar_pools)
+
+
+# id do usuário -> momento da última escrita dele
+_ultima_escrita = {}
+
+
+@event.listens_for(Session, "after_commit")
+def _marcar_escrita(session):
+    session.info["escreveu"] = True
+
+
+def registrar_escrita(usuario_id: int):
+    agora = time.monotonic()
+    _ultima_escrita[usuario_id] = agora
+    if len(_ultima_escrita) > 10000:
+        for chave, momento in list(_ultima_escrita.items()):
+            if agora - momento > REPLICA_JANELA:
+                del _ultima_escrita[chave]
+
+
+# Com vários workers (servidor.py) a próxima leitura pode cair em outro
+# processo, que não viu a escrita: o momento dela (epoch) vai para o cliente
+# num cookie curto e volta nas leituras seguintes. Forjar o cookie só faz o
+# próprio usuário ler do primário.
+COOKIE_ESCRITA = "ultima_escrita"
+
+
+def registrar_escrita_cliente(usuario_id: int, valor):
+    try:
+        idade = time.time() - float(valor)
+    except (TypeError, ValueError):
+        return
+    if not 0 <= idade < REPLICA_JANELA:
+        return
+    momento = time.monotonic() - idade
+    if momento > _ultima_escrita.get(usuario_id, -math.inf):
+        _ultima_escrita[usuario_id] = momento
+
+
+class CookieEscritaMiddleware:
+    """Acrescenta o cookie de última escrita às respostas de requisições que
+    gravaram algo (marcadas em request.state por get_db)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                momento = scope.get("state", {}).get("escrita")
+                if momento is not None:
+                    cookie = (
+                        f"{COOKIE_ESCRITA}={momento:.3f}; "
+                        f"Max-Age={math.ceil(REPLICA_JANELA)}; Path=/; HttpOnly; "
+                        "SameSite=Lax"
+                    )
+                    mensagem = {
+                        **mensagem,
+                        "headers": [
+                            *mensagem.get("headers", []),
+                            (b"set-cookie", cookie.encode()),
+                        ],
+                    }
+            await send(mensagem)
+
+        await self.app(scope, receive, enviar)
+
+
+def escreveu_recentemente(usuario_id) -> bool:
+    momento = _ultima_escrita.get(usuario_id)
+    return momento is not None and time.monotonic() - momento < REPLICA_JANELA
+
+
+class SessaoSincrona:
+    """Session síncrona com a interface awaitable da AsyncSession.
+
+    Cada operação que faz I/O é executada no threadpool, então as rotas
+    ``async def`` não bloqueiam o event loop no modo síncrono.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def _executar(self, statement, *args, **kwargs):
+        resultado = self.sync_session.execute(statement, *args, **kwargs)
+        if not getattr(resultado, "returns_rows", True):
+            return resultado
+        # Bufferiza as linhas ainda na thread, como faz a AsyncSession;
+        # resultados do ORM sem linhas (insert em lote) não são congeláveis
+        try:
+            return resultado.freeze()()
+        except NotImplementedError:
+            return resultado
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self._executar, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, statement, *args, **kwargs
+        )
+
+    # Como AsyncSession.stream: as linhas ficam no cursor do servidor e são
+    # buscadas aos poucos, sem bufferizar o resultado inteiro
+    async def stream(self, statement, *args, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        resultado = await run_in_threadpool(
+            self.sync_session.execute, statement, *args, **kwargs
+        )
+        return ResultadoStream(resultado)
+
+    async def scalars(self, statement, *args, **kwargs):
+        resultado = await self.execute(statement, *args, **kwargs)
+        return resultado.scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def connection(self):
+        return await run_in_threadpool(self.sync_session.connection)
+
+    @property
+    def info(self):
+        return self.sync_session.info
+
+
+class ResultadoStream:
+    """Resultado de SessaoSincrona.stream, lido em partições no threadpool."""
+
+    def __init__(self, resultado):
+        self._resultado = resultado
+
+    async def partitions(self, tamanho=None):
+        particoes = self._resultado.partitions(tamanho)
+        while True:
+            particao = await run_in_threadpool(next, particoes, None)
+            if particao is None:
+                break
+            yield particao
+
+    async def close(self):
+        await run_in_threadpool(self._resultado.close)
+
+
+def nova_sessao(fabrica=None):
+    if DB_ASYNC:
+        return (fabrica or AsyncSessionLocal)()
+    return SessaoSincrona((fabrica or SessionLocal)(expire_on_commit=False))
+
+
+# Sessão no modo configurado; usada fora das dependências (ex.: streaming)
+@asynccontextmanager
+async def abrir_sessao():
+    db = nova_sessao()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# Próxima réplica do rodízio que aceitar conexão; None manda para o primário
+async def _sessao_replica(usuario_id=None):
+    if not replicas or escreveu_recentemente(usuario_id):
+        return None
+    inicio = next(_rodizio)
+    for deslocamento in range(len(replicas)):
+        replica = replicas[(inicio + deslocamento) % len(replicas)]
+        if replica.fora_ate > time.monotonic():
+            continue
+        db = nova_sessao(replica.fabrica)
+        try:
+            await db.connection()
+        except (DBAPIError, OSError):
+            await db.close()
+            replica.fora_ate = time.monotonic() + REPLICA_PAUSA
+            continue
+        return db
+    return None
+
+
+# Sessão somente leitura: réplica quando houver, senão o primário
+@asynccontextmanager
+async def abrir_sessao_leitura(usuario_id=None):
+    db = await _sessao_replica(usuario_id) or nova_sessao()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# Dependência de sessão compartilhada por todas as rotas de escrita. Se a
+# requisição gravou algo, o usuário passa a ler do primário por um tempo.
+async def get_db(request: Request):
+    async with abrir_sessao() as db:
+        yield db
+        usuario = getattr(request.state, "usuario", None)
+        if usuario and db.info.get("escreveu"):
+            registrar_escrita(usuario["id"])
+            request.state.escrita = time.time()
+
+
+# Executa funcao(conn) numa transação curta e própria, fora da sessão da
+# requisição (a conexão recebida é síncrona nos dois modos)
+async def executar_isolado(funcao):
+    if DB_ASYNC:
+        async with async_engine.begin() as conn:
+            return await conn.run_sync(funcao)
+
+    def _executar():
+        with engine.begin() as conn:
+            return funcao(conn)
+
+    return await run_in_threadpool(_executar)
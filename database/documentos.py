@@ -0,0 +1,15 @@
+from sqlalchemy import select, union
+from database.models import InfoAluno, InfoProfessor
+
+
+# CPFs do lote já cadastrados em info_aluno ou info_professor, numa consulta
+# só sobre os índices de cpf das duas tabelas
+async def cpfs_cadastrados(db, cpfs) -> set[str]:
+    cpfs = {cpf for cpf in cpfs if cpf is not None}
+    if not cpfs:
+        return set()
+    consulta = union(
+        select(InfoAluno.cpf).where(InfoAluno.cpf.in_(cpfs)),
+        select(InfoProfessor.cpf).where(InfoProfessor.cpf.in_(cpfs)),
+    )
+    return set(await db.scalars(consulta))
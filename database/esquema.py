@@ -0,0 +1,59 @@
+"""Cria as tabelas, colunas e índices que faltam no banco de URL_DATABASE::
+
+    python -m database.esquema
+
+Passo explícito de implantação: o app não mexe no esquema ao subir.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from database.database import base, engine
+from database import models  # noqa: F401 (registra as tabelas no metadata)
+
+
+# create_all só cria colunas e índices junto com tabelas novas; os que foram
+# acrescentados depois em tabelas que já existem são criados um a um
+# (Index.create respeita o ddl_if dos índices só de PostgreSQL). Colunas novas
+# precisam ser nullable; a chave estrangeira delas fica só no modelo.
+def criar_esquema(bind=engine) -> list[str]:
+    base.metadata.create_all(bind=bind)
+    criados = []
+    with bind.begin() as conn:
+        inspetor = inspect(conn)
+        for tabela in base.metadata.sorted_tables:
+            existentes = {
+                coluna["name"] for coluna in inspetor.get_columns(tabela.name)
+            }
+            for coluna in tabela.columns:
+                if coluna.name in existentes:
+                    continue
+                if not coluna.nullable:
+                    raise RuntimeError(
+                        f"Coluna {tabela.name}.{coluna.name} não é nullable; "
+                        "crie-a com uma migração manual"
+                    )
+                definicao = CreateColumn(coluna).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {definicao}"))
+                criados.append(f"coluna {tabela.name}.{coluna.name}")
+
+        antes = _indices(conn)
+        for tabela in base.metadata.sorted_tables:
+            for indice in tabela.indexes:
+                if indice.name not in antes:
+                    indice.create(conn)
+        criados += [f"índice {nome}" for nome in sorted(_indices(conn) - antes)]
+    return criados
+
+
+def _indices(conn) -> set[str]:
+    inspetor = inspect(conn)
+    return {
+        indice["name"]
+        for tabela in base.metadata.sorted_tables
+        for indice in inspetor.get_indexes(tabela.name)
+    }
+
+
+if __name__ == "__main__":
+    for nome in criar_esquema():
+        print(f"criado: {nome}")
@@ -0,0 +1,201 @@
+import itertools
+import os
+import numpy as np
+from sqlalchemy import select
+from database.models import Aluno, Nota
+
+# Média abaixo da qual o aluno entra na lista de risco de uma matéria
+NOTA_CORTE = float(os.getenv("NOTA_CORTE", "5.0"))
+# Linhas lidas do cursor por vez ao carregar as notas
+ESTATISTICAS_LOTE = int(os.getenv("ESTATISTICAS_LOTE", "50000"))
+
+PERCENTIS = (10, 25, 50, 75, 90)
+
+# Matéria usada para a classificação geral (média das médias por matéria)
+GERAL = 0
+
+
+class NotasColunas:
+    """Notas em colunas NumPy: aluno, sala (atual do aluno), matéria e nota."""
+
+    def __init__(self, aluno, sala, materia, nota):
+        self.aluno = aluno
+        self.sala = sala
+        self.materia = materia
+        self.nota = nota
+
+    def __len__(self):
+        return len(self.nota)
+
+
+# Lê só as quatro colunas necessárias, em partições de um cursor no servidor,
+# direto para arrays (sem objetos do ORM). Alunos sem sala ficam de fora.
+async def carregar_notas(db, salas_ids=None, materia_id=None) -> NotasColunas:
+    consulta = (
+        select(Nota.aluno_id, Aluno.sala_id, Nota.materia_id, Nota.nota)
+        .join(Aluno, Nota.aluno_id == Aluno.id)
+        .where(Aluno.sala_id.is_not(None))
+    )
+    if salas_ids is not None:
+        consulta = consulta.where(Aluno.sala_id.in_(salas_ids))
+    if materia_id is not None:
+        consulta = consulta.where(Nota.materia_id == materia_id)
+
+    blocos = []
+    resultado = await db.stream(consulta.execution_options(yield_per=ESTATISTICAS_LOTE))
+    try:
+        async for particao in resultado.partitions():
+            blocos.append(
+                np.fromiter(
+                    itertools.chain.from_iterable(particao),
+                    dtype=np.float64,
+                    count=4 * len(particao),
+                ).reshape(-1, 4)
+            )
+    finally:
+        await resultado.close()
+
+    dados = np.concatenate(blocos) if blocos else np.empty((0, 4))
+    return NotasColunas(
+        dados[:, 0].astype(np.int64),
+        dados[:, 1].astype(np.int64),
+        dados[:, 2].astype(np.int64),
+        dados[:, 3],
+    )
+
+
+def medias_por_aluno(notas: NotasColunas):
+    """Média de cada aluno em cada sala×matéria.
+
+    Devolve os arrays (sala, materia, aluno, media), um item por trio.
+    """
+    if not len(notas):
+        vazio = np.empty(0, dtype=np.int64)
+        return vazio, vazio, vazio, np.empty(0)
+    base_aluno = notas.aluno.max() + 1
+    base_materia = notas.materia.max() + 1
+    chave = (notas.sala * base_materia + notas.materia) * base_aluno + notas.aluno
+    chaves, inverso = np.unique(chave, return_inverse=True)
+    medias = np.bincount(inverso, weights=notas.nota) / np.bincount(inverso)
+    grupo, aluno = np.divmod(chaves, base_aluno)
+    sala, materia = np.divmod(grupo, base_materia)
+    return sala, materia, aluno, medias
+
+
+def media_geral(sala, materia, aluno, medias):
+    """Média das médias por matéria de cada aluno, como a matéria GERAL."""
+    if not len(medias):
+        return sala, materia, aluno, medias
+    base_aluno = aluno.max() + 1
+    chaves, inverso = np.unique(sala * base_aluno + aluno, return_inverse=True)
+    geral = np.bincount(inverso, weights=medias) / np.bincount(inverso)
+    sala_geral, aluno_geral = np.divmod(chaves, base_aluno)
+    return sala_geral, np.full(len(chaves), GERAL), aluno_geral, geral
+
+
+class Classificacao:
+    """Estatísticas de cada grupo sala×matéria e a posição de cada aluno.
+
+    Os arrays por aluno (sala, materia, aluno, media, posicao, z) estão
+    ordenados por grupo e, dentro dele, da maior para a menor média; ``inicio``
+    e ``tamanho`` delimitam cada grupo nesses arrays.
+    """
+
+    def __init__(self, sala, materia, aluno, medias):
+        base_materia = materia.max() + 1 if len(materia) else 1
+        grupo = sala * base_materia + materia
+        # Empates comparados com 6 casas, para o erro de ponto flutuante das
+        # médias não separar alunos com a mesma média
+        chave = np.round(medias, 6)
+        ordem = np.lexsort((-chave, grupo))
+        self.sala = sala[ordem]
+        self.materia = materia[ordem]
+        self.aluno = aluno[ordem]
+        self.media = medias[ordem]
+        grupo = grupo[ordem]
+        chave = chave[ordem]
+
+        n = len(grupo)
+        novo_grupo = np.r_[True, grupo[1:] != grupo[:-1]][:n]
+        self.inicio = np.flatnonzero(novo_grupo)
+        self.tamanho = np.diff(np.r_[self.inicio, n]).astype(np.int64)
+        self.grupo_sala = self.sala[self.inicio]
+        self.grupo_materia = self.materia[self.inicio]
+        if not n:
+            self.media_grupo = self.desvio_grupo = np.empty(0)
+            self.posicao = np.empty(0, dtype=np.int64)
+            self.z = np.empty(0)
+            return
+
+        # Média e desvio padrão (populacional) de cada grupo
+        self.media_grupo = np.add.reduceat(self.media, self.inicio) / self.tamanho
+        desvio = self.media - np.repeat(self.media_grupo, self.tamanho)
+        self.desvio_grupo = np.sqrt(
+            np.add.reduceat(desvio**2, self.inicio) / self.tamanho
+        )
+
+        # Posição com empates: quem tem a mesma média fica na mesma posição
+        inicio_por_aluno = np.repeat(self.inicio, self.tamanho)
+        novo_valor = novo_grupo | np.r_[True, chave[1:] != chave[:-1]]
+        primeiro = np.maximum.accumulate(np.where(novo_valor, np.arange(n), 0))
+        self.posicao = primeiro - inicio_por_aluno + 1
+
+        desvio_por_aluno = np.repeat(self.desvio_grupo, self.tamanho)
+        self.z = np.divide(
+            desvio,
+            desvio_por_aluno,
+            out=np.zeros(n),
+            where=desvio_por_aluno > 0,
+        )
+
+    def percentil(self, p: float) -> np.ndarray:
+        # Interpolação linear, como np.percentile; os grupos estão em ordem
+        # decrescente, então o percentil p fica na posição (1 - p) * (n - 1)
+        posicao = self.inicio + (1 - p / 100) * (self.tamanho - 1)
+        baixo = np.floor(posicao).astype(np.int64)
+        alto = np.minimum(baixo + 1, self.inicio + self.tamanho - 1)
+        fracao = posicao - baixo
+        return self.media[baixo] + (self.media[alto] - self.media[baixo]) * fracao
+
+    def grupos(self) -> list[dict]:
+        percentis = {f"p{p}": self.percentil(p) for p in PERCENTIS}
+        return [
+            {
+                "sala_id": int(self.grupo_sala[i]),
+                "materia_id": int(self.grupo_materia[i]),
+                "alunos": int(self.tamanho[i]),
+                "media": round(float(self.media_grupo[i]), 2),
+                "desvio": round(float(self.desvio_grupo[i]), 2),
+                **{
+                    chave: round(float(valores[i]), 2)
+                    for chave, valores in percentis.items()
+                },
+            }
+            for i in range(len(self.inicio))
+        ]
+
+    def alunos(self, mascara=None) -> list[dict]:
+        indices = (
+            np.flatnonzero(mascara) if mascara is not None else range(len(self.aluno))
+        )
+        return [
+            {
+                "sala_id": int(self.sala[i]),
+                "materia_id": int(self.materia[i]),
+                "aluno_id": int(self.aluno[i]),
+                "posicao": int(self.posicao[i]),
+                "media": round(float(self.media[i]), 2),
+                "z": round(float(self.z[i]), 2),
+            }
+            for i in indices
+        ]
+
+    def em_risco(self, corte: float = NOTA_CORTE) -> np.ndarray:
+        return self.media < corte
+
+
+def classificar(notas: NotasColunas, geral: bool = False) -> Classificacao:
+    colunas = medias_por_aluno(notas)
+    if geral:
+        colunas = media_geral(*colunas)
+    return Classificacao(*colunas)
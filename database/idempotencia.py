@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from database.models import ChaveIdempotencia
+import hashlib
+import itertools
+import json
+import os
+
+# Por quanto tempo a resposta guardada é devolvida às repetições da chave
+IDEMPOTENCIA_TTL_HORAS = float(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+# A cada quantas chaves gravadas (por processo) as expiradas são apagadas
+IDEMPOTENCIA_LIMPEZA = int(os.getenv("IDEMPOTENCIA_LIMPEZA", "1000"))
+
+_gravacoes = itertools.count(1)
+
+
+def impressao_requisicao(rota: str, corpo) -> str:
+    dados = json.dumps([rota, corpo], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(dados.encode()).hexdigest()
+
+
+def _limite():
+    return datetime.utcnow() - timedelta(hours=IDEMPOTENCIA_TTL_HORAS)
+
+
+# Resposta já guardada para a chave do usuário (uma leitura pela chave
+# primária); uma chave expirada é apagada e tratada como nova
+async def buscar_resposta(db, usuario_id: int, chave: str):
+    registro = await db.get(ChaveIdempotencia, (usuario_id, chave))
+    if registro is not None and registro.criado_em < _limite():
+        await db.delete(registro)
+        return None
+    return registro
+
+
+# Guarda a resposta na transação do próprio lançamento: as notas e a chave
+# são gravadas juntas ou nenhuma delas
+async def guardar_resposta(
+    db, usuario_id: int, chave: str, impressao: str, status_code: int, corpo
+):
+    db.add(
+        ChaveIdempotencia(
+            usuario_id=usuario_id,
+            chave=chave,
+            impressao=impressao,
+            status_code=status_code,
+            resposta=json.dumps(corpo, ensure_ascii=False),
+            criado_em=datetime.utcnow(),
+        )
+    )
+    if next(_gravacoes) % IDEMPOTENCIA_LIMPEZA == 0:
+        await db.execute(
+            delete(ChaveIdempotencia).where(ChaveIdempotencia.criado_em < _limite())
+        )
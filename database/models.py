@@ -1,18 +1,24 @@
 from datetime import date
 from sqlalchemy import (
     Boolean,
+    Index,
     Column,
     Integer,
     String,
     ForeignKey,
     Date,
+    DateTime,
     Table,
     Float,
+    Text,
 )
+from config import ativado
 from database.database import base
 from sqlalchemy.orm import relationship
-import random
 
+# Uma nota por aluno, matéria, professor e dia (índice único opcional, criado
+# por `python -m database.esquema` quando ligado)
+NOTAS_UNICAS_POR_DIA = ativado("NOTAS_UNICAS_POR_DIA")
 
 # Tabelas associativas (relações muitos-para-muitos)
 professor_sala = Table(
@@ -33,6 +39,16 @@ professor_materia = Table(
 # Usuários do sistema (aluno, professor ou admin)
 class User(base):
     __tablename__ = "usuarios"
+    __table_args__ = (
+        # Listagem por ocupação (keyset no id) e busca por prefixo do username;
+        # no Postgres o LIKE 'x%' só usa índice com varchar_pattern_ops
+        Index("ix_usuarios_ocupacao_id", "ocupacao", "id"),
+        Index(
+            "ix_usuarios_username_prefixo",
+            "username",
+            postgresql_ops={"username": "varchar_pattern_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, nullable=False)
@@ -42,6 +58,23 @@ class User(base):
     aluno = relationship("Aluno", back_populates="usuario", uselist=False)
     professor = relationship("Professor", back_populates="usuario", uselist=False)
     administrador = relationship("Admin", back_populates="usuario", uselist=False)
+    refresh_tokens = relationship("RefreshToken", back_populates="usuario")
+
+
+# Refresh tokens (guardamos só o HMAC do token, nunca o valor original)
+class RefreshToken(base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    criado_em = Column(DateTime, nullable=False)
+    expira_em = Column(DateTime, nullable=False, index=True)
+    revogado = Column(Boolean, default=False, nullable=False)
+    # Momento da revogação; os revogados são apagados REFRESH_REVOGADO_HORAS depois
+    revogado_em = Column(DateTime, nullable=True, index=True)
+
+    usuario = relationship("User", back_populates="refresh_tokens")
 
 
 class Admin(base):
@@ -56,6 +89,7 @@ class Admin(base):
 # Tabela de alunos
 class Aluno(base):
     __tablename__ = "alunos"
+    __table_args__ = (Index("ix_alunos_sala_id_id", "sala_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), unique=True, nullable=False)
@@ -92,16 +126,22 @@ class Matricula(base):
 
     id = Column(Integer, primary_key=True, index=True)
     numero = Column(String, unique=True, index=True)
-    aluno_id = Column(Integer, ForeignKey("alunos.id"), nullable=False)
+    aluno_id = Column(Integer, ForeignKey("alunos.id"), nullable=False, index=True)
 
     aluno = relationship("Aluno", back_populates="matriculas")
 
-    def __init__(self, aluno_id):
+    # O número vem de database.sequencias.alocador_matricula
+    def __init__(self, aluno_id, numero):
         self.aluno_id = aluno_id
-        self.numero = self.gerar_numero_matricula()
+        self.numero = numero
+
+
+# Contador dos números de matrícula (uma linha só), reservado em blocos
+class SequenciaMatricula(base):
+    __tablename__ = "sequencia_matricula"
 
-    def gerar_numero_matricula(self):
-        return f"M-{random.randint(100000, 999999)}"
+    id = Column(Integer, primary_key=True)
+    proximo = Column(Integer, nullable=False)
 
 
 # Informações pessoais do aluno
@@ -111,7 +151,7 @@ class InfoAluno(base):
     id = Column(Integer, primary_key=True)
     aluno_id = Column(Integer, ForeignKey("alunos.id"), unique=True)
 
-    cpf = Column(String, nullable=False)
+    cpf = Column(String, nullable=False, index=True)
     telefone = Column(String, nullable=False)
     endereco = Column(String, nullable=False)
     data_nascimento = Column(Date, nullable=False)
@@ -130,7 +170,7 @@ class InfoProfessor(base):
     id = Column(Integer, primary_key=True)
     professor_id = Column(Integer, ForeignKey("professores.id"), unique=True)
 
-    cpf = Column(String, nullable=False)
+    cpf = Column(String, nullable=False, index=True)
     telefone = Column(String, nullable=False)
     email = Column(String, nullable=False)
     formacao = Column(String, nullable=True)
@@ -170,6 +210,21 @@ class Materia(base):
 # Tabela de notas
 class Nota(base):
     __tablename__ = "notas"
+    __table_args__ = (
+        # Paginação por keyset das notas de um aluno, com e sem filtros
+        Index("ix_notas_aluno_id_id", "aluno_id", "id"),
+        Index("ix_notas_aluno_materia_id", "aluno_id", "materia_id", "id"),
+        Index("ix_notas_aluno_data", "aluno_id", "data_lancamento"),
+        Index("ix_notas_materia_id", "materia_id"),
+        Index(
+            "uq_notas_aluno_materia_professor_data",
+            "aluno_id",
+            "materia_id",
+            "professor_id",
+            "data_lancamento",
+            unique=True,
+        ).ddl_if(callable_=lambda *args, **kwargs: NOTAS_UNICAS_POR_DIA),
+    )
 
     id = Column(Integer, primary_key=True)
     aluno_id = Column(Integer, ForeignKey("alunos.id"), nullable=False)
@@ -177,7 +232,59 @@ class Nota(base):
     materia_id = Column(Integer, ForeignKey("materias.id"), nullable=False)
     nota = Column(Float, nullable=False)
     data_lancamento = Column(Date, default=date.today)
+    # Sala do aluno no lançamento, a mesma usada em ResumoNotasSala (nula nas
+    # notas anteriores a esta coluna: vale a sala atual do aluno)
+    sala_id = Column(Integer, ForeignKey("salas.id"), nullable=True)
 
     aluno = relationship("Aluno", back_populates="notas")
     professor = relationship("Professor", back_populates="notas")
     materia = relationship("Materia", back_populates="notas")
+
+
+# Resumo das notas por aluno e matéria, mantido junto com cada lançamento
+class ResumoNotasAluno(base):
+    __tablename__ = "resumo_notas_aluno"
+
+    aluno_id = Column(Integer, ForeignKey("alunos.id"), primary_key=True)
+    materia_id = Column(Integer, ForeignKey("materias.id"), primary_key=True)
+    quantidade = Column(Integer, nullable=False)
+    soma = Column(Float, nullable=False)
+    minimo = Column(Float, nullable=False)
+    maximo = Column(Float, nullable=False)
+
+
+# Resumo das notas por sala e matéria (sala do aluno no momento do lançamento)
+class ResumoNotasSala(base):
+    __tablename__ = "resumo_notas_sala"
+
+    sala_id = Column(Integer, ForeignKey("salas.id"), primary_key=True)
+    materia_id = Column(Integer, ForeignKey("materias.id"), primary_key=True)
+    quantidade = Column(Integer, nullable=False)
+    soma = Column(Float, nullable=False)
+    minimo = Column(Float, nullable=False)
+    maximo = Column(Float, nullable=False)
+
+
+# Versão dos dados lidos de cada recurso (ex.: notas de um aluno), incrementada
+# a cada alteração; dá o ETag/Last-Modified sem recalcular a resposta
+class VersaoRecurso(base):
+    __tablename__ = "versoes_recursos"
+
+    recurso = Column(String(30), primary_key=True)
+    recurso_id = Column(Integer, primary_key=True)
+    versao = Column(Integer, nullable=False)
+    alterado_em = Column(DateTime, nullable=False)
+
+
+# Respostas dos lançamentos de notas por Idempotency-Key, para as repetições
+# do cliente receberem o resultado original sem lançar de novo
+class ChaveIdempotencia(base):
+    __tablename__ = "chaves_idempotencia"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    chave = Column(String(100), primary_key=True)
+    # sha256 da rota + corpo, para recusar a mesma chave com outro pedido
+    impressao = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    resposta = Column(Text, nullable=False)
+    criado_em = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,100 @@
+import os
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from config import ativado
+
+# Configuração do pool de conexões (valores padrão do SQLAlchemy, exceto
+# pre-ping e recycle, que evitam conexões mortas após um failover do banco)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = ativado("DB_POOL_PRE_PING", "true")
+# Tempo máximo de cada comando no PostgreSQL, em milissegundos (0 desliga)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class MetricasPool:
+    def __init__(self):
+        self.aquisicoes = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.timeouts = 0
+
+    def registrar_espera(self, segundos: float):
+        self.aquisicoes += 1
+        self.espera_total += segundos
+        self.espera_max = max(self.espera_max, segundos)
+
+
+class _MedirEspera:
+    # Mede quanto tempo cada requisição esperou por uma conexão do pool e
+    # guarda o max_overflow configurado (o QueuePool só o tem como privado)
+    def __init__(self, *args, max_overflow: int = DB_MAX_OVERFLOW, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.metricas = MetricasPool()
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.metricas.timeouts += 1
+            raise
+        finally:
+            self.metricas.registrar_espera(time.perf_counter() - inicio)
+
+
+class PoolMedido(_MedirEspera, QueuePool):
+    pass
+
+
+class PoolAsyncMedido(_MedirEspera, AsyncAdaptedQueuePool):
+    pass
+
+
+def opcoes_engine(url: str, assincrono: bool = False) -> dict:
+    opcoes = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if url.startswith("sqlite") and (url == "sqlite://" or ":memory:" in url):
+        # SQLite em memória mantém o pool próprio do dialeto
+        return opcoes
+
+    opcoes.update(
+        poolclass=PoolAsyncMedido if assincrono else PoolMedido,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgres"):
+        if assincrono:
+            opcoes["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            }
+        else:
+            opcoes["connect_args"] = {
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            }
+    return opcoes
+
+
+def estatisticas(pool) -> dict:
+    dados = {"classe": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        dados.update(
+            tamanho=pool.size(),
+            abertas=pool.checkedin() + pool.checkedout(),
+            em_uso=pool.checkedout(),
+            livres=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, _MedirEspera):
+        dados.update(
+            max_overflow=pool.max_overflow,
+            aquisicoes=pool.metricas.aquisicoes,
+            espera_total=round(pool.metricas.espera_total, 6),
+            espera_max=round(pool.metricas.espera_max, 6),
+            timeouts=pool.metricas.timeouts,
+        )
+    return dados
@@ -0,0 +1,147 @@
+from sqlalchemy import case, delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from database.database import engine
+from database.models import Aluno, Materia, Nota, ResumoNotasAluno, ResumoNotasSala
+
+# INSERT ... ON CONFLICT DO UPDATE de cada dialeto suportado
+INSERTS_UPSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _upsert(modelo, chaves: list[str]):
+    tabela = modelo.__table__
+    comando = INSERTS_UPSERT[engine.dialect.name](tabela)
+    novo = comando.excluded
+    return comando.on_conflict_do_update(
+        index_elements=chaves,
+        set_={
+            "quantidade": tabela.c.quantidade + novo.quantidade,
+            "soma": tabela.c.soma + novo.soma,
+            "minimo": case(
+                (novo.minimo < tabela.c.minimo, novo.minimo), else_=tabela.c.minimo
+            ),
+            "maximo": case(
+                (novo.maximo > tabela.c.maximo, novo.maximo), else_=tabela.c.maximo
+            ),
+        },
+    )
+
+
+def _agrupar(notas: list[dict], chave: str) -> list[dict]:
+    grupos = {}
+    for nota in notas:
+        if nota[chave] is None:
+            continue
+        grupo = grupos.setdefault((nota[chave], nota["materia_id"]), [])
+        grupo.append(nota["nota"])
+    # Ordenado para que transações concorrentes travem as linhas na mesma ordem
+    return [
+        {
+            chave: id_grupo,
+            "materia_id": materia_id,
+            "quantidade": len(valores),
+            "soma": sum(valores),
+            "minimo": min(valores),
+            "maximo": max(valores),
+        }
+        for (id_grupo, materia_id), valores in sorted(grupos.items())
+    ]
+
+
+# Soma as notas recém-lançadas aos resumos, na transação da própria sessão.
+# Cada nota é um dict com aluno_id, sala_id, materia_id e nota.
+async def atualizar_resumos(db, notas: list[dict]):
+    por_aluno = _agrupar(notas, "aluno_id")
+    if por_aluno:
+        await db.execute(
+            _upsert(ResumoNotasAluno, ["aluno_id", "materia_id"]), por_aluno
+        )
+    por_sala = _agrupar(notas, "sala_id")
+    if por_sala:
+        await db.execute(_upsert(ResumoNotasSala, ["sala_id", "materia_id"]), por_sala)
+
+
+# Leitura dos resumos: boletim de um aluno e médias de uma sala
+def consulta_resumo(modelo, coluna, valor):
+    return (
+        select(
+            Materia.nome.label("materia"),
+            modelo.quantidade,
+            modelo.soma,
+            modelo.minimo,
+            modelo.maximo,
+        )
+        .join(Materia, modelo.materia_id == Materia.id)
+        .where(coluna == valor)
+        .order_by(Materia.nome)
+    )
+
+
+def formatar_resumo(linha) -> dict:
+    return {
+        "matéria": linha.materia,
+        "quantidade": linha.quantidade,
+        "media": round(linha.soma / linha.quantidade, 2),
+        "minima": linha.minimo,
+        "maxima": linha.maximo,
+    }
+
+
+async def boletim_aluno(db, aluno_id: int) -> list[dict]:
+    consulta = consulta_resumo(ResumoNotasAluno, ResumoNotasAluno.aluno_id, aluno_id)
+    return [formatar_resumo(linha) for linha in (await db.execute(consulta)).all()]
+
+
+async def medias_sala(db, sala_id: int) -> list[dict]:
+    consulta = consulta_resumo(ResumoNotasSala, ResumoNotasSala.sala_id, sala_id)
+    return [formatar_resumo(linha) for linha in (await db.execute(consulta)).all()]
+
+
+# Recalcula os resumos a partir da tabela de notas. A sala de cada nota é a do
+# lançamento, como em atualizar_resumos; notas antigas, sem sala gravada, usam
+# a sala atual do aluno. As versões de boletins e médias são renovadas para
+# os ETags não continuarem valendo depois da reconstrução.
+def reconstruir_resumos(conn):
+    from database.versoes import renovar_versoes_notas
+
+    if conn.dialect.name == "postgresql":
+        # Impede lançamentos durante a reconstrução
+        conn.execute(text("LOCK TABLE notas IN SHARE MODE"))
+
+    agregados = (
+        func.count(Nota.id),
+        func.sum(Nota.nota),
+        func.min(Nota.nota),
+        func.max(Nota.nota),
+    )
+    colunas = ["materia_id", "quantidade", "soma", "minimo", "maximo"]
+
+    conn.execute(delete(ResumoNotasAluno))
+    conn.execute(
+        insert(ResumoNotasAluno).from_select(
+            ["aluno_id", *colunas],
+            select(Nota.aluno_id, Nota.materia_id, *agregados).group_by(
+                Nota.aluno_id, Nota.materia_id
+            ),
+        )
+    )
+
+    sala = func.coalesce(Nota.sala_id, Aluno.sala_id)
+    conn.execute(delete(ResumoNotasSala))
+    conn.execute(
+        insert(ResumoNotasSala).from_select(
+            ["sala_id", *colunas],
+            select(sala, Nota.materia_id, *agregados)
+            .join(Aluno, Nota.aluno_id == Aluno.id)
+            .where(sala.is_not(None))
+            .group_by(sala, Nota.materia_id),
+        )
+    )
+
+    renovar_versoes_notas(conn)
+
+
+# python -m database.resumos
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        reconstruir_resumos(conn)
+    print("Resumos de notas reconstruídos.")
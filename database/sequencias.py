@@ -0,0 +1,71 @@
+import os
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from database.database import executar_isolado
+from database.models import SequenciaMatricula
+
+# Os números antigos eram sorteados entre 100000 e 999999; a sequência começa
+# acima dessa faixa para nunca colidir com eles.
+NUMERO_INICIAL = 1_000_000
+MATRICULA_BLOCO = int(os.getenv("MATRICULA_BLOCO", "100"))
+
+
+def _reservar_bloco(conn, quantidade: int) -> int:
+    # UPDATE ... RETURNING é atômico: cada processo recebe uma faixa exclusiva
+    fim = conn.scalar(
+        update(SequenciaMatricula)
+        .where(SequenciaMatricula.id == 1)
+        .values(proximo=SequenciaMatricula.proximo + quantidade)
+        .returning(SequenciaMatricula.proximo)
+    )
+    if fim is not None:
+        return fim - quantidade
+
+    # Primeira reserva: cria o contador. Se outro processo criou ao mesmo
+    # tempo, o insert falha e a reserva é refeita sobre a linha dele.
+    try:
+        with conn.begin_nested():
+            conn.execute(
+                insert(SequenciaMatricula).values(
+                    id=1, proximo=NUMERO_INICIAL + quantidade
+                )
+            )
+        return NUMERO_INICIAL
+    except IntegrityError:
+        return _reservar_bloco(conn, quantidade)
+
+
+class AlocadorMatricula:
+    """Entrega números de matrícula únicos a partir de blocos reservados no banco.
+
+    Cada bloco custa uma única transação curta; os números dentro dele saem da
+    memória, sem consulta nem nova tentativa. Números de um bloco não usado
+    até o processo terminar são descartados (a sequência pode ter lacunas).
+    """
+
+    def __init__(self, tamanho_bloco: int):
+        self.tamanho_bloco = tamanho_bloco
+        self._proximo = 0
+        self._fim = 0
+
+    def descartar(self):
+        self._proximo = self._fim = 0
+
+    async def reservar(self, quantidade: int = 1) -> list[str]:
+        numeros = []
+        while len(numeros) < quantidade:
+            if self._proximo >= self._fim:
+                tamanho = max(self.tamanho_bloco, quantidade - len(numeros))
+                inicio = await executar_isolado(
+                    lambda conn: _reservar_bloco(conn, tamanho)
+                )
+                self._proximo, self._fim = inicio, inicio + tamanho
+            numeros.append(f"M-{self._proximo}")
+            self._proximo += 1
+        return numeros
+
+
+alocador_matricula = AlocadorMatricula(MATRICULA_BLOCO)
+
+# Um processo filho não pode reaproveitar o bloco herdado do pai
+os.register_at_fork(after_in_child=alocador_matricula.descartar)
@@ -0,0 +1,89 @@
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, literal, select, update
+from database.database import engine
+from database.models import ResumoNotasAluno, ResumoNotasSala, VersaoRecurso
+from database.resumos import INSERTS_UPSERT
+
+# Recursos versionados
+NOTAS_ALUNO = "notas_aluno"
+NOTAS_SALA = "notas_sala"
+
+
+def _incrementar():
+    tabela = VersaoRecurso.__table__
+    comando = INSERTS_UPSERT[engine.dialect.name](tabela)
+    return comando.on_conflict_do_update(
+        index_elements=["recurso", "recurso_id"],
+        set_={
+            "versao": tabela.c.versao + 1,
+            "alterado_em": comando.excluded.alterado_em,
+        },
+    )
+
+
+# Incrementa a versão dos recursos, na transação da própria sessão.
+# Recebe pares (recurso, id); ids None são ignorados.
+async def registrar_alteracoes(db, recursos):
+    agora = datetime.utcnow().replace(microsecond=0)
+    # Ordenado para que transações concorrentes travem as linhas na mesma ordem
+    linhas = [
+        {"recurso": recurso, "recurso_id": id_, "versao": 1, "alterado_em": agora}
+        for recurso, id_ in sorted({par for par in recursos if par[1] is not None})
+    ]
+    if linhas:
+        await db.execute(_incrementar(), linhas)
+
+
+# Notas recém-lançadas mudam o histórico do aluno e as médias da sala.
+# Cada nota é um dict com aluno_id e sala_id, como em atualizar_resumos.
+async def registrar_notas(db, notas: list[dict]):
+    await registrar_alteracoes(
+        db,
+        [(NOTAS_ALUNO, nota["aluno_id"]) for nota in notas]
+        + [(NOTAS_SALA, nota["sala_id"]) for nota in notas],
+    )
+
+
+# Depois de reconstruir os resumos: incrementa todas as versões de notas e cria
+# a versão dos alunos e salas que ainda não tinham (conexão síncrona)
+def renovar_versoes_notas(conn):
+    agora = datetime.utcnow().replace(microsecond=0)
+    conn.execute(
+        update(VersaoRecurso)
+        .where(VersaoRecurso.recurso.in_((NOTAS_ALUNO, NOTAS_SALA)))
+        .values(versao=VersaoRecurso.versao + 1, alterado_em=agora)
+    )
+    for recurso, coluna in (
+        (NOTAS_ALUNO, ResumoNotasAluno.aluno_id),
+        (NOTAS_SALA, ResumoNotasSala.sala_id),
+    ):
+        novos = (
+            select(
+                literal(recurso),
+                coluna,
+                literal(1, Integer),
+                literal(agora, DateTime),
+            )
+            .distinct()
+            .where(coluna.is_not(None))
+        )
+        conn.execute(
+            INSERTS_UPSERT[conn.dialect.name](VersaoRecurso.__table__)
+            .from_select(["recurso", "recurso_id", "versao", "alterado_em"], novos)
+            .on_conflict_do_nothing()
+        )
+
+
+# (versão, alterado_em) do recurso; (0, None) se ele nunca foi alterado
+async def versao_recurso(db, recurso: str, recurso_id: int):
+    linha = (
+        await db.execute(
+            select(VersaoRecurso.versao, VersaoRecurso.alterado_em).where(
+                VersaoRecurso.recurso == recurso,
+                VersaoRecurso.recurso_id == recurso_id,
+            )
+        )
+    ).first()
+    if linha is None:
+        return 0, None
+    return linha.versao, linha.alterado_em
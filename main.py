@@ -1,34 +1,102 @@
-from fastapi import FastAPI, status, Depends, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, status, Depends
+from fastapi.responses import PlainTextResponse
 from autenticador_jwt import auth
 from rotas import aluno, admin, professor
-from database.database import engine, SessionLocal
-from database import models
+from database.database import (
+    CookieEscritaMiddleware,
+    estatisticas_pool,
+    fechar_engines,
+    get_db,
+    replicas,
+    todas_engines,
+)
 from autenticador_jwt.auth import get_current_user
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
+from monitoramento.perfil import (
+    PERFIL_ATIVO,
+    PerfilMiddleware,
+    configurar_log,
+    instrumentar_engine,
+)
+from monitoramento import metricas
+from autenticador_jwt import senhas
+from autenticador_jwt.cache_tokens import cache_tokens
+from notificacoes.pubsub import pubsub
 
+# O esquema do banco não é criado aqui: rode `python -m database.esquema` antes
+# de subir o app (a cada implantação que mexer nos modelos).
 
-app = FastAPI()
-app.include_router(auth.router)
-app.include_router(aluno.router)
-app.include_router(admin.router)
-app.include_router(professor.router)
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
 
-models.base.metadata.create_all(bind=engine)
+router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@router.get("/", status_code=status.HTTP_200_OK)
+async def get_me(user: Annotated[dict, Depends(get_current_user)]):
+    return {"user": user}
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(get_current_user)]
+def _contadores_processo() -> dict:
+    return metricas.contadores(
+        senhas.estatisticas(), cache_tokens.estatisticas(), estatisticas_pool()
+    )
 
 
-@app.get("/", status_code=status.HTTP_200_OK)
-async def get_me(user: Annotated[dict, Depends(get_current_user)]):
-    return {"user": user}
+# Métricas no formato de exposição do Prometheus
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def exportar_metricas():
+    return PlainTextResponse(
+        metricas.exportar(
+            senhas.estatisticas(), cache_tokens.estatisticas(), estatisticas_pool()
+        ),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+# Nada de I/O ao subir: as conexões são abertas sob demanda. Com METRICAS_DIR
+# os contadores vão para o arquivo do worker periodicamente e ao encerrar. Ao
+# encerrar, para o pool de hash, o pub/sub e os pools de conexões.
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    gravacao_metricas = None
+    if metricas.METRICAS_DIR:
+        gravacao_metricas = asyncio.create_task(
+            metricas.salvar_periodicamente(_contadores_processo)
+        )
+    yield
+    if gravacao_metricas is not None:
+        gravacao_metricas.cancel()
+        metricas.salvar(_contadores_processo())
+    senhas.encerrar_pool()
+    await pubsub.fechar()
+    await fechar_engines()
+
+
+# Monta o app. Chamar uma vez por processo: instrumenta os engines globais
+def criar_app() -> FastAPI:
+    app = FastAPI(lifespan=ciclo_de_vida)
+    app.include_router(auth.router)
+    app.include_router(aluno.router)
+    app.include_router(admin.router)
+    app.include_router(professor.router)
+    app.include_router(router)
+
+    app.add_middleware(metricas.MetricasMiddleware)
+    if replicas:
+        app.add_middleware(CookieEscritaMiddleware)
+    for engine_instrumentada in todas_engines():
+        metricas.instrumentar_engine(engine_instrumentada)
+
+    if PERFIL_ATIVO:
+        configurar_log()
+        app.add_middleware(PerfilMiddleware)
+        for engine_instrumentada in todas_engines():
+            instrumentar_engine(engine_instrumentada)
+    return app
+
+
+app = criar_app()
@@ -0,0 +1,373 @@
+import asyncio
+import json
+import os
+import time
+from sqlalchemy import event
+import config
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Com vários workers (servidor.py) cada processo só conta as próprias
+# requisições. Com METRICAS_DIR definido, cada worker grava os contadores num
+# arquivo próprio desse diretório a cada METRICAS_INTERVALO segundos e ao
+# encerrar, e o /metrics soma os arquivos de todos os workers, inclusive dos
+# que já saíram, então os totais não voltam atrás quando um worker recicla.
+# Os gauges (fila do bcrypt, pool de conexões) são do worker que respondeu.
+METRICAS_DIR = os.getenv("METRICAS_DIR")
+METRICAS_INTERVALO = float(os.getenv("METRICAS_INTERVALO", "5"))
+# Soma dos workers já encerrados, mantida pelo processo principal do servidor.py
+ARQUIVO_ENCERRADOS = "encerrados.json"
+# Nomes de arquivos já somados ao dos encerrados que ficam registrados nele
+MAX_INCLUIDOS = 1000
+
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.soma += valor
+        self.total += 1
+        for indice, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[indice] += 1
+                break
+
+
+# (método, rota) -> histograma; (método, rota, status) -> contagem
+latencias = {}
+requisicoes = {}
+# tabela -> linhas inseridas
+linhas_inseridas = {}
+
+
+class MetricasMiddleware:
+    """Conta requisições e mede latência por rota (o template, não a URL)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status_code = 500
+
+        async def enviar(mensagem):
+            nonlocal status_code
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = scope.get("route")
+            caminho = rota.path if rota is not None else "desconhecida"
+            chave = (scope["method"], caminho)
+            if chave not in latencias:
+                latencias[chave] = Histograma()
+            latencias[chave].observar(time.perf_counter() - inicio)
+            chave_status = (*chave, status_code)
+            requisicoes[chave_status] = requisicoes.get(chave_status, 0) + 1
+
+
+# Soma as linhas de cada INSERT por tabela
+def instrumentar_engine(engine):
+    @event.listens_for(engine, "after_cursor_execute")
+    def _contar_insercoes(conn, cursor, statement, parameters, context, executemany):
+        if context is None or not context.isinsert or context.compiled is None:
+            return
+        # Inserts em lote com RETURNING disparam o evento uma vez por bloco
+        if getattr(context, "_metricas_contado", False):
+            return
+        context._metricas_contado = True
+        tabela = context.compiled.statement.table.name
+        linhas_inseridas[tabela] = linhas_inseridas.get(tabela, 0) + len(
+            context.compiled_parameters
+        )
+
+
+# Contadores dos outros componentes (hash de senha, cache de tokens, pool)
+def contadores(hash_pool: dict, jwt_cache: dict, pool_db: dict) -> dict:
+    valores = {
+        "bcrypt_concluidos": hash_pool["concluidos"],
+        "bcrypt_recusados": hash_pool["recusados"],
+        "jwt_misses": jwt_cache["misses"],
+        "jwt_hits": jwt_cache["hits"],
+    }
+    for campo in ("aquisicoes", "espera_total", "timeouts"):
+        if campo in pool_db:
+            valores[f"pool_{campo}"] = pool_db[campo]
+    return valores
+
+
+def _serializar(latencias_, requisicoes_, linhas_inseridas_, contadores_) -> dict:
+    return {
+        "latencias": [
+            [metodo, rota, histograma.soma, histograma.total, histograma.contagens]
+            for (metodo, rota), histograma in latencias_.items()
+        ],
+        "requisicoes": [[*chave, total] for chave, total in requisicoes_.items()],
+        "linhas_inseridas": dict(linhas_inseridas_),
+        "contadores": dict(contadores_),
+    }
+
+
+# Contadores deste processo num formato que vai para JSON
+def retrato(contadores_processo: dict) -> dict:
+    return _serializar(latencias, requisicoes, linhas_inseridas, contadores_processo)
+
+
+def somar(retratos) -> dict:
+    latencias_, requisicoes_, linhas_inseridas_, contadores_ = {}, {}, {}, {}
+    for dados in retratos:
+        for metodo, rota, soma, total, contagens in dados.get("latencias", []):
+            histograma = latencias_.get((metodo, rota))
+            if histograma is None:
+                histograma = latencias_[(metodo, rota)] = Histograma()
+            histograma.soma += soma
+            histograma.total += total
+            histograma.contagens = [
+                a + b for a, b in zip(histograma.contagens, contagens)
+            ]
+        for metodo, rota, status_code, total in dados.get("requisicoes", []):
+            chave = (metodo, rota, status_code)
+            requisicoes_[chave] = requisicoes_.get(chave, 0) + total
+        for tabela, total in dados.get("linhas_inseridas", {}).items():
+            linhas_inseridas_[tabela] = linhas_inseridas_.get(tabela, 0) + total
+        for nome, valor in dados.get("contadores", {}).items():
+            contadores_[nome] = contadores_.get(nome, 0) + valor
+    return _serializar(latencias_, requisicoes_, linhas_inseridas_, contadores_)
+
+
+def _ler_json(caminho: str):
+    try:
+        with open(caminho) as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+# Grava por cima de forma atômica: quem lê vê o arquivo antigo ou o novo
+def _gravar_json(caminho: str, dados: dict):
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w") as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+
+# pid -> arquivo do processo. O nome leva o momento em que o processo começou
+# a gravar, então um pid reaproveitado não pega o arquivo de outro worker
+_arquivo = {}
+
+
+def _arquivo_processo() -> str:
+    pid = os.getpid()
+    if pid not in _arquivo:
+        _arquivo.clear()
+        _arquivo[pid] = os.path.join(METRICAS_DIR, f"{pid}-{time.time_ns()}.json")
+    return _arquivo[pid]
+
+
+def salvar(contadores_processo: dict):
+    _gravar_json(_arquivo_processo(), retrato(contadores_processo))
+
+
+async def salvar_periodicamente(obter_contadores):
+    while True:
+        await asyncio.sleep(METRICAS_INTERVALO)
+        salvar(obter_contadores())
+
+
+def _retratos_diretorio(diretorio: str) -> list:
+    # Os arquivos dos workers são lidos antes do dos encerrados: um worker
+    # incorporado no meio da leitura aparece lá (e é descartado aqui) em vez
+    # de sumir da soma
+    retratos = {}
+    for nome in os.listdir(diretorio):
+        if nome.endswith(".json") and nome != ARQUIVO_ENCERRADOS:
+            dados = _ler_json(os.path.join(diretorio, nome))
+            if dados is not None:
+                retratos[nome] = dados
+    encerrados = _ler_json(os.path.join(diretorio, ARQUIVO_ENCERRADOS))
+    if encerrados is not None:
+        for nome in encerrados["incluidos"]:
+            retratos.pop(nome, None)
+        retratos[ARQUIVO_ENCERRADOS] = encerrados
+    return list(retratos.values())
+
+
+# Chamado pelo processo principal quando um worker sai: soma o arquivo dele ao
+# dos encerrados e o apaga, para o diretório não crescer a cada reciclagem
+def incorporar_worker(diretorio: str, pid: int):
+    prefixo = f"{pid}-"
+    nomes = [
+        nome
+        for nome in os.listdir(diretorio)
+        if nome.startswith(prefixo) and nome.endswith(".json")
+    ]
+    if not nomes:
+        return
+    caminho = os.path.join(diretorio, ARQUIVO_ENCERRADOS)
+    encerrados = _ler_json(caminho) or {"incluidos": []}
+    retratos = [_ler_json(os.path.join(diretorio, nome)) for nome in nomes]
+    total = somar([encerrados, *(dados for dados in retratos if dados is not None)])
+    total["incluidos"] = (encerrados["incluidos"] + nomes)[-MAX_INCLUIDOS:]
+    _gravar_json(caminho, total)
+    for nome in os.listdir(diretorio):
+        if nome.startswith(prefixo):
+            os.remove(os.path.join(diretorio, nome))
+
+
+# Zera o diretório ao subir o servidor (contadores recomeçam com o processo)
+def limpar_diretorio(diretorio: str):
+    os.makedirs(diretorio, exist_ok=True)
+    for nome in os.listdir(diretorio):
+        if nome.endswith((".json", ".json.tmp")):
+            os.remove(os.path.join(diretorio, nome))
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(**rotulos) -> str:
+    pares = ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items())
+    return "{" + pares + "}"
+
+
+def _metrica(linhas: list, nome: str, tipo: str, ajuda: str, valores):
+    linhas.append(f"# HELP {nome} {ajuda}")
+    linhas.append(f"# TYPE {nome} {tipo}")
+    for rotulos, valor in valores:
+        linhas.append(f"{nome}{_rotulos(**rotulos) if rotulos else ''} {valor}")
+
+
+# Texto no formato de exposição do Prometheus
+def exportar(hash_pool: dict, jwt_cache: dict, pool_db: dict) -> str:
+    contadores_processo = contadores(hash_pool, jwt_cache, pool_db)
+    if METRICAS_DIR:
+        salvar(contadores_processo)
+        total = somar(_retratos_diretorio(METRICAS_DIR))
+    else:
+        total = retrato(contadores_processo)
+    totais = total["contadores"]
+    linhas = []
+
+    linhas.append(
+        "# HELP portal_http_duracao_segundos Latência das requisições por rota"
+    )
+    linhas.append("# TYPE portal_http_duracao_segundos histogram")
+    for metodo, rota, soma, quantidade, contagens in sorted(total["latencias"]):
+        acumulado = 0
+        for limite, contagem in zip(BUCKETS_LATENCIA, contagens):
+            acumulado += contagem
+            rotulos = _rotulos(metodo=metodo, rota=rota, le=limite)
+            linhas.append(f"portal_http_duracao_segundos_bucket{rotulos} {acumulado}")
+        rotulos = _rotulos(metodo=metodo, rota=rota, le="+Inf")
+        linhas.append(f"portal_http_duracao_segundos_bucket{rotulos} {quantidade}")
+        rotulos = _rotulos(metodo=metodo, rota=rota)
+        linhas.append(f"portal_http_duracao_segundos_sum{rotulos} {soma}")
+        linhas.append(f"portal_http_duracao_segundos_count{rotulos} {quantidade}")
+
+    _metrica(
+        linhas,
+        "portal_http_requisicoes_total",
+        "counter",
+        "Requisições por rota e status",
+        [
+            ({"metodo": metodo, "rota": rota, "status": status_code}, quantidade)
+            for metodo, rota, status_code, quantidade in sorted(total["requisicoes"])
+        ],
+    )
+
+    _metrica(
+        linhas,
+        "portal_bcrypt_fila",
+        "gauge",
+        "Pedidos de hash de senha aguardando um worker",
+        [({}, hash_pool["na_fila"])],
+    )
+    _metrica(
+        linhas,
+        "portal_bcrypt_em_execucao",
+        "gauge",
+        "Hashes de senha em execução",
+        [({}, hash_pool["em_execucao"])],
+    )
+    _metrica(
+        linhas,
+        "portal_bcrypt_workers",
+        "gauge",
+        "Tamanho do pool de hash de senha",
+        [({}, hash_pool["workers"])],
+    )
+    _metrica(
+        linhas,
+        "portal_bcrypt_concluidos_total",
+        "counter",
+        "Hashes de senha concluídos",
+        [({}, totais["bcrypt_concluidos"])],
+    )
+    _metrica(
+        linhas,
+        "portal_bcrypt_recusados_total",
+        "counter",
+        "Pedidos de hash recusados por fila cheia",
+        [({}, totais["bcrypt_recusados"])],
+    )
+
+    _metrica(
+        linhas,
+        "portal_jwt_decodificacoes_total",
+        "counter",
+        "Tokens decodificados com jwt.decode (falhas do cache)",
+        [({}, totais["jwt_misses"])],
+    )
+    _metrica(
+        linhas,
+        "portal_jwt_cache_hits_total",
+        "counter",
+        "Tokens servidos pelo cache sem decodificar",
+        [({}, totais["jwt_hits"])],
+    )
+
+    for campo in ("tamanho", "abertas", "em_uso", "livres", "overflow"):
+        if campo in pool_db:
+            _metrica(
+                linhas,
+                f"portal_db_pool_{campo}",
+                "gauge",
+                f"Pool de conexões: {campo}",
+                [({}, pool_db[campo])],
+            )
+    for campo in ("aquisicoes", "espera_total", "timeouts"):
+        if f"pool_{campo}" in totais:
+            nome = "espera_segundos" if campo == "espera_total" else campo
+            _metrica(
+                linhas,
+                f"portal_db_pool_{nome}_total",
+                "counter",
+                f"Pool de conexões: {campo}",
+                [({}, totais[f"pool_{campo}"])],
+            )
+
+    _metrica(
+        linhas,
+        "portal_db_linhas_inseridas_total",
+        "counter",
+        "Linhas inseridas por tabela",
+        [
+            ({"tabela": tabela}, quantidade)
+            for tabela, quantidade in sorted(total["linhas_inseridas"].items())
+        ],
+    )
+
+    return "\n".join(linhas) + "\n"
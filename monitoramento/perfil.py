@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import ativado
+
+# PERFIL_LIMITE_CONSULTAS: acima desse número de consultas numa requisição
+# ela é marcada como suspeita de N+1 e logada como warning.
+PERFIL_ATIVO = ativado("PERFIL_ATIVO", "true")
+PERFIL_LIMITE_CONSULTAS = int(os.getenv("PERFIL_LIMITE_CONSULTAS", "20"))
+# Nível do log do perfil: INFO registra toda requisição, WARNING só as
+# suspeitas de N+1
+PERFIL_LOG_NIVEL = os.getenv("PERFIL_LOG_NIVEL", "INFO").upper()
+
+logger = logging.getLogger("portal.perfil")
+
+
+# Sem configuração, o logging só mostra warnings; a linha em JSON de cada
+# requisição sai em INFO, então o logger do perfil ganha o próprio handler
+def configurar_log():
+    logger.setLevel(PERFIL_LOG_NIVEL)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+class PerfilRequisicao:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.mais_lenta = 0.0
+        self.sql_mais_lenta = None
+        # Outras etapas medidas com medir(), ex.: bcrypt e jwt
+        self.tempos = {}
+
+    def registrar_consulta(self, sql: str, duracao: float):
+        self.consultas += 1
+        self.tempo_db += duracao
+        if duracao > self.mais_lenta:
+            self.mais_lenta = duracao
+            self.sql_mais_lenta = sql
+
+    def server_timing(self) -> str:
+        partes = [
+            f'db;dur={self.tempo_db * 1000:.1f};desc="{self.consultas} consultas"'
+        ]
+        partes += [
+            f"{nome};dur={tempo * 1000:.1f}" for nome, tempo in self.tempos.items()
+        ]
+        partes.append(f"total;dur={(time.perf_counter() - self.inicio) * 1000:.1f}")
+        return ", ".join(partes)
+
+
+perfil_atual: ContextVar = ContextVar("perfil_atual", default=None)
+
+
+@contextmanager
+def medir(nome: str):
+    perfil = perfil_atual.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if perfil is not None:
+            perfil.tempos[nome] = perfil.tempos.get(nome, 0.0) + (
+                time.perf_counter() - inicio
+            )
+
+
+# Hooks do SQLAlchemy que somam as consultas no perfil da requisição atual
+def instrumentar_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perfil_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["perfil_inicio"].pop()
+        perfil = perfil_atual.get()
+        if perfil is not None:
+            perfil.registrar_consulta(statement, time.perf_counter() - inicio)
+
+    @event.listens_for(engine, "handle_error")
+    def _erro(contexto):
+        if contexto.connection is not None:
+            inicios = contexto.connection.info.get("perfil_inicio")
+            if inicios:
+                inicios.pop()
+
+
+class PerfilMiddleware:
+    """Mede cada requisição HTTP: tempo total, consultas e tempo no banco.
+
+    Os números vão no cabeçalho ``Server-Timing`` e numa linha de log em JSON.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PERFIL_ATIVO:
+            await self.app(scope, receive, send)
+            return
+
+        perfil = PerfilRequisicao()
+        token = perfil_atual.set(perfil)
+        status_code = 500
+
+        async def enviar(mensagem):
+            nonlocal status_code
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+                cabecalhos = list(mensagem.get("headers", []))
+                cabecalhos.append((b"server-timing", perfil.server_timing().encode()))
+                mensagem = {**mensagem, "headers": cabecalhos}
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil_atual.reset(token)
+            self._logar(scope, status_code, perfil)
+
+    def _logar(self, scope, status_code, perfil):
+        suspeita_n_mais_1 = perfil.consultas > PERFIL_LIMITE_CONSULTAS
+        registro = {
+            "metodo": scope["method"],
+            "rota": scope["path"],
+            "status": status_code,
+            "duracao_ms": round((time.perf_counter() - perfil.inicio) * 1000, 1),
+            "consultas": perfil.consultas,
+            "tempo_db_ms": round(perfil.tempo_db * 1000, 1),
+            "consulta_mais_lenta_ms": round(perfil.mais_lenta * 1000, 1),
+            "consulta_mais_lenta": (perfil.sql_mais_lenta or "")[:200],
+            **{
+                f"{nome}_ms": round(tempo * 1000, 1)
+                for nome, tempo in perfil.tempos.items()
+            },
+        }
+        if suspeita_n_mais_1:
+            registro["suspeita_n_mais_1"] = True
+            logger.warning(json.dumps(registro, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(registro, ensure_ascii=False))
@@ -0,0 +1,21 @@
+import logging
+from notificacoes.pubsub import pubsub
+
+logger = logging.getLogger("portal.pubsub")
+
+
+def canal_notas(aluno_id: int) -> str:
+    return f"notas:{aluno_id}"
+
+
+# Avisa os assinantes de cada aluno sobre as notas já gravadas. Cada nota é
+# um dict com id, aluno_id, nota, materia, professor e data_lancamento.
+async def publicar_notas(notas: list[dict]):
+    try:
+        await pubsub.publicar_varios(
+            [(canal_notas(nota["aluno_id"]), nota) for nota in notas]
+        )
+    except Exception:
+        # As notas já estão gravadas; quem perder o aviso as recebe ao
+        # reconectar com o Last-Event-ID
+        logger.exception("Falha ao publicar %d nota(s)", len(notas))
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+import config
+
+# Backend do pub/sub das notificações. "memoria" só alcança os assinantes do
+# próprio processo; com vários workers use "postgres", que repassa as
+# mensagens por LISTEN/NOTIFY no banco principal.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memoria")
+# Mensagens pendentes por assinante antes de ele ser desconectado
+PUBSUB_FILA_MAX = int(os.getenv("PUBSUB_FILA_MAX", "100"))
+
+logger = logging.getLogger("portal.pubsub")
+
+
+class AssinanteAtrasado(Exception):
+    """O assinante não consumiu as mensagens a tempo e perdeu alguma."""
+
+
+class Assinatura:
+    def __init__(self, tamanho_max: int):
+        self._fila = asyncio.Queue(maxsize=tamanho_max)
+        self.atrasado = False
+
+    def entregar(self, mensagem: dict):
+        try:
+            self._fila.put_nowait(mensagem)
+        except asyncio.QueueFull:
+            self.atrasado = True
+
+    async def receber(self, timeout: float | None = None):
+        """Próxima mensagem, ou None se nada chegar dentro do timeout."""
+        if self.atrasado and self._fila.empty():
+            raise AssinanteAtrasado()
+        try:
+            return await asyncio.wait_for(self._fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PubSub:
+    """Interface dos backends: publicar mensagens e assinar canais."""
+
+    async def publicar(self, canal: str, mensagem: dict):
+        await self.publicar_varios([(canal, mensagem)])
+
+    async def publicar_varios(self, mensagens: list[tuple[str, dict]]):
+        raise NotImplementedError
+
+    def assinar(self, canal: str):
+        raise NotImplementedError
+
+    async def fechar(self):
+        pass
+
+
+class PubSubMemoria(PubSub):
+    """Entrega às assinaturas do próprio processo."""
+
+    def __init__(self, tamanho_fila: int = PUBSUB_FILA_MAX):
+        self.tamanho_fila = tamanho_fila
+        self._assinaturas = {}
+
+    async def publicar_varios(self, mensagens):
+        self.distribuir(mensagens)
+
+    def distribuir(self, mensagens):
+        for canal, mensagem in mensagens:
+            for assinatura in self._assinaturas.get(canal, ()):
+                assinatura.entregar(mensagem)
+
+    @asynccontextmanager
+    async def assinar(self, canal: str):
+        assinatura = Assinatura(self.tamanho_fila)
+        self._assinaturas.setdefault(canal, set()).add(assinatura)
+        try:
+            yield assinatura
+        finally:
+            assinantes = self._assinaturas[canal]
+            assinantes.discard(assinatura)
+            if not assinantes:
+                del self._assinaturas[canal]
+
+    def estatisticas(self) -> dict:
+        return {
+            "canais": len(self._assinaturas),
+            "assinantes": sum(len(a) for a in self._assinaturas.values()),
+        }
+
+
+class PubSubPostgres(PubSubMemoria):
+    """Compartilha as mensagens entre processos com LISTEN/NOTIFY.
+
+    Cada processo mantém uma conexão asyncpg escutando um único canal do
+    Postgres e repassa o que chega às assinaturas locais.
+    """
+
+    CANAL = "portal_pubsub"
+    # O NOTIFY aceita payloads de até 8000 bytes
+    PAYLOAD_MAX = 7500
+
+    def __init__(self, dsn: str, tamanho_fila: int = PUBSUB_FILA_MAX):
+        super().__init__(tamanho_fila)
+        self.dsn = dsn
+        self._escuta = None
+        self._envio = None
+        self._trava = asyncio.Lock()
+
+    async def _conectar(self):
+        import asyncpg
+
+        async with self._trava:
+            if self._envio is None or self._envio.is_closed():
+                self._envio = await asyncpg.connect(self.dsn)
+            if self._escuta is None or self._escuta.is_closed():
+                self._escuta = await asyncpg.connect(self.dsn)
+                await self._escuta.add_listener(self.CANAL, self._recebido)
+
+    def _recebido(self, conexao, pid, canal, payload):
+        try:
+            self.distribuir(json.loads(payload))
+        except ValueError:
+            logger.warning("Mensagem inválida no canal %s", canal)
+
+    async def publicar_varios(self, mensagens):
+        await self._conectar()
+        for payload in self._payloads(mensagens):
+            async with self._trava:
+                await self._envio.execute(
+                    "SELECT pg_notify($1, $2)", self.CANAL, payload
+                )
+
+    # Agrupa as mensagens em payloads que caibam no limite do NOTIFY
+    def _payloads(self, mensagens):
+        grupo = []
+        tamanho = 2
+        for canal, mensagem in mensagens:
+            item = json.dumps([canal, mensagem], default=str)
+            if grupo and tamanho + len(item) + 1 > self.PAYLOAD_MAX:
+                yield "[" + ",".join(grupo) + "]"
+                grupo = []
+                tamanho = 2
+            grupo.append(item)
+            tamanho += len(item) + 1
+        if grupo:
+            yield "[" + ",".join(grupo) + "]"
+
+    @asynccontextmanager
+    async def assinar(self, canal: str):
+        await self._conectar()
+        async with super().assinar(canal) as assinatura:
+            yield assinatura
+
+    async def fechar(self):
+        for conexao in (self._escuta, self._envio):
+            if conexao is not None and not conexao.is_closed():
+                await conexao.close()
+        self._escuta = None
+        self._envio = None
+
+
+def criar_pubsub(backend: str = PUBSUB_BACKEND) -> PubSub:
+    if backend == "memoria":
+        return PubSubMemoria()
+    if backend == "postgres":
+        from sqlalchemy.engine import make_url
+        from database.database import URL_DATABASE
+
+        url = make_url(URL_DATABASE).set(drivername="postgresql")
+        return PubSubPostgres(url.render_as_string(hide_password=False))
+    raise ValueError(f"PUBSUB_BACKEND desconhecido: {backend}")
+
+
+pubsub = criar_pubsub()
@@ -1,24 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from autenticador_jwt.depends import only_for
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from autenticador_jwt.auth import CreateUserRequest
+from autenticador_jwt.depends import get_db_leitura, only_for
+from autenticador_jwt.senhas import gerar_hashes
 from database import models
+from validacao.documentos import cpfs_repetidos_no_lote, validar_lote
+from validacao.vali_aluno import AlunoBase
 from validacao.vali_materia_sala_nota import MateriaBase, SalaBase
-from database.database import engine, SessionLocal
-from sqlalchemy.orm import Session
-from typing import Annotated
+from database.database import engine, estatisticas_pool, get_db
+from database.sequencias import alocador_matricula
+from database.documentos import cpfs_cadastrados
+from pydantic import TypeAdapter
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.concurrency import run_in_threadpool
+from typing import Annotated, Literal, Optional
+import codecs
+import csv
+import io
+import itertools
+import json
+import os
+import re
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-# Pegar banco de dados
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+db_leitura = Annotated[AsyncSession, Depends(get_db_leitura)]
+
+# Quantidade de usuários gravados por transação na importação em massa
+IMPORTACAO_LOTE = int(os.getenv("IMPORTACAO_LOTE", "500"))
 
+# Validação de cada lote da importação numa chamada só
+USUARIOS_LOTE = TypeAdapter(list[CreateUserRequest])
+INFOS_ALUNO_LOTE = TypeAdapter(list[AlunoBase])
 
-db_dependency = Annotated[Session, Depends(get_db)]
+# Tamanho máximo de página nas listagens
+ADMIN_PAGINA_MAX = 500
 
 
 # testar login:
@@ -27,6 +56,12 @@ async def get_admin(user=Depends(only_for(["admin"]))):
     return {"msg": f"Bem-vindo, administrador {user['username']}"}
 
 
+# Uso do pool de conexões, para planejamento de capacidade:
+@router.get("/pool")
+async def ler_estatisticas_pool(user=Depends(only_for(["admin"]))):
+    return estatisticas_pool()
+
+
 # Criação de salas de aula:
 @router.post("/criarsalas", status_code=status.HTTP_201_CREATED)
 async def criar_sala(
@@ -34,7 +69,7 @@ async def criar_sala(
 ):
     db_sala = models.Salas(**sala.dict())
     db.add(db_sala)
-    db.commit()
+    await db.commit()
 
 
 # Criação das materias:
@@ -44,4 +79,485 @@ async def criar_materia(
 ):
     db_materia = models.Materia(**sala.dict())
     db.add(db_materia)
-    db.commit()
+    await db.commit()
+
+
+# Importação em massa de usuários (array JSON de objetos). O corpo é lido
+# conforme chega e gravado em lotes, sem carregar tudo na memória. Se o JSON
+# estiver malformado, os itens anteriores ao erro são gravados e a resposta é
+# 400 com o relatório até ali.
+@router.post("/importarusuarios", status_code=status.HTTP_200_OK)
+async def importar_usuarios(
+    request: Request, db: db_dependency, user=Depends(only_for(["admin"]))
+):
+    relatorio = {"criados": 0, "rejeitados": []}
+    lote = []
+    try:
+        async for item in ler_array_json(request.stream()):
+            lote.append(item)
+            if len(lote) == IMPORTACAO_LOTE:
+                await importar_lote(lote, db, relatorio)
+                lote = []
+    except ValueError as erro:
+        if lote:
+            await importar_lote(lote, db, relatorio)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"msg": str(erro), **relatorio},
+        )
+    if lote:
+        await importar_lote(lote, db, relatorio)
+    return relatorio
+
+
+_ESPACOS = re.compile(r"\s*")
+
+
+# Lê os objetos de um array JSON a partir dos pedaços (bytes) do corpo e os
+# devolve como (índice, objeto) assim que cada um termina de chegar
+async def ler_array_json(partes):
+    decodificador = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    partes = aiter(partes)
+    texto, pos, terminou = "", 0, False
+    # inicio -> primeiro -> (item -> separador)* -> fim
+    estado = "inicio"
+    indice = 0
+    while True:
+        pos = _ESPACOS.match(texto, pos).end()
+        if pos < len(texto):
+            caractere = texto[pos]
+            if estado == "inicio":
+                if caractere != "[":
+                    raise ValueError("O corpo deve ser um array JSON")
+                pos += 1
+                estado = "primeiro"
+                continue
+            if estado == "fim":
+                raise ValueError("Conteúdo depois do fim do array JSON")
+            if caractere == "]" and estado in ("primeiro", "separador"):
+                pos += 1
+                estado = "fim"
+                continue
+            if estado == "separador":
+                if caractere != ",":
+                    raise ValueError(f"Esperado ',' ou ']' depois do item {indice - 1}")
+                pos += 1
+                estado = "item"
+                continue
+            # Só objetos: sempre terminam em "}", então um objeto incompleto
+            # nunca é decodificado como válido
+            if caractere != "{":
+                raise ValueError(f"O item {indice} deve ser um objeto JSON")
+            try:
+                objeto, pos_fim = decodificador.raw_decode(texto, pos)
+            except json.JSONDecodeError:
+                if terminou:
+                    raise ValueError(f"JSON inválido no item {indice}")
+            else:
+                yield indice, objeto
+                indice += 1
+                pos = pos_fim
+                estado = "separador"
+                continue
+        elif terminou:
+            if estado != "fim":
+                raise ValueError("Array JSON incompleto")
+            return
+        # Precisa de mais dados: descarta o que já foi lido e junta o próximo
+        parte = await anext(partes, None)
+        terminou = parte is None
+        try:
+            texto = texto[pos:] + utf8.decode(parte or b"", final=terminou)
+        except UnicodeDecodeError:
+            raise ValueError("O corpo deve estar em UTF-8")
+        pos = 0
+
+
+# Importação em massa de usuários (CSV com colunas username,password,ocupacao).
+# O arquivo é lido em blocos, sem carregar tudo na memória. Se o arquivo não
+# for UTF-8 ou o CSV for inválido, as linhas lidas antes do erro são gravadas
+# e a resposta é 400 com o relatório até ali, como na importação JSON.
+@router.post("/importarusuarios/csv", status_code=status.HTTP_200_OK)
+async def importar_usuarios_csv(
+    arquivo: UploadFile, db: db_dependency, user=Depends(only_for(["admin"]))
+):
+    relatorio = {"criados": 0, "rejeitados": []}
+    linhas = enumerate(
+        csv.DictReader(io.TextIOWrapper(arquivo.file, encoding="utf-8-sig"))
+    )
+    while True:
+        lote, erro = await run_in_threadpool(ler_lote_csv, linhas)
+        if lote:
+            await importar_lote(lote, db, relatorio)
+        if erro:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"msg": erro, **relatorio},
+            )
+        if not lote:
+            break
+    return relatorio
+
+
+# Próximas IMPORTACAO_LOTE linhas e a mensagem do erro que interrompeu a
+# leitura, se houver
+def ler_lote_csv(linhas) -> tuple[list, Optional[str]]:
+    lote = []
+    try:
+        for linha in itertools.islice(linhas, IMPORTACAO_LOTE):
+            lote.append(linha)
+    except UnicodeDecodeError:
+        return lote, "O arquivo deve estar em UTF-8"
+    except csv.Error as erro:
+        return lote, f"CSV inválido: {erro}"
+    return lote, None
+
+
+# Grava um lote numa única transação: valida as linhas, descarta usernames e
+# CPFs repetidos, gera os hashes em paralelo e insere User + perfil +
+# Matricula. Linhas de aluno com cpf trazem também os campos de
+# /aluno/infoalunos/ (telefone, endereco, ..., sala_id), gravados junto.
+async def importar_lote(lote: list[tuple[int, dict]], db, relatorio: dict):
+    linhas = [dados for _, dados in lote]
+    pedidos, erros = validar_lote(USUARIOS_LOTE, linhas)
+
+    com_info = [
+        i
+        for i, dados in enumerate(linhas)
+        if i not in erros and dados.get("ocupacao") == "aluno" and dados.get("cpf")
+    ]
+    infos_validadas, erros_info = validar_lote(
+        INFOS_ALUNO_LOTE, [linhas[i] for i in com_info]
+    )
+    infos = {}
+    for posicao, i in enumerate(com_info):
+        if posicao in erros_info:
+            erros[i] = erros_info[posicao]
+        else:
+            infos[i] = infos_validadas[posicao]
+
+    validos = []
+    for i, (indice, dados) in enumerate(lote):
+        if i in erros:
+            rejeitar(relatorio, indice, dados, erros[i])
+        elif pedidos[i].ocupacao not in ("aluno", "professor", "admin"):
+            rejeitar(relatorio, indice, dados, "Ocupação inválida")
+        else:
+            validos.append((indice, pedidos[i], infos.get(i)))
+
+    # CPFs repetidos no lote ou já cadastrados e salas inexistentes
+    cpfs = [info.cpf if info else None for _, _, info in validos]
+    repetidos = cpfs_repetidos_no_lote(cpfs)
+    cadastrados = await cpfs_cadastrados(db, cpfs)
+    salas_ids = {info.sala_id for _, _, info in validos if info}
+    salas_existentes = set()
+    if salas_ids:
+        salas_existentes = set(
+            await db.scalars(
+                select(models.Salas.id).where(models.Salas.id.in_(salas_ids))
+            )
+        )
+
+    usernames = [pedido.username for _, pedido, _ in validos]
+    existentes = set(
+        await db.scalars(
+            select(models.User.username).where(models.User.username.in_(usernames))
+        )
+    )
+    novos = []
+    for posicao, (indice, pedido, info) in enumerate(validos):
+        if posicao in repetidos:
+            motivo = "CPF repetido no lote"
+        elif info and info.cpf in cadastrados:
+            motivo = "CPF já cadastrado"
+        elif info and info.sala_id not in salas_existentes:
+            motivo = "Sala não encontrada"
+        elif pedido.username in existentes:
+            motivo = "Username já cadastrado"
+        else:
+            existentes.add(pedido.username)
+            novos.append((indice, pedido, info))
+            continue
+        rejeitar(relatorio, indice, pedido.model_dump(), motivo)
+
+    if not novos:
+        return
+
+    hashes = await gerar_hashes([pedido.password for _, pedido, _ in novos])
+    numeros = iter(
+        await alocador_matricula.reservar(
+            sum(pedido.ocupacao == "aluno" for _, pedido, _ in novos)
+        )
+    )
+    for (_, pedido, info), hashed_password in zip(novos, hashes):
+        usuario = models.User(
+            username=pedido.username,
+            hashed_password=hashed_password,
+            ocupacao=pedido.ocupacao,
+        )
+        if pedido.ocupacao == "aluno":
+            usuario.aluno = models.Aluno()
+            usuario.aluno.matriculas.append(
+                models.Matricula(aluno_id=None, numero=next(numeros))
+            )
+            if info:
+                usuario.aluno.sala_id = info.sala_id
+                usuario.aluno.info_pessoal = models.InfoAluno(
+                    **info.model_dump(exclude={"sala_id"})
+                )
+        elif pedido.ocupacao == "professor":
+            usuario.professor = models.Professor()
+        else:
+            usuario.administrador = models.Admin()
+        db.add(usuario)
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        for indice, pedido, _ in novos:
+            rejeitar(relatorio, indice, pedido.model_dump(), "Erro ao gravar o lote")
+        return
+    relatorio["criados"] += len(novos)
+
+
+def rejeitar(relatorio: dict, indice: int, dados: dict, motivo: str):
+    relatorio["rejeitados"].append(
+        {"linha": indice, "username": dados.get("username"), "detail": motivo}
+    )
+
+
+# Listagens e buscas. Todas paginam por keyset no id: o cabeçalho
+# X-Proximo-Cursor traz o valor a passar em "apos" para a página seguinte.
+# "username" e "nome" buscam pelo prefixo; cpf e matrícula, pelo valor exato.
+@router.get("/usuarios", status_code=status.HTTP_200_OK)
+async def listar_usuarios(
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["admin"])),
+    limite: int = Query(50, ge=1, le=ADMIN_PAGINA_MAX),
+    apos: Optional[int] = None,
+    ocupacao: Optional[Literal["aluno", "professor", "admin"]] = None,
+    username: Optional[str] = None,
+):
+    consulta = select(models.User.id, models.User.username, models.User.ocupacao)
+    if ocupacao is not None:
+        consulta = consulta.where(models.User.ocupacao == ocupacao)
+    if username:
+        consulta = consulta.where(filtro_prefixo(models.User.username, username))
+
+    linhas = await paginar(db, consulta, models.User.id, limite, apos, response)
+    return [
+        {"id": linha.id, "username": linha.username, "ocupacao": linha.ocupacao}
+        for linha in linhas
+    ]
+
+
+@router.get("/alunos", status_code=status.HTTP_200_OK)
+async def listar_alunos(
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["admin"])),
+    limite: int = Query(50, ge=1, le=ADMIN_PAGINA_MAX),
+    apos: Optional[int] = None,
+    username: Optional[str] = None,
+    cpf: Optional[str] = None,
+    matricula: Optional[str] = None,
+    sala_id: Optional[int] = None,
+):
+    consulta = (
+        select(models.Aluno, models.User.username)
+        .join(models.User, models.Aluno.usuario_id == models.User.id)
+        .options(
+            selectinload(models.Aluno.info_pessoal),
+            selectinload(models.Aluno.sala),
+            selectinload(models.Aluno.matriculas),
+        )
+    )
+    if username:
+        consulta = consulta.where(filtro_prefixo(models.User.username, username))
+    if cpf:
+        consulta = consulta.join(models.Aluno.info_pessoal).where(
+            models.InfoAluno.cpf == re.sub(r"[^0-9]", "", cpf)
+        )
+    if matricula:
+        consulta = consulta.where(
+            models.Aluno.id.in_(
+                select(models.Matricula.aluno_id).where(
+                    models.Matricula.numero == matricula
+                )
+            )
+        )
+    if sala_id is not None:
+        consulta = consulta.where(models.Aluno.sala_id == sala_id)
+
+    linhas = await paginar(db, consulta, models.Aluno.id, limite, apos, response)
+    return [formatar_aluno(aluno, username) for aluno, username in linhas]
+
+
+@router.get("/professores", status_code=status.HTTP_200_OK)
+async def listar_professores(
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["admin"])),
+    limite: int = Query(50, ge=1, le=ADMIN_PAGINA_MAX),
+    apos: Optional[int] = None,
+    username: Optional[str] = None,
+    cpf: Optional[str] = None,
+    sala_id: Optional[int] = None,
+    materia_id: Optional[int] = None,
+):
+    consulta = (
+        select(models.Professor, models.User.username)
+        .join(models.User, models.Professor.usuario_id == models.User.id)
+        .options(
+            selectinload(models.Professor.info),
+            selectinload(models.Professor.salas),
+            selectinload(models.Professor.materias),
+        )
+    )
+    if username:
+        consulta = consulta.where(filtro_prefixo(models.User.username, username))
+    if cpf:
+        consulta = consulta.join(models.Professor.info).where(
+            models.InfoProfessor.cpf == re.sub(r"[^0-9]", "", cpf)
+        )
+    if sala_id is not None:
+        consulta = consulta.where(
+            models.Professor.id.in_(
+                select(models.professor_sala.c.professor_id).where(
+                    models.professor_sala.c.sala_id == sala_id
+                )
+            )
+        )
+    if materia_id is not None:
+        consulta = consulta.where(
+            models.Professor.id.in_(
+                select(models.professor_materia.c.professor_id).where(
+                    models.professor_materia.c.materia_id == materia_id
+                )
+            )
+        )
+
+    linhas = await paginar(db, consulta, models.Professor.id, limite, apos, response)
+    return [formatar_professor(professor, username) for professor, username in linhas]
+
+
+@router.get("/salas", status_code=status.HTTP_200_OK)
+async def listar_salas(
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["admin"])),
+    limite: int = Query(50, ge=1, le=ADMIN_PAGINA_MAX),
+    apos: Optional[int] = None,
+    nome: Optional[str] = None,
+):
+    consulta = select(models.Salas.id, models.Salas.sala)
+    if nome:
+        consulta = consulta.where(filtro_prefixo(models.Salas.sala, nome))
+    linhas = await paginar(db, consulta, models.Salas.id, limite, apos, response)
+
+    # Quantidade de alunos das salas da página, numa consulta agrupada
+    alunos_por_sala = {}
+    if linhas:
+        alunos_por_sala = dict(
+            (
+                await db.execute(
+                    select(models.Aluno.sala_id, func.count())
+                    .where(models.Aluno.sala_id.in_([linha.id for linha in linhas]))
+                    .group_by(models.Aluno.sala_id)
+                )
+            ).all()
+        )
+    return [
+        {
+            "id": linha.id,
+            "sala": linha.sala,
+            "alunos": alunos_por_sala.get(linha.id, 0),
+        }
+        for linha in linhas
+    ]
+
+
+@router.get("/materias", status_code=status.HTTP_200_OK)
+async def listar_materias(
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["admin"])),
+    limite: int = Query(50, ge=1, le=ADMIN_PAGINA_MAX),
+    apos: Optional[int] = None,
+    nome: Optional[str] = None,
+):
+    consulta = select(models.Materia.id, models.Materia.nome)
+    if nome:
+        consulta = consulta.where(filtro_prefixo(models.Materia.nome, nome))
+    linhas = await paginar(db, consulta, models.Materia.id, limite, apos, response)
+    return [{"id": linha.id, "nome": linha.nome} for linha in linhas]
+
+
+# Busca por prefixo que aproveita o índice. No Postgres o LIKE 'x%' usa o
+# índice com varchar_pattern_ops; no SQLite o LIKE não é otimizado (ignora
+# maiúsculas), então vira um intervalo sobre o índice comum.
+def filtro_prefixo(coluna, prefixo: str):
+    if engine.dialect.name == "sqlite":
+        return and_(coluna >= prefixo, coluna < prefixo + "\U0010ffff")
+    return coluna.startswith(prefixo, autoescape=True)
+
+
+# Uma página da consulta ordenada pelo id, com o cursor da próxima no cabeçalho
+async def paginar(db, consulta, coluna_id, limite: int, apos, response: Response):
+    if apos is not None:
+        consulta = consulta.where(coluna_id > apos)
+    linhas = (await db.execute(consulta.order_by(coluna_id).limit(limite + 1))).all()
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        # A primeira coluna é o id ou a entidade (Aluno/Professor)
+        ultimo = linhas[-1][0]
+        response.headers["X-Proximo-Cursor"] = str(getattr(ultimo, "id", ultimo))
+    return linhas
+
+
+def formatar_aluno(aluno, username: str) -> dict:
+    info = aluno.info_pessoal
+    return {
+        "id": aluno.id,
+        "usuario_id": aluno.usuario_id,
+        "username": username,
+        "sala": {"id": aluno.sala.id, "sala": aluno.sala.sala} if aluno.sala else None,
+        "matriculas": [matricula.numero for matricula in aluno.matriculas],
+        "info_pessoal": (
+            {
+                "cpf": info.cpf,
+                "email": info.email,
+                "telefone": info.telefone,
+                "data_nascimento": info.data_nascimento,
+                "serie": info.serie,
+            }
+            if info
+            else None
+        ),
+    }
+
+
+def formatar_professor(professor, username: str) -> dict:
+    info = professor.info
+    return {
+        "id": professor.id,
+        "usuario_id": professor.usuario_id,
+        "username": username,
+        "salas": [{"id": sala.id, "sala": sala.sala} for sala in professor.salas],
+        "materias": [
+            {"id": materia.id, "nome": materia.nome} for materia in professor.materias
+        ],
+        "info": (
+            {
+                "cpf": info.cpf,
+                "email": info.email,
+                "telefone": info.telefone,
+                "formacao": info.formacao,
+            }
+            if info
+            else None
+        ),
+    }
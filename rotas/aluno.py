@@ -1,25 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from autenticador_jwt.depends import only_for
-from sqlalchemy.orm import aliased
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from autenticador_jwt.depends import get_db_leitura, only_for
+from sqlalchemy import select
+from sqlalchemy.orm import aliased, selectinload
 from database import models
 from validacao.vali_aluno import AlunoBase
-from database.database import engine, SessionLocal
-from sqlalchemy.orm import Session
-from typing import Annotated
+from database.database import abrir_sessao, abrir_sessao_leitura, get_db
+from database.resumos import boletim_aluno
+from database.versoes import NOTAS_ALUNO
+from notificacoes.notas import canal_notas
+from notificacoes.pubsub import AssinanteAtrasado, pubsub
+from rotas.condicional import cabecalhos_versao, nao_modificado
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, Literal, Optional
+from datetime import date
+from types import SimpleNamespace
+import json
+import os
 
 router = APIRouter(prefix="/aluno", tags=["aluno"])
 
 
-# Pegar banco de dados
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+db_leitura = Annotated[AsyncSession, Depends(get_db_leitura)]
 
+# Tamanho máximo de página em /aluno/notas (e de cada bloco do streaming)
+NOTAS_PAGINA_MAX = 1000
 
-db_dependency = Annotated[Session, Depends(get_db)]
+# Intervalo, em segundos, dos comentários que mantêm a conexão SSE aberta
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+# Espera sugerida ao cliente antes de reconectar, em milissegundos
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "3000"))
 
 
 @router.get("/alunos")
@@ -32,8 +52,12 @@ async def area_aluno(user=Depends(only_for(["aluno"]))):
 async def info_aluno(
     aluno: AlunoBase, db: db_dependency, user=Depends(only_for(["aluno"]))
 ):
-    # 1. Buscar aluno no banco com base no id do usuário logado
-    aluno_db = db.query(models.Aluno).filter_by(usuario_id=user["id"]).first()
+    # 1. Buscar aluno pelo id que veio no token do usuário logado
+    aluno_db = await db.scalar(
+        select(models.Aluno)
+        .options(selectinload(models.Aluno.info_pessoal))
+        .filter_by(id=user["perfil_id"])
+    )
 
     if not aluno_db:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
@@ -59,41 +83,195 @@ async def info_aluno(
 
     db.add(info)
     # 4. Associar sala
-    salas = db.query(models.Salas).filter(models.Salas.id == aluno.sala_id).first()
+    salas = await db.get(models.Salas, aluno.sala_id)
     if not salas:
         raise HTTPException(status_code=404, detail="Salas não encontradas")
-    aluno_db.sala = salas
+    aluno_db.sala_id = salas.id
 
-    db.commit()
-    db.refresh(info)
-    db.refresh(aluno_db)
+    await db.commit()
+    await db.refresh(info)
 
     return {"msg": "Informações salvas com sucesso", "id_info": info.id}
 
 
 # Rotas para ler informações de notas.
+# Paginação por keyset no id da nota: o cabeçalho X-Proximo-Cursor traz o
+# valor a passar em "apos" para buscar a página seguinte. Com formato=stream o
+# histórico completo é enviado como um array JSON em blocos. Com o ETag de uma
+# resposta anterior em If-None-Match, a rota responde 304 se nada mudou.
 @router.get("/notas", status_code=status.HTTP_200_OK)
-def ler_notas(db: db_dependency, user=Depends(only_for(["aluno"]))):
-    aluno = db.query(models.Aluno).filter_by(usuario_id=user["id"]).first()
-    if not aluno:
+async def ler_notas(
+    request: Request,
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["aluno"])),
+    limite: int = Query(100, ge=1, le=NOTAS_PAGINA_MAX),
+    apos: Optional[int] = None,
+    materia_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    formato: Literal["json", "stream"] = "json",
+):
+    aluno_id = user["perfil_id"]
+    if not aluno_id:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
+    cabecalhos = await cabecalhos_versao(db, NOTAS_ALUNO, aluno_id)
+    if nao_modificado(request, cabecalhos):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+
+    consulta = consulta_notas(aluno_id, materia_id, data_inicio, data_fim)
+
+    if formato == "stream":
+        return StreamingResponse(
+            transmitir_notas(consulta, user["id"]),
+            media_type="application/json",
+            headers=cabecalhos,
+        )
+
+    response.headers.update(cabecalhos)
+
+    if apos is not None:
+        consulta = consulta.where(models.Nota.id > apos)
+    linhas = (await db.execute(consulta.limit(limite + 1))).all()
+
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        response.headers["X-Proximo-Cursor"] = str(linhas[-1].id)
+
+    return [formatar_nota(linha) for linha in linhas]
+
+
+# Notas novas em tempo real (Server-Sent Events), no lugar do polling de
+# /aluno/notas. Ao reconectar, o cliente manda o Last-Event-ID (ou "apos" na
+# primeira conexão) e recebe antes as notas lançadas nesse intervalo.
+@router.get("/notas/eventos", status_code=status.HTTP_200_OK)
+async def eventos_notas(
+    user=Depends(only_for(["aluno"])),
+    apos: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+):
+    aluno_id = user["perfil_id"]
+    if not aluno_id:
+        raise HTTPException(status_code=404, detail="Aluno não encontrado")
+
+    return StreamingResponse(
+        transmitir_eventos(aluno_id, last_event_id or apos),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Boletim (média, mínima e máxima por matéria) lido dos resumos
+@router.get("/boletim", status_code=status.HTTP_200_OK)
+async def ler_boletim(
+    request: Request,
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["aluno"])),
+):
+    if not user["perfil_id"]:
+        raise HTTPException(status_code=404, detail="Aluno não encontrado")
+    cabecalhos = await cabecalhos_versao(db, NOTAS_ALUNO, user["perfil_id"])
+    if nao_modificado(request, cabecalhos):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    response.headers.update(cabecalhos)
+    return await boletim_aluno(db, user["perfil_id"])
+
+
+def consulta_notas(aluno_id, materia_id=None, data_inicio=None, data_fim=None):
     ProfessorUser = aliased(models.User)
 
-    resultado = (
-        db.query(
+    consulta = (
+        select(
+            models.Nota.id,
             models.Nota.nota,
             models.Materia.nome.label("materia"),
             ProfessorUser.username.label("professor"),
+            models.Nota.data_lancamento,
         )
         .join(models.Materia, models.Nota.materia_id == models.Materia.id)
         .join(models.Professor, models.Nota.professor_id == models.Professor.id)
         .join(ProfessorUser, models.Professor.usuario_id == ProfessorUser.id)
-        .filter(models.Nota.aluno_id == aluno.id)
-        .all()
+        .where(models.Nota.aluno_id == aluno_id)
+        .order_by(models.Nota.id)
     )
+    if materia_id is not None:
+        consulta = consulta.where(models.Nota.materia_id == materia_id)
+    if data_inicio is not None:
+        consulta = consulta.where(models.Nota.data_lancamento >= data_inicio)
+    if data_fim is not None:
+        consulta = consulta.where(models.Nota.data_lancamento <= data_fim)
+    return consulta
+
+
+def formatar_nota(linha):
+    return {
+        "nota": linha.nota,
+        "matéria": linha.materia,
+        "profesor": linha.professor,
+        "data_lancamento": linha.data_lancamento,
+    }
+
+
+def evento_nota(linha) -> str:
+    dados = json.dumps(formatar_nota(linha), default=str, ensure_ascii=False)
+    return f"id: {linha.id}\nevent: nota\ndata: {dados}\n\n"
+
+
+# A assinatura começa antes da recuperação das notas perdidas, para nada
+# escapar entre as duas; as repetidas são descartadas pelo id. Nenhuma
+# conexão do banco fica presa enquanto o cliente espera.
+async def transmitir_eventos(aluno_id, ultimo_id):
+    async with pubsub.assinar(canal_notas(aluno_id)) as assinatura:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        enviadas = set()
+        if ultimo_id is not None:
+            async with abrir_sessao() as db:
+                while True:
+                    pagina = (
+                        consulta_notas(aluno_id)
+                        .where(models.Nota.id > ultimo_id)
+                        .limit(NOTAS_PAGINA_MAX)
+                    )
+                    linhas = (await db.execute(pagina)).all()
+                    if not linhas:
+                        break
+                    for linha in linhas:
+                        enviadas.add(linha.id)
+                        yield evento_nota(linha)
+                    ultimo_id = linhas[-1].id
+
+        while True:
+            try:
+                nota = await assinatura.receber(SSE_HEARTBEAT)
+            except AssinanteAtrasado:
+                # O cliente reconecta com o Last-Event-ID e recupera o resto
+                return
+            if nota is None:
+                yield ": ping\n\n"
+            elif nota["id"] not in enviadas:
+                yield evento_nota(SimpleNamespace(**nota))
+
 
-    return [
-        {"nota": nota, "matéria": materia, "profesor": professor}
-        for nota, materia, professor in resultado
-    ]
+# Percorre o histórico em páginas de keyset com uma sessão própria, já que a
+# da dependência é fechada antes de a resposta terminar de ser enviada.
+async def transmitir_notas(consulta, usuario_id):
+    yield "["
+    ultimo_id = None
+    separador = ""
+    async with abrir_sessao_leitura(usuario_id) as db:
+        while True:
+            pagina = consulta.limit(NOTAS_PAGINA_MAX)
+            if ultimo_id is not None:
+                pagina = pagina.where(models.Nota.id > ultimo_id)
+            linhas = (await db.execute(pagina)).all()
+            if not linhas:
+                break
+            for linha in linhas:
+                yield separador + json.dumps(
+                    formatar_nota(linha), default=str, ensure_ascii=False
+                )
+                separador = ","
+            ultimo_id = linhas[-1].id
+    yield "]"
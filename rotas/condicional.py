@@ -0,0 +1,41 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request
+from database.versoes import versao_recurso
+
+
+# ETag e Last-Modified a partir da versão do recurso (uma consulta pela chave)
+async def cabecalhos_versao(db, recurso: str, recurso_id: int) -> dict:
+    versao, alterado_em = await versao_recurso(db, recurso, recurso_id)
+    cabecalhos = {
+        "ETag": f'W/"{recurso}-{recurso_id}-{versao}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if alterado_em is not None:
+        cabecalhos["Last-Modified"] = format_datetime(
+            alterado_em.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    return cabecalhos
+
+
+# Se o cliente já tem a versão atual (If-None-Match, ou If-Modified-Since
+# quando não há If-None-Match), a rota responde 304 sem montar o corpo
+def nao_modificado(request: Request, cabecalhos: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = cabecalhos["ETag"].removeprefix("W/")
+        return any(
+            valor == "*" or valor.removeprefix("W/") == etag
+            for valor in (parte.strip() for parte in if_none_match.split(","))
+        )
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or "Last-Modified" not in cabecalhos:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(cabecalhos["Last-Modified"]) <= desde
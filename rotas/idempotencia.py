@@ -0,0 +1,18 @@
+import json
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+
+# Repetição de um lançamento já atendido: devolve a resposta original. A mesma
+# chave com outro corpo (ou em outra rota) é recusada.
+def repetir_resposta(registro, impressao: str) -> JSONResponse:
+    if registro.impressao != impressao:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key já usada em outra requisição",
+        )
+    return JSONResponse(
+        json.loads(registro.resposta),
+        status_code=registro.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
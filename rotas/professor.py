@@ -1,26 +1,66 @@
-from logging import info
-from fastapi import APIRouter, Depends, HTTPException, status
-from autenticador_jwt.depends import only_for
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from autenticador_jwt.depends import get_db_leitura, only_for
+from autenticador_jwt.permissoes import cache_permissoes
 from database import models
+from database.models import NOTAS_UNICAS_POR_DIA
 from validacao.vali_professor import InfoProfessor
 from validacao.vali_materia_sala_nota import NotasBase
-from database.database import engine, SessionLocal
-from sqlalchemy.orm import Session
-from typing import Annotated
+from database.database import abrir_sessao_leitura, get_db
+from database.idempotencia import (
+    buscar_resposta,
+    guardar_resposta,
+    impressao_requisicao,
+)
+from database.estatisticas_notas import GERAL, NOTA_CORTE, carregar_notas, classificar
+from database.resumos import atualizar_resumos, boletim_aluno, medias_sala
+from database.versoes import NOTAS_ALUNO, NOTAS_SALA, registrar_notas
+from notificacoes.notas import publicar_notas
+from rotas.condicional import cabecalhos_versao, nao_modificado
+from rotas.idempotencia import repetir_resposta
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, selectinload
+from starlette.concurrency import run_in_threadpool
+from typing import Annotated, Literal, Optional
+from datetime import date
+import csv
+import io
+import json
+import os
 
 router = APIRouter(prefix="/professor", tags=["professor"])
 
 
-# Pegar banco de dados
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+db_leitura = Annotated[AsyncSession, Depends(get_db_leitura)]
+
+# Limite de notas por requisição no lançamento em lote
+NOTAS_LOTE_MAX = int(os.getenv("NOTAS_LOTE_MAX", "5000"))
 
+# Linhas buscadas do cursor do servidor por vez na exportação
+EXPORTACAO_LOTE = int(os.getenv("EXPORTACAO_LOTE", "1000"))
 
-db_dependency = Annotated[Session, Depends(get_db)]
+COLUNAS_EXPORTACAO = (
+    "nota_id",
+    "aluno_id",
+    "aluno",
+    "sala",
+    "materia",
+    "professor",
+    "nota",
+    "data_lancamento",
+)
 
 
 @router.get("/professor")
@@ -34,8 +74,16 @@ async def cadastrar_info_professor(
     db: db_dependency,
     user=Depends(only_for(["professor"])),
 ):
-    # 1. Buscar professor no banco com base no id do usuário logado
-    professor_db = db.query(models.Professor).filter_by(usuario_id=user["id"]).first()
+    # 1. Buscar professor pelo id que veio no token do usuário logado
+    professor_db = await db.scalar(
+        select(models.Professor)
+        .options(
+            selectinload(models.Professor.info),
+            selectinload(models.Professor.salas),
+            selectinload(models.Professor.materias),
+        )
+        .filter_by(id=user["perfil_id"])
+    )
 
     if not professor_db:
         raise HTTPException(status_code=404, detail="Professor não encontrado")
@@ -62,71 +110,546 @@ async def cadastrar_info_professor(
 
     # 4. Associar salas
     salas = (
-        db.query(models.Salas)
-        .filter(models.Salas.id.in_(dados_professor.salas_ids))
-        .all()
-    )
+        await db.scalars(
+            select(models.Salas).where(models.Salas.id.in_(dados_professor.salas_ids))
+        )
+    ).all()
     if not salas:
         raise HTTPException(status_code=404, detail="Salas não encontradas")
     professor_db.salas = salas
 
     # 5. Associar matérias
     materias = (
-        db.query(models.Materia)
-        .filter(models.Materia.id.in_(dados_professor.materias_ids))
-        .all()
-    )
+        await db.scalars(
+            select(models.Materia).where(
+                models.Materia.id.in_(dados_professor.materias_ids)
+            )
+        )
+    ).all()
     if not materias:
         raise HTTPException(status_code=404, detail="Matérias não encontradas")
     professor_db.materias = materias
 
-    db.commit()
+    await db.commit()
+    cache_permissoes.invalidar(professor_db.id)
 
     return {"msg": "Informações salvas com sucesso", "id_info": nova_info.id}
 
 
+# Com o cabeçalho Idempotency-Key, repetir o pedido (ex.: após um timeout)
+# devolve a resposta original em vez de lançar a nota de novo
 @router.post("/lançarnotas/", status_code=status.HTTP_200_OK)
 async def lancar_notas(
-    dados_nota: NotasBase, db: db_dependency, user=Depends(only_for(["professor"]))
+    dados_nota: NotasBase,
+    request: Request,
+    db: db_dependency,
+    user=Depends(only_for(["professor"])),
+    idempotency_key: Optional[str] = Header(None, max_length=100),
 ):
-    # Verifica se o professor logado existe
-    professor = (
-        db.query(models.Professor)
-        .filter(models.Professor.usuario_id == user["id"])
-        .first()
-    )
-    if not professor:
+    # O id do professor logado vem no token
+    professor_id = user["perfil_id"]
+    if not professor_id:
         raise HTTPException(status_code=404, detail="Professor não encontrado")
 
+    impressao = None
+    if idempotency_key:
+        impressao = impressao_requisicao(
+            request.url.path, dados_nota.model_dump(mode="json")
+        )
+        anterior = await buscar_resposta(db, user["id"], idempotency_key)
+        if anterior:
+            return repetir_resposta(anterior, impressao)
+
     # Verificar se o aluno existe
-    aluno = (
-        db.query(models.Aluno).filter(models.Aluno.id == dados_nota.aluno_id).first()
-    )
+    aluno = await db.get(models.Aluno, dados_nota.aluno_id)
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Verificar se a materia existe
-    materia = (
-        db.query(models.Materia)
-        .filter(models.Materia.id == dados_nota.materia_id)
-        .first()
-    )
-    if not materia:
-        raise HTTPException(status_code=404, detail="Matéria não encotrada")
-
-    # Verificar se o professor ensina essa materia
-    if materia not in professor.materias:
+    # Verificar se o professor leciona a matéria e a sala do aluno, pelas
+    # permissões em cache; o banco só é consultado para a mensagem de erro
+    permissoes = await cache_permissoes.obter(db, professor_id)
+    if dados_nota.materia_id not in permissoes.materias:
+        if not await db.get(models.Materia, dados_nota.materia_id):
+            raise HTTPException(status_code=404, detail="Matéria não encotrada")
         raise HTTPException(status_code=404, detail="Você não leciona essa matéria")
 
+    if aluno.sala_id not in permissoes.salas:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não leciona na sala desse aluno",
+        )
+
     # lanças notas
     nova_nota = models.Nota(
         aluno_id=dados_nota.aluno_id,
-        professor_id=professor.id,
+        professor_id=professor_id,
         materia_id=dados_nota.materia_id,
         nota=dados_nota.nota,
+        sala_id=aluno.sala_id,
     )
 
     db.add(nova_nota)
-    db.commit()
+    lancamento = [
+        {
+            "aluno_id": aluno.id,
+            "sala_id": aluno.sala_id,
+            "materia_id": dados_nota.materia_id,
+            "nota": dados_nota.nota,
+        }
+    ]
+    await atualizar_resumos(db, lancamento)
+    await registrar_notas(db, lancamento)
+    resposta = {"msg": "Nota lançada com sucesso"}
+    if idempotency_key:
+        await guardar_resposta(
+            db, user["id"], idempotency_key, impressao, status.HTTP_200_OK, resposta
+        )
+    try:
+        await db.commit()
+    except IntegrityError as erro:
+        await db.rollback()
+        return await conflito_lancamento(db, user, idempotency_key, impressao, erro)
+
+    await publicar_notas(
+        [
+            {
+                "id": nova_nota.id,
+                "aluno_id": aluno.id,
+                "nota": nova_nota.nota,
+                "materia": permissoes.nomes_materias[dados_nota.materia_id],
+                "professor": user["username"],
+                "data_lancamento": nova_nota.data_lancamento,
+            }
+        ]
+    )
+
+    return resposta
+
+
+# Commit recusado por unicidade: ou uma requisição concorrente com a mesma
+# Idempotency-Key gravou primeiro (devolve a resposta dela), ou a nota do dia
+# já existe (índice NOTAS_UNICAS_POR_DIA)
+async def conflito_lancamento(db, user, idempotency_key, impressao, erro):
+    if idempotency_key:
+        anterior = await buscar_resposta(db, user["id"], idempotency_key)
+        if anterior:
+            return repetir_resposta(anterior, impressao)
+    if not NOTAS_UNICAS_POR_DIA:
+        raise erro
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Nota já lançada hoje para esse aluno e matéria",
+    )
+
+
+# Lançamento de notas em lote: valida tudo com consultas IN e insere numa
+# única transação; as linhas inválidas voltam em "erros" com o seu índice.
+# Aceita Idempotency-Key como o lançamento individual.
+@router.post("/lancarnotas/lote", status_code=status.HTTP_200_OK)
+async def lancar_notas_lote(
+    notas: list[NotasBase],
+    request: Request,
+    db: db_dependency,
+    user=Depends(only_for(["professor"])),
+    idempotency_key: Optional[str] = Header(None, max_length=100),
+):
+    professor_id = user["perfil_id"]
+    if not professor_id:
+        raise HTTPException(status_code=404, detail="Professor não encontrado")
+
+    if len(notas) > NOTAS_LOTE_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"O lote deve ter no máximo {NOTAS_LOTE_MAX} notas",
+        )
+    if not notas:
+        return {"msg": "Nenhuma nota enviada", "inseridas": 0, "erros": []}
+
+    impressao = None
+    if idempotency_key:
+        impressao = impressao_requisicao(
+            request.url.path, [nota.model_dump(mode="json") for nota in notas]
+        )
+        anterior = await buscar_resposta(db, user["id"], idempotency_key)
+        if anterior:
+            return repetir_resposta(anterior, impressao)
+
+    alunos_ids = {nota.aluno_id for nota in notas}
+    materias_ids = {nota.materia_id for nota in notas}
+
+    # id do aluno -> sala, usada também nos resumos por sala
+    salas_dos_alunos = dict(
+        (
+            await db.execute(
+                select(models.Aluno.id, models.Aluno.sala_id).where(
+                    models.Aluno.id.in_(alunos_ids)
+                )
+            )
+        ).all()
+    )
+    permissoes = await cache_permissoes.obter(db, professor_id)
+    # Só as matérias fora das permissões precisam ser procuradas no banco,
+    # para separar "não encontrada" de "não leciona"
+    materias_de_fora = materias_ids - permissoes.materias
+    materias_existentes = set()
+    if materias_de_fora:
+        materias_existentes = set(
+            await db.scalars(
+                select(models.Materia.id).where(models.Materia.id.in_(materias_de_fora))
+            )
+        )
+    # (aluno, matéria) que já têm nota deste professor hoje
+    lancadas_hoje = set()
+    if NOTAS_UNICAS_POR_DIA:
+        lancadas_hoje = set(
+            (
+                await db.execute(
+                    select(models.Nota.aluno_id, models.Nota.materia_id).where(
+                        models.Nota.professor_id == professor_id,
+                        models.Nota.data_lancamento == date.today(),
+                        models.Nota.aluno_id.in_(alunos_ids),
+                    )
+                )
+            ).all()
+        )
+
+    novas_notas = []
+    erros = []
+    for indice, nota in enumerate(notas):
+        if nota.aluno_id not in salas_dos_alunos:
+            erro = "Aluno não encontrado"
+        elif nota.materia_id not in permissoes.materias:
+            if nota.materia_id in materias_existentes:
+                erro = "Você não leciona essa matéria"
+            else:
+                erro = "Matéria não encotrada"
+        elif salas_dos_alunos[nota.aluno_id] not in permissoes.salas:
+            erro = "Você não leciona na sala desse aluno"
+        elif NOTAS_UNICAS_POR_DIA and (nota.aluno_id, nota.materia_id) in lancadas_hoje:
+            erro = "Nota já lançada hoje para esse aluno e matéria"
+        else:
+            lancadas_hoje.add((nota.aluno_id, nota.materia_id))
+            novas_notas.append(
+                {
+                    "aluno_id": nota.aluno_id,
+                    "professor_id": professor_id,
+                    "materia_id": nota.materia_id,
+                    "nota": nota.nota,
+                    "sala_id": salas_dos_alunos[nota.aluno_id],
+                }
+            )
+            continue
+        erros.append(
+            {
+                "indice": indice,
+                "aluno_id": nota.aluno_id,
+                "materia_id": nota.materia_id,
+                "detail": erro,
+            }
+        )
+
+    resposta = {
+        "msg": "Notas lançadas com sucesso",
+        "inseridas": len(novas_notas),
+        "erros": erros,
+    }
+    try:
+        if novas_notas:
+            gravadas = (
+                await db.execute(
+                    insert(models.Nota).returning(
+                        models.Nota.id,
+                        models.Nota.aluno_id,
+                        models.Nota.materia_id,
+                        models.Nota.nota,
+                        models.Nota.data_lancamento,
+                        sort_by_parameter_order=True,
+                    ),
+                    novas_notas,
+                )
+            ).all()
+            await atualizar_resumos(db, novas_notas)
+            await registrar_notas(db, novas_notas)
+        if idempotency_key:
+            await guardar_resposta(
+                db, user["id"], idempotency_key, impressao, status.HTTP_200_OK, resposta
+            )
+        await db.commit()
+    except IntegrityError as erro:
+        await db.rollback()
+        return await conflito_lancamento(db, user, idempotency_key, impressao, erro)
+
+    if novas_notas:
+        await publicar_notas(
+            [
+                {
+                    "id": nota.id,
+                    "aluno_id": nota.aluno_id,
+                    "nota": nota.nota,
+                    "materia": permissoes.nomes_materias[nota.materia_id],
+                    "professor": user["username"],
+                    "data_lancamento": nota.data_lancamento,
+                }
+                for nota in gravadas
+            ]
+        )
+
+    return resposta
+
+
+# Boletim de um aluno, lido dos resumos por aluno e matéria; o professor só vê
+# alunos das salas em que leciona
+@router.get("/boletim/{aluno_id}", status_code=status.HTTP_200_OK)
+async def ler_boletim(
+    aluno_id: int,
+    request: Request,
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["professor", "admin"])),
+):
+    if user["ocupacao"] == "professor":
+        aluno = (
+            await db.execute(
+                select(models.Aluno.sala_id).where(models.Aluno.id == aluno_id)
+            )
+        ).first()
+        if aluno is None:
+            raise HTTPException(status_code=404, detail="Aluno não encontrado")
+        permissoes = await cache_permissoes.obter(db, user["perfil_id"])
+        if aluno.sala_id not in permissoes.salas:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Você não leciona na sala desse aluno",
+            )
+    cabecalhos = await cabecalhos_versao(db, NOTAS_ALUNO, aluno_id)
+    if nao_modificado(request, cabecalhos):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    response.headers.update(cabecalhos)
+    return await boletim_aluno(db, aluno_id)
+
+
+# Médias da sala por matéria; o professor só vê as salas em que leciona
+@router.get("/medias/{sala_id}", status_code=status.HTTP_200_OK)
+async def ler_medias_sala(
+    sala_id: int,
+    request: Request,
+    response: Response,
+    db: db_leitura,
+    user=Depends(only_for(["professor", "admin"])),
+):
+    if user["ocupacao"] == "professor":
+        permissoes = await cache_permissoes.obter(db, user["perfil_id"])
+        if sala_id not in permissoes.salas:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Você não leciona nessa sala",
+            )
+    cabecalhos = await cabecalhos_versao(db, NOTAS_SALA, sala_id)
+    if nao_modificado(request, cabecalhos):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    response.headers.update(cabecalhos)
+    return await medias_sala(db, sala_id)
+
+
+# Exportação das notas (boletins de fim de período) em CSV ou JSONL. As linhas
+# vêm de um cursor no servidor e são enviadas aos poucos, então a memória não
+# cresce com o tamanho da escola. O professor só exporta as salas em que
+# leciona; a sala considerada é a da nota (a do aluno no lançamento), como nos
+# resumos, e a atual do aluno só para notas antigas, lançadas sem sala.
+@router.get("/exportar/notas", status_code=status.HTTP_200_OK)
+async def exportar_notas(
+    db: db_leitura,
+    user=Depends(only_for(["professor", "admin"])),
+    formato: Literal["csv", "jsonl"] = "csv",
+    sala_id: Optional[int] = None,
+    materia_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    ano: Optional[int] = Query(None, ge=date.min.year, le=date.max.year),
+):
+    salas_ids = await salas_permitidas(db, user, sala_id)
+
+    if ano is not None:
+        data_inicio = max(data_inicio or date.min, date(ano, 1, 1))
+        data_fim = min(data_fim or date.max, date(ano, 12, 31))
+
+    consulta = consulta_exportacao(salas_ids, materia_id, data_inicio, data_fim)
+    nome = f"notas.{formato}"
+    return StreamingResponse(
+        transmitir_exportacao(consulta, formato, user["id"]),
+        media_type="text/csv" if formato == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{nome}"'},
+    )
+
+
+def consulta_exportacao(salas_ids, materia_id, data_inicio, data_fim):
+    AlunoUser = aliased(models.User)
+    ProfessorUser = aliased(models.User)
+    sala = func.coalesce(models.Nota.sala_id, models.Aluno.sala_id)
+
+    consulta = (
+        select(
+            models.Nota.id.label("nota_id"),
+            models.Aluno.id.label("aluno_id"),
+            AlunoUser.username.label("aluno"),
+            models.Salas.sala.label("sala"),
+            models.Materia.nome.label("materia"),
+            ProfessorUser.username.label("professor"),
+            models.Nota.nota,
+            models.Nota.data_lancamento,
+        )
+        .join(models.Aluno, models.Nota.aluno_id == models.Aluno.id)
+        .join(AlunoUser, models.Aluno.usuario_id == AlunoUser.id)
+        .outerjoin(models.Salas, sala == models.Salas.id)
+        .join(models.Materia, models.Nota.materia_id == models.Materia.id)
+        .join(models.Professor, models.Nota.professor_id == models.Professor.id)
+        .join(ProfessorUser, models.Professor.usuario_id == ProfessorUser.id)
+        .order_by(models.Nota.id)
+    )
+    if salas_ids is not None:
+        consulta = consulta.where(sala.in_(salas_ids))
+    if materia_id is not None:
+        consulta = consulta.where(models.Nota.materia_id == materia_id)
+    if data_inicio is not None:
+        consulta = consulta.where(models.Nota.data_lancamento >= data_inicio)
+    if data_fim is not None:
+        consulta = consulta.where(models.Nota.data_lancamento <= data_fim)
+    return consulta.execution_options(yield_per=EXPORTACAO_LOTE)
+
+
+# Sessão própria, já que a da dependência é fechada antes de a resposta
+# terminar; cada partição do cursor vira um bloco da resposta
+async def transmitir_exportacao(consulta, formato, usuario_id):
+    if formato == "csv":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(COLUNAS_EXPORTACAO)
+        yield buffer.getvalue()
+
+    async with abrir_sessao_leitura(usuario_id) as db:
+        resultado = await db.stream(consulta)
+        try:
+            async for particao in resultado.partitions():
+                if formato == "csv":
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(particao)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(
+                        json.dumps(
+                            dict(zip(COLUNAS_EXPORTACAO, linha)),
+                            default=str,
+                            ensure_ascii=False,
+                        )
+                        + "\n"
+                        for linha in particao
+                    )
+        finally:
+            await resultado.close()
+
+
+# Salas que a consulta pode ver: a pedida (se houver) e, para o professor,
+# só as salas em que ele leciona. None significa todas (admin sem filtro).
+async def salas_permitidas(db, user, sala_id=None):
+    salas_ids = {sala_id} if sala_id is not None else None
+    if user["ocupacao"] == "professor":
+        permissoes = await cache_permissoes.obter(db, user["perfil_id"])
+        if sala_id is not None and sala_id not in permissoes.salas:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Você não leciona nessa sala",
+            )
+        salas_ids = salas_ids or permissoes.salas
+    return salas_ids
+
+
+# Estatísticas das médias dos alunos por sala×matéria (média, desvio padrão,
+# percentis e quantos estão abaixo do corte). Com geral=true, usa a média das
+# médias de cada aluno em todas as matérias.
+@router.get("/estatisticas", status_code=status.HTTP_200_OK)
+async def ler_estatisticas(
+    db: db_leitura,
+    user=Depends(only_for(["professor", "admin"])),
+    sala_id: Optional[int] = None,
+    materia_id: Optional[int] = None,
+    geral: bool = False,
+    corte: float = NOTA_CORTE,
+):
+    salas_ids = await salas_permitidas(db, user, sala_id)
+    notas = await carregar_notas(db, salas_ids, materia_id)
+
+    def calcular():
+        classificacao = classificar(notas, geral)
+        grupos = classificacao.grupos()
+        abaixo = classificacao.em_risco(corte)
+        for grupo, inicio, tamanho in zip(
+            grupos, classificacao.inicio, classificacao.tamanho
+        ):
+            fim = inicio + tamanho
+            grupo["em_risco"] = int(abaixo[inicio:fim].sum())
+        return grupos
+
+    # O cálculo sobre milhões de notas não deve travar o event loop
+    grupos = await run_in_threadpool(calcular)
+    return await nomear(db, grupos)
 
-    return {"msg": "Nota lançada com sucesso"}
+
+# Classificação dos alunos de uma sala numa matéria (ou na média geral),
+# com posição, média e z-score
+@router.get("/ranking/{sala_id}", status_code=status.HTTP_200_OK)
+async def ler_ranking(
+    sala_id: int,
+    db: db_leitura,
+    user=Depends(only_for(["professor", "admin"])),
+    materia_id: Optional[int] = None,
+):
+    salas_ids = await salas_permitidas(db, user, sala_id)
+    notas = await carregar_notas(db, salas_ids, materia_id)
+    classificacao = await run_in_threadpool(classificar, notas, materia_id is None)
+    return await nomear(db, classificacao.alunos())
+
+
+# Alunos com média abaixo do corte em alguma matéria, em todas as salas
+# visíveis (ou só na pedida), do menor z-score para o maior
+@router.get("/em-risco", status_code=status.HTTP_200_OK)
+async def ler_em_risco(
+    db: db_leitura,
+    user=Depends(only_for(["professor", "admin"])),
+    sala_id: Optional[int] = None,
+    materia_id: Optional[int] = None,
+    corte: float = NOTA_CORTE,
+):
+    salas_ids = await salas_permitidas(db, user, sala_id)
+    notas = await carregar_notas(db, salas_ids, materia_id)
+
+    def calcular():
+        classificacao = classificar(notas)
+        alunos = classificacao.alunos(classificacao.em_risco(corte))
+        return sorted(alunos, key=lambda aluno: aluno["z"])
+
+    return await nomear(db, await run_in_threadpool(calcular))
+
+
+# Acrescenta os nomes das matérias e (se houver aluno_id) dos alunos
+async def nomear(db, itens: list[dict]) -> list[dict]:
+    materias = dict(
+        (await db.execute(select(models.Materia.id, models.Materia.nome))).all()
+    )
+    materias[GERAL] = "Geral"
+    alunos_ids = {item["aluno_id"] for item in itens if "aluno_id" in item}
+    usernames = {}
+    if alunos_ids:
+        usernames = dict(
+            (
+                await db.execute(
+                    select(models.Aluno.id, models.User.username)
+                    .join(models.User, models.Aluno.usuario_id == models.User.id)
+                    .where(models.Aluno.id.in_(alunos_ids))
+                )
+            ).all()
+        )
+    for item in itens:
+        item["materia"] = materias.get(item["materia_id"])
+        if "aluno_id" in item:
+            item["aluno"] = usernames.get(item["aluno_id"])
+    return itens
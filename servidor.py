@@ -0,0 +1,232 @@
+"""Servidor de produção: vários workers uvicorn atendendo o mesmo socket::
+
+    python servidor.py
+
+O processo principal abre o socket, importa o app (SERVIDOR_PRELOAD) e cria
+os workers com fork, então cada worker já nasce com o app carregado. Ele só
+supervisiona: repõe workers que morrerem ou se reciclarem. Um worker que
+falha (sai com erro, inclusive na inicialização do app) só é reposto depois de
+uma espera que dobra a cada falha recente; com SERVIDOR_FALHAS_MAX falhas em
+SERVIDOR_FALHAS_JANELA segundos o servidor desiste e sai com código 1.
+
+Sinais no processo principal:
+
+- SIGTERM/SIGINT: drena os workers (terminam as requisições em andamento por
+  até SERVIDOR_DRENAGEM segundos) e sai.
+- SIGHUP: troca os workers sem fechar o socket: sobe os novos e drena os
+  antigos. Com SERVIDOR_PRELOAD=false cada worker importa o app de novo,
+  então a troca também carrega código novo; com preload é preciso reiniciar
+  o processo principal.
+
+Com mais de um worker, defina METRICAS_DIR (um diretório local gravável) para
+o /metrics somar os contadores de todos os workers; o processo principal
+limpa o diretório ao subir e incorpora o arquivo de cada worker que sai.
+"""
+
+import logging
+import os
+from collections import deque
+import signal
+import socket
+import time
+import uvicorn
+from config import ativado
+from monitoramento import metricas
+
+SERVIDOR_HOST = os.getenv("SERVIDOR_HOST", "0.0.0.0")
+SERVIDOR_PORTA = int(os.getenv("SERVIDOR_PORTA", "8000"))
+SERVIDOR_BACKLOG = int(os.getenv("SERVIDOR_BACKLOG", "2048"))
+# Quantidade de workers (padrão: um por CPU)
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+# Conexões simultâneas por worker; acima disso responde 503 (0 = sem limite)
+WORKER_CONCORRENCIA = int(os.getenv("WORKER_CONCORRENCIA", "0"))
+# Requisições atendidas antes de o worker se reciclar (0 = nunca)
+WORKER_MAX_REQUISICOES = int(os.getenv("WORKER_MAX_REQUISICOES", "0"))
+SERVIDOR_KEEPALIVE = int(os.getenv("SERVIDOR_KEEPALIVE", "5"))
+SERVIDOR_DRENAGEM = int(os.getenv("SERVIDOR_DRENAGEM", "30"))
+SERVIDOR_PRELOAD = ativado("SERVIDOR_PRELOAD", "true")
+# Espera antes de repor um worker que falhou: dobra a cada falha na janela
+SERVIDOR_ESPERA_INICIAL = float(os.getenv("SERVIDOR_ESPERA_INICIAL", "0.5"))
+SERVIDOR_ESPERA_MAX = float(os.getenv("SERVIDOR_ESPERA_MAX", "30"))
+# Falhas dentro da janela (em segundos) que encerram o servidor (0 = nunca)
+SERVIDOR_FALHAS_MAX = int(os.getenv("SERVIDOR_FALHAS_MAX", "5"))
+SERVIDOR_FALHAS_JANELA = float(os.getenv("SERVIDOR_FALHAS_JANELA", "60"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def abrir_socket(host: str = SERVIDOR_HOST, porta: int = SERVIDOR_PORTA):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, porta))
+    sock.listen(SERVIDOR_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def criar_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        "main:app",
+        lifespan="on",
+        limit_concurrency=WORKER_CONCORRENCIA or None,
+        limit_max_requests=WORKER_MAX_REQUISICOES or None,
+        timeout_keep_alive=SERVIDOR_KEEPALIVE,
+        timeout_graceful_shutdown=SERVIDOR_DRENAGEM,
+    )
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, sock, workers: int = WORKERS):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.pids = set()
+        # Workers antigos terminando as requisições depois de um SIGHUP
+        self.drenando = set()
+        self.sinais = []
+        # Instantes das falhas recentes de workers e quando repor o próximo
+        self.falhas = deque()
+        self.proximo_inicio = 0.0
+
+    def _receber(self, sinal, frame):
+        self.sinais.append(sinal)
+
+    def iniciar_worker(self):
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            return
+        # No worker o uvicorn trata SIGTERM/SIGINT. O SIGHUP é só do supervisor:
+        # ignorado aqui, um SIGHUP enviado ao grupo todo não derruba os workers.
+        for sinal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sinal, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        codigo = 0
+        try:
+            servidor = uvicorn.Server(self.config)
+            servidor.run(sockets=[self.sock])
+            # O uvicorn volta sem erro quando o startup do app falha
+            if not servidor.started:
+                codigo = 3
+        except BaseException:
+            logger.exception("Worker %s falhou", os.getpid())
+            codigo = 1
+        finally:
+            os._exit(codigo)
+
+    def _saiu(self, pid):
+        self.pids.discard(pid)
+        self.drenando.discard(pid)
+        if metricas.METRICAS_DIR:
+            metricas.incorporar_worker(metricas.METRICAS_DIR, pid)
+
+    def _recolher(self):
+        while self.pids:
+            pid, estado = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            codigo = os.waitstatus_to_exitcode(estado)
+            # Sair com 0 é reciclagem (WORKER_MAX_REQUISICOES); com -SIGTERM, o
+            # uvicorn drenou e repassou o sinal. Os que estavam drenando foram
+            # encerrados pelo próprio supervisor.
+            if codigo not in (0, -signal.SIGTERM) and pid not in self.drenando:
+                logger.warning("Worker %s saiu com código %s", pid, codigo)
+                self._falhou()
+            self._saiu(pid)
+
+    def _falhou(self):
+        agora = time.monotonic()
+        self.falhas.append(agora)
+        while self.falhas[0] < agora - SERVIDOR_FALHAS_JANELA:
+            self.falhas.popleft()
+        espera = min(
+            SERVIDOR_ESPERA_INICIAL * 2 ** (len(self.falhas) - 1), SERVIDOR_ESPERA_MAX
+        )
+        self.proximo_inicio = agora + espera
+
+    def _sinalizar(self, pids, sinal):
+        for pid in pids:
+            try:
+                os.kill(pid, sinal)
+            except ProcessLookupError:
+                pass
+
+    def trocar_workers(self):
+        antigos = self.pids - self.drenando
+        logger.info("Trocando %s workers", len(antigos))
+        self.drenando |= antigos
+        for _ in range(self.workers):
+            self.iniciar_worker()
+        self._sinalizar(antigos, signal.SIGTERM)
+
+    def encerrar(self):
+        logger.info("Drenando %s workers", len(self.pids))
+        self._sinalizar(self.pids, signal.SIGTERM)
+        limite = time.monotonic() + SERVIDOR_DRENAGEM + 5
+        while self.pids and time.monotonic() < limite:
+            self._recolher()
+            time.sleep(0.1)
+        self._sinalizar(self.pids, signal.SIGKILL)
+        while self.pids:
+            pid, _ = os.waitpid(-1, 0)
+            self._saiu(pid)
+
+    def executar(self) -> int:
+        for sinal in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sinal, self._receber)
+        for _ in range(self.workers):
+            self.iniciar_worker()
+        while True:
+            self._recolher()
+            if self.sinais:
+                if self.sinais.pop(0) == signal.SIGHUP:
+                    self.trocar_workers()
+                    continue
+                self.encerrar()
+                return 0
+            if SERVIDOR_FALHAS_MAX and len(self.falhas) >= SERVIDOR_FALHAS_MAX:
+                logger.error(
+                    "%s falhas de workers em %ss; encerrando",
+                    len(self.falhas),
+                    SERVIDOR_FALHAS_JANELA,
+                )
+                self.encerrar()
+                return 1
+            if len(self.pids - self.drenando) < self.workers:
+                if time.monotonic() >= self.proximo_inicio:
+                    self.iniciar_worker()
+                    continue
+                time.sleep(0.1)
+                continue
+            time.sleep(0.5)
+
+
+def main():
+    config = criar_config()
+    if WORKERS > 1 and os.getenv("PUBSUB_BACKEND", "memoria") == "memoria":
+        logger.warning(
+            "PUBSUB_BACKEND=memoria com %s workers: os eventos de notas só chegam "
+            "aos alunos conectados no mesmo worker; use PUBSUB_BACKEND=postgres",
+            WORKERS,
+        )
+    if metricas.METRICAS_DIR:
+        metricas.limpar_diretorio(metricas.METRICAS_DIR)
+    elif WORKERS > 1:
+        logger.warning(
+            "METRICAS_DIR não definido com %s workers: cada leitura do /metrics "
+            "mostra só os contadores do worker que a atendeu",
+            WORKERS,
+        )
+    sock = abrir_socket()
+    if SERVIDOR_PRELOAD:
+        # Importa o app aqui; os workers herdam tudo pelo fork. Nenhuma conexão
+        # ao banco é aberta no import (e os pools são descartados no fork).
+        config.load()
+    logger.info(
+        "Servindo em %s:%s com %s workers", SERVIDOR_HOST, SERVIDOR_PORTA, WORKERS
+    )
+    raise SystemExit(Supervisor(config, sock).executar())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import asyncio
+import atexit
+import itertools
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# Os módulos do app leem a configuração ao serem importados. O banco dos
+# testes é um SQLite em arquivo: em memória, cada thread do threadpool veria
+# um banco vazio próprio.
+_DIRETORIO = tempfile.mkdtemp(prefix="portal-testes-")
+atexit.register(shutil.rmtree, _DIRETORIO, True)
+os.environ.setdefault("URL_DATABASE", f"sqlite:///{_DIRETORIO}/testes.db")
+os.environ.setdefault("SECRET_KEY", "testes")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from autenticador_jwt import senhas  # noqa: E402
+from autenticador_jwt.cache_tokens import cache_tokens  # noqa: E402
+from autenticador_jwt.permissoes import cache_permissoes  # noqa: E402
+from database import database, models  # noqa: E402
+from database.esquema import criar_esquema  # noqa: E402
+from database.sequencias import alocador_matricula  # noqa: E402
+from main import app  # noqa: E402
+from rotas import professor  # noqa: E402
+
+# O custo padrão do bcrypt deixaria cada cadastro e login com ~250 ms
+senhas.bcrypt_context.update(bcrypt__rounds=4)
+
+SENHA = "senha12345"
+_cpfs = itertools.count(100000001)
+
+
+def gerar_cpf() -> str:
+    cpf = str(next(_cpfs))
+    for tamanho in (9, 10):
+        soma = sum(int(d) * p for d, p in zip(cpf, range(tamanho + 1, 1, -1)))
+        resto = soma % 11
+        cpf += str(0 if resto < 2 else 11 - resto)
+    return cpf
+
+
+class Portal:
+    """Cliente HTTP do app com atalhos para montar os cenários dos testes."""
+
+    def __init__(self, cliente: httpx.AsyncClient):
+        self.cliente = cliente
+        self.get = cliente.get
+        self.post = cliente.post
+
+    async def login(self, username: str) -> dict:
+        resposta = await self.post(
+            "/auth/token", data={"username": username, "password": SENHA}
+        )
+        assert resposta.status_code == 200, resposta.text
+        return resposta.json()
+
+    # Cria o usuário e devolve os cabeçalhos com o token dele
+    async def usuario(self, username: str, ocupacao: str) -> dict:
+        resposta = await self.post(
+            "/auth/",
+            json={"username": username, "password": SENHA, "ocupacao": ocupacao},
+        )
+        assert resposta.status_code == 201, resposta.text
+        tokens = await self.login(username)
+        return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    async def perfil_id(self, cabecalhos: dict) -> int:
+        return (await self.get("/", headers=cabecalhos)).json()["user"]["perfil_id"]
+
+    async def aluno(self, username: str, sala_id: int) -> SimpleNamespace:
+        cabecalhos = await self.usuario(username, "aluno")
+        resposta = await self.post(
+            "/aluno/infoalunos/",
+            headers=cabecalhos,
+            json={
+                "cpf": gerar_cpf(),
+                "telefone": "11999998888",
+                "endereco": "Rua das Flores 10",
+                "data_nascimento": "2010-01-01",
+                "email": f"{username}@exemplo.com",
+                "serie": "1",
+                "nome_pai": "Pai",
+                "nome_mae": "Mãe",
+                "sala_id": sala_id,
+            },
+        )
+        assert resposta.status_code == 200, resposta.text
+        return SimpleNamespace(
+            cabecalhos=cabecalhos, id=await self.perfil_id(cabecalhos)
+        )
+
+    async def info_professor(self, cabecalhos: dict, salas_ids, materias_ids):
+        return await self.post(
+            "/professor/infoprofessor/",
+            headers=cabecalhos,
+            json={
+                "cpf": gerar_cpf(),
+                "telefone": "11999998888",
+                "email": "professor@exemplo.com",
+                "formacao": None,
+                "especializacao": None,
+                "data_nascimento": "1980-01-01",
+                "endereco": "Rua A 100",
+                "salas_ids": list(salas_ids),
+                "materias_ids": list(materias_ids),
+            },
+        )
+
+    async def escola(
+        self, salas: int = 1, materias: int = 1, salas_professor=None
+    ) -> SimpleNamespace:
+        """Admin, salas 1..n, matérias 1..n e um professor com info cadastrada
+        (em todas as salas, ou só em salas_professor, e em todas as matérias)."""
+        admin = await self.usuario("admin", "admin")
+        for numero in range(1, salas + 1):
+            resposta = await self.post(
+                "/admin/criarsalas", headers=admin, json={"sala": f"{numero}A"}
+            )
+            assert resposta.status_code == 201, resposta.text
+        for numero in range(1, materias + 1):
+            resposta = await self.post(
+                "/admin/criarmaterias",
+                headers=admin,
+                json={"nome": f"Matéria {numero}"},
+            )
+            assert resposta.status_code == 201, resposta.text
+        cabecalhos = await self.usuario("professor", "professor")
+        salas_ids = salas_professor or range(1, salas + 1)
+        resposta = await self.info_professor(
+            cabecalhos, salas_ids, range(1, materias + 1)
+        )
+        assert resposta.status_code == 200, resposta.text
+        return SimpleNamespace(
+            admin=admin,
+            professor=cabecalhos,
+            professor_id=await self.perfil_id(cabecalhos),
+        )
+
+    async def lancar(self, cabecalhos: dict, aluno_id, materia_id, nota, **kwargs):
+        return await self.post(
+            "/professor/lançarnotas/",
+            headers=cabecalhos,
+            json={"aluno_id": aluno_id, "materia_id": materia_id, "nota": nota},
+            **kwargs,
+        )
+
+
+@pytest.fixture
+def banco():
+    """Banco vazio com o esquema criado, e os caches do processo zerados."""
+    database.base.metadata.drop_all(database.engine)
+    criar_esquema()
+    cache_permissoes.limpar()
+    cache_tokens.limpar()
+    alocador_matricula.descartar()
+    database._ultima_escrita.clear()
+    return database.engine
+
+
+@pytest.fixture
+def notas_unicas_por_dia(monkeypatch, banco):
+    monkeypatch.setattr(models, "NOTAS_UNICAS_POR_DIA", True)
+    monkeypatch.setattr(professor, "NOTAS_UNICAS_POR_DIA", True)
+    # Cria o índice único, que só existe com a opção ligada
+    criar_esquema()
+
+
+@pytest.fixture
+def portal(banco):
+    """portal(cenario) roda cenario(Portal) num event loop novo, com um
+    httpx.AsyncClient ligado ao app, e devolve o resultado."""
+
+    def rodar(cenario):
+        async def executar():
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transporte, base_url="http://testes"
+            ) as cliente:
+                return await cenario(Portal(cliente))
+
+        return asyncio.run(executar())
+
+    return rodar
@@ -0,0 +1,95 @@
+def test_notas_do_aluno_respondem_304_ate_uma_nota_nova(portal):
+    async def cenario(p):
+        escola = await p.escola()
+        aluno = await p.aluno("aluno", sala_id=1)
+        await p.lancar(escola.professor, aluno.id, 1, 8.0)
+
+        for rota in ("/aluno/notas", "/aluno/boletim"):
+            primeira = await p.get(rota, headers=aluno.cabecalhos)
+            assert primeira.status_code == 200
+            etag = primeira.headers["ETag"]
+            ultima_alteracao = primeira.headers["Last-Modified"]
+
+            repetida = await p.get(
+                rota, headers={**aluno.cabecalhos, "If-None-Match": etag}
+            )
+            assert repetida.status_code == 304
+            assert repetida.content == b""
+            assert repetida.headers["ETag"] == etag
+
+            por_data = await p.get(
+                rota,
+                headers={**aluno.cabecalhos, "If-Modified-Since": ultima_alteracao},
+            )
+            assert por_data.status_code == 304
+            antiga = "Mon, 01 Jan 2024 00:00:00 GMT"
+            por_data_antiga = await p.get(
+                rota, headers={**aluno.cabecalhos, "If-Modified-Since": antiga}
+            )
+            assert por_data_antiga.status_code == 200
+
+        etag = (await p.get("/aluno/notas", headers=aluno.cabecalhos)).headers["ETag"]
+        await p.lancar(escola.professor, aluno.id, 1, 6.0)
+
+        for rota in ("/aluno/notas", "/aluno/boletim"):
+            depois = await p.get(
+                rota,
+                headers={
+                    **aluno.cabecalhos,
+                    "If-None-Match": etag,
+                    # If-None-Match prevalece sobre If-Modified-Since
+                    "If-Modified-Since": "Fri, 31 Dec 9999 23:59:59 GMT",
+                },
+            )
+            assert depois.status_code == 200
+            assert depois.headers["ETag"] != etag
+        notas = (await p.get("/aluno/notas", headers=aluno.cabecalhos)).json()
+        assert [nota["nota"] for nota in notas] == [8.0, 6.0]
+
+    portal(cenario)
+
+
+def test_etag_da_sala_muda_so_com_notas_da_sala(portal):
+    async def cenario(p):
+        escola = await p.escola(salas=2)
+        da_sala = await p.aluno("da_sala", sala_id=1)
+        de_outra = await p.aluno("de_outra", sala_id=2)
+        await p.lancar(escola.professor, da_sala.id, 1, 7.0)
+
+        async def etags():
+            return [
+                (await p.get(rota, headers=escola.professor)).headers["ETag"]
+                for rota in (
+                    "/professor/medias/1",
+                    f"/professor/boletim/{da_sala.id}",
+                )
+            ]
+
+        antes = await etags()
+        sem_mudanca = await p.get(
+            "/professor/medias/1",
+            headers={**escola.professor, "If-None-Match": f"x, {antes[0]}"},
+        )
+        assert sem_mudanca.status_code == 304
+
+        await p.lancar(escola.professor, de_outra.id, 1, 9.0)
+        assert await etags() == antes
+
+        resposta = await p.post(
+            "/professor/lancarnotas/lote",
+            headers=escola.professor,
+            json=[{"aluno_id": da_sala.id, "materia_id": 1, "nota": 5.0}],
+        )
+        assert resposta.json()["inseridas"] == 1
+        depois = await etags()
+        assert depois[0] != antes[0]
+        assert depois[1] != antes[1]
+
+        atualizada = await p.get(
+            "/professor/medias/1",
+            headers={**escola.professor, "If-None-Match": antes[0]},
+        )
+        assert atualizada.status_code == 200
+        assert atualizada.json()[0]["quantidade"] == 2
+
+    portal(cenario)
@@ -0,0 +1,114 @@
+import random
+
+from pydantic import TypeAdapter
+
+from validacao.documentos import (
+    CPF,
+    Telefone,
+    cpf_valido,
+    cpfs_repetidos_no_lote,
+    normalizar_cpf,
+    validar_lote,
+)
+from validacao.vali_aluno import AlunoBase
+
+CPFS_VALIDOS = ["52998224725", "11144477735", "39053344705", "00000000191"]
+CPFS_INVALIDOS = [
+    "52998224724",  # segundo dígito errado
+    "52998224735",  # primeiro dígito errado
+    "11111111111",  # sequência repetida
+    "00000000000",
+    "5299822472",  # curto
+    "529982247250",  # longo
+    "",
+]
+
+
+# Cálculo direto dos dígitos verificadores, para comparar com o otimizado
+def _com_digitos(base: str) -> str:
+    for tamanho in (9, 10):
+        soma = sum(int(d) * p for d, p in zip(base, range(tamanho + 1, 1, -1)))
+        resto = soma % 11
+        base += str(0 if resto < 2 else 11 - resto)
+    return base
+
+
+def _cpf_valido_referencia(cpf: str) -> bool:
+    return (
+        len(cpf) == 11
+        and cpf.isdigit()
+        and len(set(cpf)) > 1
+        and _com_digitos(cpf[:9]) == cpf
+    )
+
+
+def test_cpfs_conhecidos():
+    assert all(cpf_valido(cpf) for cpf in CPFS_VALIDOS)
+    assert not any(cpf_valido(cpf) for cpf in CPFS_INVALIDOS)
+
+
+def test_cpf_valido_igual_ao_calculo_direto():
+    gerador = random.Random(11)
+    cpfs = [f"{gerador.randrange(10**11):011d}" for _ in range(20000)]
+    # Metade com os dígitos certos, para haver válidos
+    for indice in range(0, len(cpfs), 2):
+        cpfs[indice] = _com_digitos(cpfs[indice][:9])
+    assert sum(map(_cpf_valido_referencia, cpfs)) > 5000
+    for cpf in cpfs:
+        assert cpf_valido(cpf) == _cpf_valido_referencia(cpf), cpf
+
+
+def test_normalizar_cpf_aceita_pontuacao():
+    assert normalizar_cpf("529.982.247-25") == "52998224725"
+
+
+def test_validar_lote_indica_os_indices_com_erro():
+    valores, erros = validar_lote(
+        TypeAdapter(list[CPF]),
+        ["529.982.247-25", "123", "111.111.111-11", "11144477735", "390.533.447-06"],
+    )
+
+    assert valores == ["52998224725", None, None, "11144477735", None]
+    assert sorted(erros) == [1, 2, 4]
+    assert all("CPF inválido" in mensagem for mensagem in erros.values())
+
+
+def test_validar_lote_sem_erros():
+    valores, erros = validar_lote(
+        TypeAdapter(list[Telefone]), ["(11) 99999-8888", "1133334444"]
+    )
+
+    assert valores == ["11999998888", "1133334444"]
+    assert erros == {}
+
+
+def test_validar_lote_de_modelos_guarda_uma_mensagem_por_item():
+    aluno = {
+        "cpf": "529.982.247-25",
+        "telefone": "11999998888",
+        "endereco": "Rua das Flores 10",
+        "data_nascimento": "2010-01-01",
+        "email": "aluno@exemplo.com",
+        "serie": "1",
+        "nome_pai": "Pai",
+        "nome_mae": "Mãe",
+        "sala_id": 1,
+    }
+    lote = [
+        aluno,
+        {**aluno, "cpf": "52998224724", "telefone": "123"},
+        {**aluno, "cpf": "11144477735"},
+        {**aluno, "telefone": "1"},
+    ]
+
+    valores, erros = validar_lote(TypeAdapter(list[AlunoBase]), lote)
+
+    assert sorted(erros) == [1, 3]
+    assert [valor is None for valor in valores] == [False, True, False, True]
+    assert valores[2].cpf == "11144477735"
+
+
+def test_cpfs_repetidos_no_lote():
+    cpfs = ["52998224725", None, "11144477735", "52998224725", None, "11144477735"]
+
+    assert cpfs_repetidos_no_lote(cpfs) == {3, 5}
@@ -0,0 +1,112 @@
+import numpy as np
+
+from database.estatisticas_notas import (
+    GERAL,
+    PERCENTIS,
+    Classificacao,
+    NotasColunas,
+    classificar,
+)
+
+
+def _classificacao(grupos: dict) -> Classificacao:
+    """grupos: (sala, materia) -> médias dos alunos (aluno_id = posição + 1)."""
+    sala, materia, aluno, medias = [], [], [], []
+    for (sala_id, materia_id), valores in grupos.items():
+        for indice, valor in enumerate(valores):
+            sala.append(sala_id)
+            materia.append(materia_id)
+            aluno.append(indice + 1)
+            medias.append(valor)
+    return Classificacao(
+        np.array(sala), np.array(materia), np.array(aluno), np.array(medias)
+    )
+
+
+def _grupo(classificacao: Classificacao, sala_id: int, materia_id: int) -> slice:
+    for inicio, tamanho, sala, materia in zip(
+        classificacao.inicio,
+        classificacao.tamanho,
+        classificacao.grupo_sala,
+        classificacao.grupo_materia,
+    ):
+        if (sala, materia) == (sala_id, materia_id):
+            return slice(inicio, inicio + tamanho)
+    raise AssertionError(f"grupo {sala_id}x{materia_id} ausente")
+
+
+def test_percentis_iguais_aos_do_numpy():
+    gerador = np.random.default_rng(7)
+    grupos = {
+        (sala, materia): np.round(gerador.uniform(0, 10, tamanho), 2)
+        for (sala, materia), tamanho in {
+            (1, 1): 1,
+            (1, 2): 2,
+            (2, 1): 7,
+            (3, 4): 50,
+        }.items()
+    }
+    classificacao = _classificacao(grupos)
+
+    for p in PERCENTIS:
+        valores = classificacao.percentil(p)
+        for indice, (sala, materia) in enumerate(
+            zip(classificacao.grupo_sala, classificacao.grupo_materia)
+        ):
+            esperado = np.percentile(grupos[(sala, materia)], p)
+            assert abs(valores[indice] - esperado) < 1e-9
+
+
+def test_empates_dividem_a_posicao():
+    # 0.1 + 0.2 != 0.3 em ponto flutuante, mas é a mesma média
+    classificacao = _classificacao({(1, 1): [8.0, 9.5, 0.1 + 0.2, 8.0, 0.3, 6.0]})
+
+    assert classificacao.media.tolist()[:2] == [9.5, 8.0]
+    assert classificacao.posicao.tolist() == [1, 2, 2, 4, 5, 5]
+
+
+def test_z_score_usa_o_desvio_populacional_do_grupo():
+    valores = [4.0, 6.0, 7.0, 9.0, 9.0]
+    classificacao = _classificacao({(1, 1): valores, (2, 1): [5.0, 10.0]})
+
+    grupo = _grupo(classificacao, 1, 1)
+    esperado = (classificacao.media[grupo] - np.mean(valores)) / np.std(valores)
+    assert np.allclose(classificacao.z[grupo], esperado)
+    assert np.allclose(classificacao.z[_grupo(classificacao, 2, 1)], [1.0, -1.0])
+
+
+def test_grupo_de_um_aluno_tem_desvio_zero_e_z_zero():
+    classificacao = _classificacao({(1, 1): [7.5], (1, 2): [6.0, 6.0]})
+
+    (grupo,) = [g for g in classificacao.grupos() if g["materia_id"] == 1]
+    assert grupo["alunos"] == 1
+    assert grupo["desvio"] == 0
+    assert all(grupo[f"p{p}"] == 7.5 for p in PERCENTIS)
+    for aluno in classificacao.alunos():
+        assert aluno["posicao"] == 1
+        assert aluno["z"] == 0
+
+
+def test_classificacao_geral_usa_a_media_das_materias():
+    notas = NotasColunas(
+        aluno=np.array([1, 1, 1, 2, 2]),
+        sala=np.array([1, 1, 1, 1, 1]),
+        materia=np.array([1, 1, 2, 1, 2]),
+        nota=np.array([6.0, 8.0, 10.0, 9.0, 7.0]),
+    )
+
+    por_materia = classificar(notas)
+    geral = classificar(notas, geral=True)
+
+    assert por_materia.media[_grupo(por_materia, 1, 1)].tolist() == [9.0, 7.0]
+    assert geral.materia.tolist() == [GERAL, GERAL]
+    assert geral.aluno.tolist() == [1, 2]
+    assert geral.media.tolist() == [8.5, 8.0]
+
+
+def test_sem_notas():
+    vazio = np.empty(0, dtype=np.int64)
+    classificacao = classificar(NotasColunas(vazio, vazio, vazio, np.empty(0)))
+
+    assert classificacao.grupos() == []
+    assert classificacao.alunos() == []
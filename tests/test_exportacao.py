@@ -0,0 +1,41 @@
+import json
+
+from sqlalchemy import update
+
+from database.database import SessionLocal
+from database.models import Aluno
+
+
+async def _exportar(p, cabecalhos: dict) -> list:
+    resposta = await p.get(
+        "/professor/exportar/notas", headers=cabecalhos, params={"formato": "jsonl"}
+    )
+    assert resposta.status_code == 200
+    return [json.loads(linha) for linha in resposta.text.splitlines()]
+
+
+def test_notas_exportadas_na_sala_do_lancamento(portal):
+    async def cenario(p):
+        escola = await p.escola(salas=2, salas_professor=[1])
+        professor_sala_2 = await p.usuario("professor2", "professor")
+        await p.info_professor(professor_sala_2, [2], [1])
+        ana = await p.aluno("ana", sala_id=1)
+        await p.lancar(escola.professor, ana.id, 1, 7.0)
+
+        # Ana muda de sala: a nota já lançada continua na sala 1
+        with SessionLocal() as db:
+            db.execute(update(Aluno).where(Aluno.id == ana.id).values(sala_id=2))
+            db.commit()
+        await p.lancar(professor_sala_2, ana.id, 1, 9.0)
+
+        return (
+            await _exportar(p, escola.professor),
+            await _exportar(p, professor_sala_2),
+            await _exportar(p, escola.admin),
+        )
+
+    sala_1, sala_2, todas = portal(cenario)
+
+    assert [(linha["sala"], linha["nota"]) for linha in sala_1] == [("1A", 7.0)]
+    assert [(linha["sala"], linha["nota"]) for linha in sala_2] == [("2A", 9.0)]
+    assert [linha["sala"] for linha in todas] == ["1A", "2A"]
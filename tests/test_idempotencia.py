@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from database.database import SessionLocal
+from database.models import ChaveIdempotencia, Nota
+
+LOTE = "/professor/lancarnotas/lote"
+
+
+def _notas() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(Nota))
+
+
+def _com_chave(cabecalhos: dict, chave: str) -> dict:
+    return {**cabecalhos, "Idempotency-Key": chave}
+
+
+def test_repeticao_devolve_a_resposta_guardada(portal):
+    async def cenario(p):
+        escola = await p.escola()
+        aluno = await p.aluno("aluno", sala_id=1)
+        cabecalhos = _com_chave(escola.professor, "individual")
+        corpo_lote = [{"aluno_id": aluno.id, "materia_id": 1, "nota": 6.0}]
+
+        primeira = await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        assert primeira.status_code == 200
+        assert "Idempotent-Replayed" not in primeira.headers
+        lote = await p.post(
+            LOTE, headers=_com_chave(escola.professor, "lote"), json=corpo_lote
+        )
+        assert lote.json()["inseridas"] == 1
+        assert _notas() == 2
+
+        repetida = await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        assert repetida.status_code == 200
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+        assert repetida.json() == primeira.json()
+        lote_repetido = await p.post(
+            LOTE, headers=_com_chave(escola.professor, "lote"), json=corpo_lote
+        )
+        assert lote_repetido.headers["Idempotent-Replayed"] == "true"
+        assert lote_repetido.json() == lote.json()
+        assert _notas() == 2
+
+        # Sem a chave, o mesmo pedido lança outra nota
+        assert (await p.lancar(escola.professor, aluno.id, 1, 8.0)).status_code == 200
+        assert _notas() == 3
+
+    portal(cenario)
+
+
+def test_mesma_chave_em_outra_requisicao_e_recusada(portal):
+    async def cenario(p):
+        escola = await p.escola()
+        aluno = await p.aluno("aluno", sala_id=1)
+        cabecalhos = _com_chave(escola.professor, "chave")
+        await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+
+        outro_corpo = await p.lancar(cabecalhos, aluno.id, 1, 9.0)
+        outra_rota = await p.post(
+            LOTE,
+            headers=cabecalhos,
+            json=[{"aluno_id": aluno.id, "materia_id": 1, "nota": 8.0}],
+        )
+        for resposta in (outro_corpo, outra_rota):
+            assert resposta.status_code == 422
+            assert resposta.json()["detail"] == (
+                "Idempotency-Key já usada em outra requisição"
+            )
+        assert _notas() == 1
+
+    portal(cenario)
+
+
+def test_chave_expirada_lanca_de_novo(portal):
+    async def cenario(p):
+        escola = await p.escola()
+        aluno = await p.aluno("aluno", sala_id=1)
+        cabecalhos = _com_chave(escola.professor, "chave")
+        await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        with SessionLocal() as db:
+            db.execute(
+                update(ChaveIdempotencia).values(
+                    criado_em=datetime.utcnow() - timedelta(hours=25)
+                )
+            )
+            db.commit()
+
+        resposta = await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        assert resposta.status_code == 200
+        assert "Idempotent-Replayed" not in resposta.headers
+        assert _notas() == 2
+        # A chave foi gravada de novo e volta a valer
+        repetida = await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+        assert _notas() == 2
+
+    portal(cenario)
+
+
+def test_respostas_de_erro_nao_sao_guardadas(portal):
+    async def cenario(p):
+        escola = await p.escola(salas=2, salas_professor=[1])
+        aluno = await p.aluno("aluno", sala_id=1)
+        fora = await p.aluno("fora", sala_id=2)
+        cabecalhos = _com_chave(escola.professor, "chave")
+
+        assert (await p.lancar(cabecalhos, 999, 1, 8.0)).status_code == 404
+        assert (await p.lancar(cabecalhos, fora.id, 1, 8.0)).status_code == 403
+        with SessionLocal() as db:
+            assert db.scalar(select(func.count()).select_from(ChaveIdempotencia)) == 0
+
+        # A chave continua livre para um pedido que dá certo
+        resposta = await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        assert resposta.status_code == 200
+        assert "Idempotent-Replayed" not in resposta.headers
+        assert _notas() == 1
+
+    portal(cenario)
+
+
+def test_nota_unica_por_dia(portal, notas_unicas_por_dia):
+    async def cenario(p):
+        escola = await p.escola(materias=2)
+        aluno = await p.aluno("aluno", sala_id=1)
+        cabecalhos = _com_chave(escola.professor, "chave")
+
+        assert (await p.lancar(cabecalhos, aluno.id, 1, 8.0)).status_code == 200
+        # A repetição com a chave devolve a resposta original, não o conflito
+        repetida = await p.lancar(cabecalhos, aluno.id, 1, 8.0)
+        assert repetida.status_code == 200
+        assert repetida.headers["Idempotent-Replayed"] == "true"
+
+        segunda = await p.lancar(escola.professor, aluno.id, 1, 9.0)
+        assert segunda.status_code == 409
+        assert segunda.json()["detail"] == (
+            "Nota já lançada hoje para esse aluno e matéria"
+        )
+
+        lote = await p.post(
+            LOTE,
+            headers=escola.professor,
+            json=[
+                {"aluno_id": aluno.id, "materia_id": 1, "nota": 5.0},
+                {"aluno_id": aluno.id, "materia_id": 2, "nota": 6.0},
+                {"aluno_id": aluno.id, "materia_id": 2, "nota": 7.0},
+            ],
+        )
+        assert lote.status_code == 200
+        assert lote.json()["inseridas"] == 1
+        assert [erro["indice"] for erro in lote.json()["erros"]] == [0, 2]
+        assert {erro["detail"] for erro in lote.json()["erros"]} == {
+            "Nota já lançada hoje para esse aluno e matéria"
+        }
+        assert _notas() == 2
+
+    portal(cenario)
@@ -0,0 +1,72 @@
+from sqlalchemy import func, select
+
+from database.database import SessionLocal
+from database.models import User
+from rotas import admin
+
+
+def _csv(quantidade: int) -> bytes:
+    linhas = ["username,password,ocupacao"]
+    linhas += [f"professor{i},senha12345,professor" for i in range(quantidade)]
+    return ("\n".join(linhas) + "\n").encode()
+
+
+async def _importar(p, cabecalhos: dict, conteudo: bytes):
+    return await p.post(
+        "/admin/importarusuarios/csv",
+        headers=cabecalhos,
+        files={"arquivo": ("usuarios.csv", conteudo, "text/csv")},
+    )
+
+
+def _professores() -> int:
+    with SessionLocal() as db:
+        return db.scalar(
+            select(func.count()).select_from(User).where(User.ocupacao == "professor")
+        )
+
+
+def test_csv_valido(portal):
+    async def cenario(p):
+        cabecalhos = await p.usuario("admin", "admin")
+        return await _importar(p, cabecalhos, _csv(5))
+
+    resposta = portal(cenario)
+
+    assert resposta.status_code == 200
+    assert resposta.json() == {"criados": 5, "rejeitados": []}
+
+
+def test_arquivo_fora_do_utf8_devolve_400_com_o_que_foi_gravado(portal, monkeypatch):
+    monkeypatch.setattr(admin, "IMPORTACAO_LOTE", 50)
+    # Maior que o buffer do TextIOWrapper, para haver linhas antes do erro
+    conteudo = _csv(600) + "professorx,senha12345,professor\n".encode("latin-1")
+    conteudo += "coração,senha12345,professor\n".encode("latin-1")
+
+    async def cenario(p):
+        cabecalhos = await p.usuario("admin", "admin")
+        return await _importar(p, cabecalhos, conteudo)
+
+    resposta = portal(cenario)
+
+    assert resposta.status_code == 400
+    detalhe = resposta.json()["detail"]
+    assert detalhe["msg"] == "O arquivo deve estar em UTF-8"
+    assert 0 < detalhe["criados"] < 600
+    assert _professores() == detalhe["criados"]
+
+
+def test_csv_invalido_devolve_400(portal):
+    conteudo = _csv(3) + b'grande,"' + b"x" * 200_000 + b'",professor\n'
+
+    async def cenario(p):
+        cabecalhos = await p.usuario("admin", "admin")
+        return await _importar(p, cabecalhos, conteudo)
+
+    resposta = portal(cenario)
+
+    assert resposta.status_code == 400
+    detalhe = resposta.json()["detail"]
+    assert detalhe["msg"].startswith("CSV inválido")
+    assert detalhe["criados"] == 3
+    assert _professores() == 3
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import random
+import pytest
+from rotas.admin import ler_array_json
+
+
+async def _partes(corpo: bytes, tamanho_max: int, semente: int):
+    aleatorio = random.Random(semente)
+    inicio = 0
+    while inicio < len(corpo):
+        fim = inicio + aleatorio.randint(1, tamanho_max)
+        yield corpo[inicio:fim]
+        inicio = fim
+
+
+def ler(corpo: bytes, tamanho_max: int = 7, semente: int = 0):
+    async def _ler():
+        return [
+            item async for item in ler_array_json(_partes(corpo, tamanho_max, semente))
+        ]
+
+    return asyncio.run(_ler())
+
+
+def test_pedacos_arbitrarios_dao_o_mesmo_que_json_loads():
+    dados = [
+        {"username": f"usuário{i}", "lista": [1, {"a": "}]"}], "texto": 'ç"\\'}
+        for i in range(40)
+    ]
+    corpo = json.dumps(dados, ensure_ascii=False, indent=1).encode()
+    for semente in range(20):
+        assert ler(corpo, semente=semente) == list(enumerate(dados))
+
+
+@pytest.mark.parametrize("corpo", [b"[]", b"  [ ]\n"])
+def test_array_vazio(corpo):
+    assert ler(corpo) == []
+
+
+@pytest.mark.parametrize(
+    "corpo",
+    [
+        b"",
+        b"{}",
+        b"[1]",
+        b"[{},]",
+        b"[{} {}]",
+        b"[{}",
+        b"[{}] x",
+        b'[{"a":}]',
+        b"[\xff]",
+    ],
+)
+def test_corpo_invalido(corpo):
+    with pytest.raises(ValueError):
+        ler(corpo)
@@ -0,0 +1,54 @@
+import json
+
+from monitoramento import metricas
+
+
+def _retrato(requisicoes: int, inseridas: int) -> dict:
+    histograma = metricas.Histograma()
+    for _ in range(requisicoes):
+        histograma.observar(0.02)
+    return metricas._serializar(
+        {("GET", "/"): histograma},
+        {("GET", "/", 200): requisicoes},
+        {"notas": inseridas},
+        {"jwt_hits": requisicoes},
+    )
+
+
+def _gravar(diretorio, nome: str, dados: dict):
+    (diretorio / nome).write_text(json.dumps(dados))
+
+
+def test_soma_os_workers_vivos_e_encerrados(tmp_path):
+    _gravar(tmp_path, "10-1.json", _retrato(3, 1))
+    _gravar(tmp_path, "11-1.json", _retrato(4, 2))
+    antes = metricas.somar(metricas._retratos_diretorio(str(tmp_path)))
+
+    metricas.incorporar_worker(str(tmp_path), 10)
+    # Um worker novo com o pid reaproveitado não herda a contagem do antigo
+    _gravar(tmp_path, "10-2.json", _retrato(5, 0))
+    depois = metricas.somar(metricas._retratos_diretorio(str(tmp_path)))
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "10-2.json",
+        "11-1.json",
+        metricas.ARQUIVO_ENCERRADOS,
+    ]
+    assert antes["requisicoes"] == [["GET", "/", 200, 7]]
+    assert depois["requisicoes"] == [["GET", "/", 200, 12]]
+    assert depois["linhas_inseridas"] == {"notas": 3}
+    assert depois["contadores"] == {"jwt_hits": 12}
+    _, _, soma, total, contagens = depois["latencias"][0]
+    assert total == 12 and sum(contagens) == 12
+    assert abs(soma - 0.24) < 1e-9
+
+
+def test_arquivo_incorporado_lido_antes_de_sumir_nao_conta_duas_vezes(tmp_path):
+    _gravar(tmp_path, "10-1.json", _retrato(3, 0))
+    lido_antes = json.loads((tmp_path / "10-1.json").read_text())
+    metricas.incorporar_worker(str(tmp_path), 10)
+    _gravar(tmp_path, "10-1.json", lido_antes)
+
+    total = metricas.somar(metricas._retratos_diretorio(str(tmp_path)))
+
+    assert total["requisicoes"] == [["GET", "/", 200, 3]]
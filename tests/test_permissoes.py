@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from autenticador_jwt import permissoes
+from autenticador_jwt.permissoes import CachePermissoes, PermissoesProfessor
+
+
+class CargaFalsa:
+    """Substitui carregar_permissoes: conta as cargas e devolve a versão atual
+    das permissões (uma matéria por versão)."""
+
+    def __init__(self):
+        self.cargas = 0
+        self.durante_a_carga = None
+
+    async def __call__(self, db, professor_id):
+        self.cargas += 1
+        if self.durante_a_carga is not None:
+            self.durante_a_carga()
+        return PermissoesProfessor(frozenset({self.cargas}), frozenset(), {})
+
+
+def _carga(monkeypatch) -> CargaFalsa:
+    carga = CargaFalsa()
+    monkeypatch.setattr(permissoes, "carregar_permissoes", carga)
+    return carga
+
+
+def test_cache_ate_o_ttl_expirar(monkeypatch):
+    carga = _carga(monkeypatch)
+    cache = CachePermissoes(ttl=0.05)
+
+    async def cenario():
+        primeira = await cache.obter(None, 1)
+        assert await cache.obter(None, 1) is primeira
+        await cache.obter(None, 2)
+        assert carga.cargas == 2
+        time.sleep(0.06)
+        return await cache.obter(None, 1)
+
+    assert asyncio.run(cenario()).materias == {3}
+    assert cache.estatisticas() == {"tamanho": 2, "hits": 1, "misses": 3}
+
+
+def test_ttl_zero_nao_guarda(monkeypatch):
+    carga = _carga(monkeypatch)
+    cache = CachePermissoes(ttl=0)
+
+    async def cenario():
+        await cache.obter(None, 1)
+        await cache.obter(None, 1)
+
+    asyncio.run(cenario())
+    assert carga.cargas == 2
+
+
+def test_invalidar_descarta_so_o_professor(monkeypatch):
+    carga = _carga(monkeypatch)
+    cache = CachePermissoes(ttl=60)
+
+    async def cenario():
+        await cache.obter(None, 1)
+        await cache.obter(None, 2)
+        cache.invalidar(1)
+        assert (await cache.obter(None, 1)).materias == {3}
+        assert (await cache.obter(None, 2)).materias == {2}
+
+    asyncio.run(cenario())
+    assert carga.cargas == 3
+
+
+def test_carga_iniciada_antes_da_invalidacao_nao_e_guardada(monkeypatch):
+    carga = _carga(monkeypatch)
+    cache = CachePermissoes(ttl=60)
+    # As atribuições mudam (e o cache é invalidado) enquanto a carga lê o banco
+    carga.durante_a_carga = lambda: cache.invalidar(1)
+
+    async def cenario():
+        velha = await cache.obter(None, 1)
+        carga.durante_a_carga = None
+        return velha, await cache.obter(None, 1), await cache.obter(None, 1)
+
+    velha, nova, do_cache = asyncio.run(cenario())
+    assert velha.materias == {1}
+    assert nova.materias == {2}
+    assert do_cache is nova
+    assert carga.cargas == 2
+
+
+def test_cadastro_do_professor_invalida_o_cache(portal):
+    async def cenario(p):
+        admin = await p.usuario("admin", "admin")
+        await p.post("/admin/criarsalas", headers=admin, json={"sala": "1A"})
+        await p.post("/admin/criarmaterias", headers=admin, json={"nome": "Mat"})
+        aluno = await p.aluno("aluno", sala_id=1)
+        professor = await p.usuario("professor", "professor")
+
+        # Sem info cadastrada o professor não leciona nada (e isso fica em cache)
+        resposta = await p.lancar(professor, aluno.id, 1, 8.0)
+        assert resposta.status_code == 404
+        assert resposta.json()["detail"] == "Você não leciona essa matéria"
+
+        assert (await p.info_professor(professor, [1], [1])).status_code == 200
+        return await p.lancar(professor, aluno.id, 1, 8.0)
+
+    assert portal(cenario).status_code == 200
+
+
+def test_aluno_fora_das_salas_do_professor(portal):
+    async def cenario(p):
+        escola = await p.escola(salas=2, salas_professor=[1])
+        dentro = await p.aluno("dentro", sala_id=1)
+        fora = await p.aluno("fora", sala_id=2)
+
+        individual = await p.lancar(escola.professor, fora.id, 1, 7.0)
+        lote = await p.post(
+            "/professor/lancarnotas/lote",
+            headers=escola.professor,
+            json=[
+                {"aluno_id": dentro.id, "materia_id": 1, "nota": 7.0},
+                {"aluno_id": fora.id, "materia_id": 1, "nota": 7.0},
+            ],
+        )
+        boletim = await p.get(f"/professor/boletim/{fora.id}", headers=escola.professor)
+        return individual, lote, boletim, fora.id
+
+    individual, lote, boletim, fora_id = portal(cenario)
+
+    assert individual.status_code == 403
+    assert individual.json()["detail"] == "Você não leciona na sala desse aluno"
+    assert lote.status_code == 200
+    assert lote.json()["inseridas"] == 1
+    assert lote.json()["erros"] == [
+        {
+            "indice": 1,
+            "aluno_id": fora_id,
+            "materia_id": 1,
+            "detail": "Você não leciona na sala desse aluno",
+        }
+    ]
+    assert boletim.status_code == 403
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from autenticador_jwt import auth
+from database.database import SessionLocal
+from database.models import RefreshToken
+
+
+async def _renovar(portal, refresh_token: str):
+    return await portal.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_token_rotacionado_nao_pode_ser_reusado(portal):
+    async def cenario(p):
+        await p.usuario("aluno", "aluno")
+        primeiro = (await p.login("aluno"))["refresh_token"]
+
+        renovado = await _renovar(p, primeiro)
+        assert renovado.status_code == 200
+        segundo = renovado.json()["refresh_token"]
+        assert segundo != primeiro
+        assert (await _renovar(p, primeiro)).status_code == 401
+
+    portal(cenario)
+
+
+def test_reuso_revoga_todos_os_tokens_do_usuario(portal):
+    async def cenario(p):
+        await p.usuario("aluno", "aluno")
+        await p.usuario("outro", "aluno")
+        primeiro = (await p.login("aluno"))["refresh_token"]
+        outra_sessao = (await p.login("aluno"))["refresh_token"]
+        de_outro_usuario = (await p.login("outro"))["refresh_token"]
+        segundo = (await _renovar(p, primeiro)).json()["refresh_token"]
+
+        # O token já rotacionado reaparece: vazamento
+        assert (await _renovar(p, primeiro)).status_code == 401
+
+        assert (await _renovar(p, segundo)).status_code == 401
+        assert (await _renovar(p, outra_sessao)).status_code == 401
+        assert (await _renovar(p, de_outro_usuario)).status_code == 200
+
+    portal(cenario)
+
+
+def test_logout_revoga_o_token_informado(portal):
+    async def cenario(p):
+        await p.usuario("aluno", "aluno")
+        saindo = (await p.login("aluno"))["refresh_token"]
+        outra_sessao = (await p.login("aluno"))["refresh_token"]
+
+        resposta = await p.post("/auth/logout", json={"refresh_token": saindo})
+
+        assert resposta.status_code == 204
+        assert (await _renovar(p, outra_sessao)).status_code == 200
+        # Apresentar o token encerrado conta como reuso
+        assert (await _renovar(p, saindo)).status_code == 401
+
+    portal(cenario)
+
+
+def test_token_invalido_ou_expirado(portal):
+    async def cenario(p):
+        await p.usuario("aluno", "aluno")
+        refresh_token = (await p.login("aluno"))["refresh_token"]
+        with SessionLocal() as db:
+            db.execute(
+                update(RefreshToken).values(
+                    expira_em=datetime.utcnow() - timedelta(seconds=1)
+                )
+            )
+            db.commit()
+
+        assert (await _renovar(p, "nao-existe")).status_code == 401
+        assert (await _renovar(p, refresh_token)).status_code == 401
+
+    portal(cenario)
+
+
+def test_limpeza_apaga_expirados_e_revogados_antigos(portal, monkeypatch):
+    monkeypatch.setattr(auth, "REFRESH_LIMPEZA", 1)
+
+    async def cenario(p):
+        await p.usuario("aluno", "aluno")
+        expirado = (await p.login("aluno"))["refresh_token"]
+        revogado_antigo = (await p.login("aluno"))["refresh_token"]
+        revogado_recente = (await p.login("aluno"))["refresh_token"]
+        await p.post("/auth/logout", json={"refresh_token": revogado_antigo})
+        await p.post("/auth/logout", json={"refresh_token": revogado_recente})
+        agora = datetime.utcnow()
+        with SessionLocal() as db:
+            for token, campo, valor in (
+                (expirado, "expira_em", agora - timedelta(seconds=1)),
+                (revogado_antigo, "revogado_em", agora - timedelta(hours=25)),
+            ):
+                db.execute(
+                    update(RefreshToken)
+                    .where(RefreshToken.token_hash == auth.hash_refresh_token(token))
+                    .values({campo: valor})
+                )
+            db.commit()
+
+        atual = (await p.login("aluno"))["refresh_token"]
+
+        with SessionLocal() as db:
+            restantes = set(db.scalars(select(RefreshToken.token_hash)))
+        assert auth.hash_refresh_token(expirado) not in restantes
+        assert auth.hash_refresh_token(revogado_antigo) not in restantes
+        assert auth.hash_refresh_token(revogado_recente) in restantes
+        assert auth.hash_refresh_token(atual) in restantes
+        # O revogado recente ainda é reconhecido: o reuso derruba a sessão atual
+        assert (await _renovar(p, revogado_recente)).status_code == 401
+        assert (await _renovar(p, atual)).status_code == 401
+
+    portal(cenario)
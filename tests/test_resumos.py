@@ -0,0 +1,77 @@
+from sqlalchemy import select, update
+
+from database.database import SessionLocal, engine
+from database.models import Aluno, ResumoNotasAluno, ResumoNotasSala
+from database.resumos import reconstruir_resumos
+
+
+def _resumos() -> dict:
+    with SessionLocal() as db:
+        return {
+            modelo.__tablename__: sorted(
+                (linha[0], linha[1], linha[2], round(linha[3], 6), linha[4], linha[5])
+                for linha in db.execute(
+                    select(
+                        chave,
+                        modelo.materia_id,
+                        modelo.quantidade,
+                        modelo.soma,
+                        modelo.minimo,
+                        modelo.maximo,
+                    )
+                ).all()
+            )
+            for modelo, chave in (
+                (ResumoNotasAluno, ResumoNotasAluno.aluno_id),
+                (ResumoNotasSala, ResumoNotasSala.sala_id),
+            )
+        }
+
+
+def test_resumos_incrementais_iguais_a_reconstrucao(portal):
+    async def cenario(p):
+        escola = await p.escola(salas=2, materias=2)
+        ana = await p.aluno("ana", sala_id=1)
+        bia = await p.aluno("bia", sala_id=1)
+        caio = await p.aluno("caio", sala_id=2)
+
+        for aluno_id, materia_id, nota in (
+            (ana.id, 1, 7.5),
+            (ana.id, 1, 9.0),
+            (bia.id, 1, 4.0),
+            (caio.id, 2, 8.25),
+        ):
+            resposta = await p.lancar(escola.professor, aluno_id, materia_id, nota)
+            assert resposta.status_code == 200, resposta.text
+        resposta = await p.post(
+            "/professor/lancarnotas/lote",
+            headers=escola.professor,
+            json=[
+                {"aluno_id": ana.id, "materia_id": 2, "nota": 6.0},
+                {"aluno_id": caio.id, "materia_id": 2, "nota": 3.5},
+            ],
+        )
+        assert resposta.json()["inseridas"] == 2
+
+        # Ana muda de sala: as notas já lançadas continuam na sala 1
+        with SessionLocal() as db:
+            db.execute(update(Aluno).where(Aluno.id == ana.id).values(sala_id=2))
+            db.commit()
+        assert (await p.lancar(escola.professor, ana.id, 1, 10.0)).status_code == 200
+        resposta = await p.post(
+            "/professor/lancarnotas/lote",
+            headers=escola.professor,
+            json=[{"aluno_id": ana.id, "materia_id": 2, "nota": 5.0}],
+        )
+        assert resposta.json()["inseridas"] == 1
+
+    portal(cenario)
+    incrementais = _resumos()
+
+    with engine.begin() as conn:
+        reconstruir_resumos(conn)
+
+    assert _resumos() == incrementais
+    # sala 1, matéria 1: as duas notas da Ana de antes da mudança e a da Bia
+    assert (1, 1, 3, 20.5, 4.0, 9.0) in incrementais["resumo_notas_sala"]
+    assert (2, 1, 1, 10.0, 10.0, 10.0) in incrementais["resumo_notas_sala"]
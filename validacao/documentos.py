@@ -0,0 +1,88 @@
+from operator import mul
+from typing import Annotated
+from pydantic import AfterValidator, TypeAdapter, ValidationError
+import re
+
+_NAO_DIGITOS = re.compile(r"[^0-9]")
+
+# Pesos dos dois dígitos verificadores do CPF. As somas são feitas direto
+# sobre os bytes ASCII, descontando ord("0") vezes a soma dos pesos.
+_PESOS_DV1 = tuple(range(10, 1, -1))
+_PESOS_DV2 = tuple(range(11, 1, -1))
+_AJUSTE_DV1 = ord("0") * sum(_PESOS_DV1)
+_AJUSTE_DV2 = ord("0") * sum(_PESOS_DV2)
+# Dígito verificador para cada resto da divisão por 11
+_DV_POR_RESTO = tuple(0 if resto < 2 else 11 - resto for resto in range(11))
+# Sequências repetidas passam no cálculo, mas não são CPFs válidos
+_CPFS_REPETIDOS = frozenset(str(digito) * 11 for digito in range(10))
+
+
+def somente_digitos(valor: str) -> str:
+    if valor.isascii() and valor.isdigit():
+        return valor
+    return _NAO_DIGITOS.sub("", valor)
+
+
+def cpf_valido(cpf: str) -> bool:
+    """Confere os dígitos verificadores de um CPF já só com dígitos."""
+    if len(cpf) != 11 or cpf in _CPFS_REPETIDOS:
+        return False
+    dados = cpf.encode()
+    dv1 = _DV_POR_RESTO[(sum(map(mul, dados, _PESOS_DV1)) - _AJUSTE_DV1) % 11]
+    if dados[9] - 48 != dv1:
+        return False
+    dv2 = _DV_POR_RESTO[(sum(map(mul, dados, _PESOS_DV2)) - _AJUSTE_DV2) % 11]
+    return dados[10] - 48 == dv2
+
+
+def normalizar_cpf(valor: str) -> str:
+    cpf = somente_digitos(valor)
+    if not cpf_valido(cpf):
+        raise ValueError("CPF inválido")
+    return cpf
+
+
+def normalizar_telefone(valor: str) -> str:
+    telefone = somente_digitos(valor)
+    if not (10 <= len(telefone) <= 11):
+        raise ValueError("Telefone deve ter 10 ou 11 dígitos")
+    return telefone
+
+
+# Tipos usados nos modelos: guardam só os dígitos
+CPF = Annotated[str, AfterValidator(normalizar_cpf)]
+Telefone = Annotated[str, AfterValidator(normalizar_telefone)]
+
+
+def validar_lote(adaptador: TypeAdapter, valores: list):
+    """Valida um lote inteiro numa chamada ao pydantic (TypeAdapter de lista).
+
+    Devolve (valores, erros): os valores normalizados, com None onde houve
+    erro, e um dict índice -> mensagem.
+    """
+    try:
+        return adaptador.validate_python(valores), {}
+    except ValidationError as erro:
+        erros = {}
+        for detalhe in erro.errors():
+            erros.setdefault(detalhe["loc"][0], detalhe["msg"])
+    # Só os itens válidos passam de novo, para obter a forma normalizada
+    indices = [indice for indice in range(len(valores)) if indice not in erros]
+    normalizados = adaptador.validate_python([valores[i] for i in indices])
+    resultado = [None] * len(valores)
+    for indice, valor in zip(indices, normalizados):
+        resultado[indice] = valor
+    return resultado, erros
+
+
+def cpfs_repetidos_no_lote(cpfs: list) -> set[int]:
+    """Índices dos CPFs que já apareceram antes no mesmo lote."""
+    vistos = set()
+    repetidos = set()
+    for indice, cpf in enumerate(cpfs):
+        if cpf is None:
+            continue
+        if cpf in vistos:
+            repetidos.add(indice)
+        vistos.add(cpf)
+    return repetidos
@@ -1,13 +1,13 @@
 from pydantic import BaseModel, field_validator, EmailStr
 from typing import Optional
 from datetime import date
-import re
+from validacao.documentos import CPF, Telefone
 import datetime
 
 
 class AlunoBase(BaseModel):
-    cpf: str
-    telefone: str
+    cpf: CPF
+    telefone: Telefone
     endereco: str
     data_nascimento: date
     email: EmailStr
@@ -16,30 +16,6 @@ class AlunoBase(BaseModel):
     nome_mae: str
     sala_id: int
 
-    @field_validator("cpf")
-    def validar_cpf(cls, v):
-        cpf = re.sub(r"[^0-9]", "", v)
-        if len(cpf) != 11 or cpf == cpf[0] * 11:
-            raise ValueError("CPF inválido")
-
-        def calcular_digito(cpf, peso):
-            soma = sum(int(digito) * (peso - i) for i, digito in enumerate(cpf))
-            resto = soma % 11
-            return "0" if resto < 2 else str(11 - resto)
-
-        dv1 = calcular_digito(cpf[:9], 10)
-        dv2 = calcular_digito(cpf[:9] + dv1, 11)
-        if cpf[-2:] != dv1 + dv2:
-            raise ValueError("CPF inválido")
-        return cpf
-
-    @field_validator("telefone")
-    def validar_telefone(cls, v):
-        telefone = re.sub(r"[^0-9]", "", v)
-        if not (10 <= len(telefone) <= 11):
-            raise ValueError("Telefone deve ter 10 ou 11 dígitos")
-        return telefone
-
     @field_validator("data_nascimento")
     def validar_data_nascimento(cls, v):
         hoje = datetime.date.today()
@@ -1,12 +1,12 @@
 from pydantic import BaseModel, EmailStr, field_validator
 from typing import List, Optional
 from datetime import date
-import re
+from validacao.documentos import CPF, Telefone
 
 
 class InfoProfessor(BaseModel):
-    cpf: str
-    telefone: str
+    cpf: CPF
+    telefone: Telefone
     email: EmailStr
     formacao: Optional[str]
     especializacao: Optional[str]
@@ -15,38 +15,14 @@ class InfoProfessor(BaseModel):
     salas_ids: List[int]
     materias_ids: List[int]
 
-    @field_validator("cpf")
-    def validar_cpf(cls, v):
-        cpf = re.sub(r"[^0-9]", "", v)
-        if len(cpf) != 11 or cpf == cpf[0] * 11:
-            raise ValueError("CPF inválido")
-
-        def calcular_digito(cpf, peso):
-            soma = sum(int(digito) * (peso - i) for i, digito in enumerate(cpf))
-            resto = soma % 11
-            return "0" if resto < 2 else str(11 - resto)
-
-        dv1 = calcular_digito(cpf[:9], 10)
-        dv2 = calcular_digito(cpf[:9] + dv1, 11)
-        if cpf[-2:] != dv1 + dv2:
-            raise ValueError("CPF inválido")
-        return cpf
-
-    @field_validator("telefone")
-    def validar_telefone(cls, v):
-        telefone = re.sub(r"[^0-9]", "", v)
-        if not (10 <= len(telefone) <= 11):
-            raise ValueError("Telefone deve ter 10 ou 11 dígitos")
-        return telefone
-
     @field_validator("endereco")
     def validar_endereco(cls, v):
         if len(v.strip()) <= 3:
             raise ValueError("O endereço deve ter mais de 3 caracteres")
         return v.title()
 
-    @field_validator("salas_id")
+    @field_validator("salas_ids")
     def validar_sala(cls, v):
-        if len(v.strip()) <= 0:
+        if any(sala_id <= 0 for sala_id in v):
             raise ValueError("A sala deve ter o id maior que 0")
-        return v.title()
+        return v
@@ -17,6 +17,3 @@ class Usuario(BaseModel):
         if len(v.strip()) <= 7:
             raise ValueError("A senha deve conter no mínimo 8 caracteres")
         return v
-
-
-user = Usuario(username="Charles", ocupacao="professor", password="12345678")